@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+    async_graphql.py
+
+    asyncio GraphQL client Class
+    support version: Python 3.6.5
+"""
+
+import asyncio
+import http.client
+import io
+import json
+import ssl
+import time
+import urllib.error
+from urllib.parse import urlsplit
+
+import metrics
+import streaming
+from graphql import get_operation_name
+
+# Errors raised when the peer dropped an idle keep-alive connection
+STALE_CONNECTION_ERRORS = (
+    asyncio.IncompleteReadError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+class AsyncGraphQL:
+    def __init__(self, url, jwt_token, max_connections=16, observers=None, idle_timeout=30.0):
+        """ __init__
+
+            @param url            : GraphQL Endpoint URL
+            @param jwt_token      : jwt token
+            @param max_connections: max in-flight requests (one keep-alive connection each)
+            @param observers      : callables receiving a timing record per request (see metrics.LatencyRecorder)
+            @param idle_timeout   : seconds before an idle connection is discarded
+        """
+        split = urlsplit(url)
+        self.url             = url
+        self.jwt_token       = jwt_token
+        self.max_connections = max_connections
+        self._host           = split.hostname
+        self._port           = split.port or (443 if split.scheme == "https" else 80)
+        self._ssl            = ssl.create_default_context() if split.scheme == "https" else None
+        self._path           = (split.path or "/") + (f"?{split.query}" if split.query else "")
+        self._idle           = []
+        self._semaphore      = None
+        self.observers       = observers if observers is not None else []
+        self.idle_timeout    = idle_timeout
+
+    async def graphql_request(self, query, variables, operation_name=None, step=None):
+        """ graphql_request
+
+            @param query         : GraphQL request query
+            @param variables     : GraphQL request variables
+            @param operation_name: GraphQL request operation_name
+            @param step          : test step tag for timings (see metrics.set_step)
+        """
+        result, error, timing = await self._request(query, variables, operation_name, step)
+        self._notify(timing, self.observers)
+        if error is not None:
+            raise error
+        return result
+
+    async def _request(self, query, variables, operation_name, step, jwt_token=None):
+        obj = {
+            "operationName": operation_name,
+            "query"        : query,
+            "variables"    : variables
+        }
+        json_data = json.dumps(obj).encode("utf-8")
+        headers = {
+            "Content-Type" : "application/json",
+            "Authorization": jwt_token if jwt_token is not None else self.jwt_token
+        }
+
+        start = time.perf_counter()
+        status, reason, response_headers, body, timings = await self._send(json_data, headers)
+        timing = {
+            "operation": get_operation_name(query, operation_name),
+            "step"     : step,
+            "query"    : query,
+            "variables": variables,
+            "status"   : status,
+            "errors"   : None,
+            "data"     : None,
+            "timings"  : timings,
+        }
+        if status >= 400:
+            timings["total"] = time.perf_counter() - start
+            return None, urllib.error.HTTPError(self.url, status, reason, response_headers, io.BytesIO(body)), timing
+
+        decode_start = time.perf_counter()
+        result = streaming.loads(body)
+        timings["decode"] = time.perf_counter() - decode_start
+        timings["total"] = time.perf_counter() - start
+        timing["errors"] = result.get("errors") if isinstance(result, dict) else None
+        timing["data"] = result.get("data") if isinstance(result, dict) else None
+        return {
+            "status": status,
+            "body"  : result
+        }, None, timing
+
+    def blocking(self, loop, jwt_token=None, observers=None):
+        """ blocking
+
+            Synchronous facade for code running in a worker thread
+            while `loop` runs in the main thread.
+
+            @param loop     : event loop running this client
+            @param jwt_token: jwt token of another identity, sharing the connections (default: the client's)
+            @param observers: observers called after the client's, for the requests of this facade only
+        """
+        return BlockingGraphQL(self, loop, jwt_token, observers)
+
+    async def close(self):
+        """ close
+
+            Close idle connections
+        """
+        idle, self._idle = self._idle, []
+        for _, writer, _ in idle:
+            writer.close()
+
+    def _notify(self, timing, observers):
+        for observer in observers:
+            observer(timing)
+
+    async def _send(self, body, headers):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+
+        async with self._semaphore:
+            while True:
+                # TLS is negotiated inside open_connection, so "connect" covers it
+                timings = {"connect": 0.0}
+                connection = self._acquire()
+                reused = connection is not None
+                if reused:
+                    reader, writer = connection
+                else:
+                    start = time.perf_counter()
+                    reader, writer = await asyncio.open_connection(self._host, self._port, ssl=self._ssl)
+                    timings["connect"] = time.perf_counter() - start
+                try:
+                    start = time.perf_counter()
+                    writer.write(self._request_head(headers, len(body)) + body)
+                    status, reason, response_headers = await self._read_head(reader)
+                    timings["ttfb"] = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    response_body = await self._read_body(reader, response_headers)
+                    timings["body"] = time.perf_counter() - start
+                except STALE_CONNECTION_ERRORS:
+                    writer.close()
+                    if reused:
+                        continue
+                    raise
+                except Exception:
+                    writer.close()
+                    raise
+
+                if response_headers.get("Connection", "").lower() == "close":
+                    writer.close()
+                else:
+                    self._idle.append((reader, writer, time.monotonic()))
+                return status, reason, response_headers, response_body, timings
+
+    def _acquire(self):
+        now = time.monotonic()
+        while self._idle:
+            reader, writer, last_used = self._idle.pop()
+            # Skip connections idle too long or already closed by the peer
+            if now - last_used < self.idle_timeout and not reader.at_eof() and not writer.transport.is_closing():
+                return reader, writer
+            writer.close()
+        return None
+
+    def _request_head(self, headers, content_length):
+        lines = [
+            f"POST {self._path} HTTP/1.1",
+            f"Host: {self._host}",
+            f"Content-Length: {content_length}",
+        ]
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    @staticmethod
+    async def _read_head(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        status, reason = int(parts[1]), parts[2] if len(parts) > 2 else ""
+
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            header_lines.append(line)
+        headers = http.client.parse_headers(io.BytesIO(b"".join(header_lines) + b"\r\n"))
+        return status, reason, headers
+
+    @staticmethod
+    async def _read_body(reader, headers):
+        if headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b"".join(chunks)
+        elif "Content-Length" in headers:
+            body = await reader.readexactly(int(headers["Content-Length"]))
+        else:
+            body = await reader.read()
+            headers["Connection"] = "close"
+        return body
+
+
+class BlockingGraphQL:
+    def __init__(self, client, loop, jwt_token=None, observers=None):
+        """ __init__
+
+            @param client   : AsyncGraphQL
+            @param loop     : event loop running the client
+            @param jwt_token: jwt token of the requests (default: the client's)
+            @param observers: observers called after the client's
+        """
+        self.client    = client
+        self.loop      = loop
+        self.jwt_token = jwt_token
+        self.observers = observers if observers is not None else []
+
+    def graphql_request(self, query, variables, operation_name=None):
+        """ graphql_request
+
+            Same contract as GraphQL.graphql_request.
+            Observers are called in this thread, like with GraphQL.
+        """
+        result, error, timing = asyncio.run_coroutine_threadsafe(
+            self.client._request(query, variables, operation_name, metrics.get_step(), self.jwt_token),
+            self.loop
+        ).result()
+        self.client._notify(timing, self.client.observers + self.observers)
+        if error is not None:
+            raise error
+        return result
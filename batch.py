@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+"""
+    batch.py
+
+    Several GraphQL operations in one HTTP round trip
+    support version: Python 3.6.5
+"""
+
+import functools
+import re
+import threading
+
+VARIABLE_PATTERN = re.compile(r"\$(\w+)")
+NAME_PATTERN = re.compile(r"[_A-Za-z][_0-9A-Za-z]*")
+
+
+class Operation:
+    def __init__(self, operation_type, variable_definitions, fields):
+        """ __init__
+
+            @param operation_type      : "query", "mutation" or "subscription"
+            @param variable_definitions: {[name]: definition text without `$name:`}
+            @param fields              : [(response key, field text without alias)]
+        """
+        self.operation_type       = operation_type
+        self.variable_definitions = variable_definitions
+        self.fields               = fields
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_operation(query):
+    """ parse_operation
+
+        Split a single-operation document (no fragments) into its parts.
+        Returns None when the document cannot be batched.
+
+        @param query: GraphQL request query
+    """
+    text = query.strip()
+    operation_type = "query"
+    match = NAME_PATTERN.match(text)
+    if match is not None:
+        operation_type = match.group(0)
+        if operation_type not in ("query", "mutation", "subscription"):
+            return None
+        text = text[match.end():].lstrip()
+        match = NAME_PATTERN.match(text)
+        if match is not None:
+            text = text[match.end():].lstrip()
+
+    try:
+        return _parse_body(text, operation_type)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _parse_body(text, operation_type):
+    variable_definitions = {}
+    if text.startswith("("):
+        end = _skip_balanced(text, 0)
+        definitions = text[1:end - 1]
+        matches = list(VARIABLE_PATTERN.finditer(definitions))
+        for index, variable in enumerate(matches):
+            stop = matches[index + 1].start() if index + 1 < len(matches) else len(definitions)
+            definition = definitions[variable.end():stop].strip().rstrip(",").strip()
+            variable_definitions[variable.group(1)] = definition.lstrip(":").strip()
+        text = text[end:].lstrip()
+
+    if not text.startswith("{") or _skip_balanced(text, 0) != len(text) or "..." in text:
+        return None
+    return Operation(operation_type, variable_definitions, _split_fields(text[1:-1]))
+
+
+def is_batchable(query):
+    """ is_batchable
+
+        Only queries are merged; mutations keep their own round trip and order.
+
+        @param query: GraphQL request query
+    """
+    operation = parse_operation(query)
+    return operation is not None and operation.operation_type == "query"
+
+
+def merge_operations(requests):
+    """ merge_operations
+
+        One document from several operations of the same type, with every root
+        field aliased and every variable renamed by a `b<index>_` prefix.
+        Merged mutations run one after another on the server, in request order.
+
+        @param requests: [(query, variables, operation_name)]
+
+        result struct
+        (body: {"query", "variables", "operationName"}, keys: [[(alias, response key)]])
+    """
+    definitions = []
+    selections = []
+    merged_variables = {}
+    keys = []
+    for index, (query, variables, _) in enumerate(requests):
+        operation = parse_operation(query)
+        prefix = f"b{index}_"
+        for name, definition in operation.variable_definitions.items():
+            definitions.append(f"${prefix}{name}: {definition}")
+        for name, value in (variables or {}).items():
+            merged_variables[prefix + name] = value
+        request_keys = []
+        for key, field in operation.fields:
+            selections.append(f"{prefix}{key}: {_rename_variables(field, prefix)}")
+            request_keys.append((prefix + key, key))
+        keys.append(request_keys)
+
+    document = parse_operation(requests[0][0]).operation_type + " Batch" + (f"({', '.join(definitions)})" if len(definitions) != 0 else "")
+    document += " {\n" + "\n".join(selections) + "\n}"
+    return {"operationName": "Batch", "query": document, "variables": merged_variables}, keys
+
+
+def split_result(result, keys):
+    """ split_result
+
+        Response of a merged document back to one response per request.
+        Returns None when an error cannot be attributed to one request.
+
+        @param result: merged GraphQL response body
+        @param keys  : keys returned by merge_operations
+    """
+    data = result.get("data") or {}
+    owners = {alias: index for index, request_keys in enumerate(keys) for alias, _ in request_keys}
+    names = {alias: key for request_keys in keys for alias, key in request_keys}
+
+    errors = [[] for _ in keys]
+    for error in result.get("errors") or []:
+        path = error.get("path") or []
+        if len(path) == 0 or path[0] not in owners:
+            return None
+        errors[owners[path[0]]].append(dict(error, path=[names[path[0]]] + list(path[1:])))
+
+    results = []
+    for index, request_keys in enumerate(keys):
+        body = {"data": {key: data.get(alias) for alias, key in request_keys}}
+        if len(errors[index]) != 0:
+            body["errors"] = errors[index]
+        results.append(body)
+    return results
+
+
+class Batcher:
+    def __init__(self, send, window=0.002, max_size=10, mode="alias"):
+        """ __init__
+
+            Collects queries sent from several threads within `window` seconds
+            and sends them as one request. The first caller of a batch waits
+            for the window (or until max_size) and sends it for everyone.
+
+            @param send    : callable(body) -> (connection_pool.Response, decoded JSON or None)
+            @param window  : seconds to wait for more queries
+            @param max_size: max queries in one request
+            @param mode    : "alias" (merged document) or "array" (array of operations, if the endpoint supports it)
+        """
+        self.send      = send
+        self.window    = window
+        self.max_size  = max_size
+        self.mode      = mode
+        self._cond     = threading.Condition()
+        self._pending  = []
+
+    def submit(self, query, variables, operation_name):
+        """ submit
+
+            Same result as `send` for a single operation body
+        """
+        entry = _Pending((query, variables, operation_name))
+        with self._cond:
+            self._pending.append(entry)
+            is_leader = len(self._pending) == 1
+            self._cond.notify_all()
+            if is_leader:
+                self._cond.wait_for(lambda: len(self._pending) >= self.max_size, timeout=self.window)
+                pending, self._pending = self._pending, []
+
+        if is_leader:
+            for index in range(0, len(pending), self.max_size):
+                self._execute(pending[index:index + self.max_size])
+        entry.done.wait()
+        if entry.error is not None:
+            raise entry.error
+        return entry.result
+
+    def _execute(self, batch):
+        try:
+            if len(batch) == 1:
+                batch[0].result = self.send(_body(batch[0].request))
+            elif self.mode == "array":
+                self._execute_array(batch)
+            else:
+                self._execute_alias(batch)
+        except Exception as e:
+            for entry in batch:
+                if entry.result is None:
+                    entry.error = e
+        finally:
+            for entry in batch:
+                entry.done.set()
+
+    def _execute_alias(self, batch):
+        body, keys = merge_operations([entry.request for entry in batch])
+        response, result = self.send(body)
+        results = split_result(result, keys) if result is not None else None
+        if results is None:
+            # Not attributable (e.g. a validation error): send one by one
+            for entry in batch:
+                entry.result = self.send(_body(entry.request))
+            return
+        for entry, entry_result in zip(batch, results):
+            entry.result = (response, entry_result)
+
+    def _execute_array(self, batch):
+        response, result = self.send([_body(entry.request) for entry in batch])
+        if not isinstance(result, list) or len(result) != len(batch):
+            for entry in batch:
+                entry.result = self.send(_body(entry.request))
+            return
+        for entry, entry_result in zip(batch, result):
+            entry.result = (response, entry_result)
+
+
+class _Pending:
+    def __init__(self, request):
+        self.request = request
+        self.result  = None
+        self.error   = None
+        self.done    = threading.Event()
+
+
+def _body(request):
+    query, variables, operation_name = request
+    return {
+        "operationName": operation_name,
+        "query"        : query,
+        "variables"    : variables
+    }
+
+
+def _split_fields(selection):
+    fields = []
+    index = 0
+    while True:
+        index = _skip_ignored(selection, index)
+        if index >= len(selection):
+            return fields
+        start = index
+        match = NAME_PATTERN.match(selection, index)
+        key = match.group(0)
+        index = _skip_ignored(selection, match.end())
+        if selection.startswith(":", index):
+            index = _skip_ignored(selection, index + 1)
+            start = index
+            match = NAME_PATTERN.match(selection, index)
+            index = _skip_ignored(selection, match.end())
+        if selection.startswith("(", index):
+            index = _skip_ignored(selection, _skip_balanced(selection, index))
+        while selection.startswith("@", index):
+            match = NAME_PATTERN.match(selection, index + 1)
+            index = _skip_ignored(selection, match.end())
+            if selection.startswith("(", index):
+                index = _skip_ignored(selection, _skip_balanced(selection, index))
+        if selection.startswith("{", index):
+            index = _skip_balanced(selection, index)
+        fields.append((key, selection[start:index].strip()))
+
+
+def _skip_ignored(text, index):
+    while index < len(text):
+        if text[index] in " \t\r\n,":
+            index += 1
+        elif text[index] == "#":
+            while index < len(text) and text[index] != "\n":
+                index += 1
+        else:
+            break
+    return index
+
+
+def _skip_balanced(text, index):
+    pairs = {"(": ")", "{": "}", "[": "]"}
+    stack = []
+    while index < len(text):
+        char = text[index]
+        if char == '"':
+            index += 1
+            while index < len(text) and text[index] != '"':
+                index += 2 if text[index] == "\\" else 1
+        elif char in pairs:
+            stack.append(pairs[char])
+        elif len(stack) != 0 and char == stack[-1]:
+            stack.pop()
+            if len(stack) == 0:
+                return index + 1
+        index += 1
+    raise ValueError("Unbalanced GraphQL document")
+
+
+def _rename_variables(text, prefix):
+    parts = text.split('"')
+    # Even parts are outside string literals
+    for index in range(0, len(parts), 2):
+        parts[index] = VARIABLE_PATTERN.sub(lambda match: f"${prefix}{match.group(1)}", parts[index])
+    return '"'.join(parts)
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks/client_overhead.py
+
+    Per-call cost of the GraphQL client hot path, offline
+    support version: Python 3.6.5
+
+    Request body, headers, response decoding and formatAuth are timed on their own,
+    `(legacy)` rows are the code they replaced. Full requests and test passes run
+    against a local_server.LocalAppSync on loopback and from a cassette recorded
+    from it (no socket at all).
+
+    $ python3 benchmarks/client_overhead.py --save
+    $ python3 benchmarks/client_overhead.py --threshold 0.3
+    $ python3 benchmarks/client_overhead.py --filter decode
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, join
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cognito  # noqa: E402
+import query_cache  # noqa: E402
+import scenarios  # noqa: E402
+import streaming  # noqa: E402
+from cassette import RecordingPool, ReplayPool  # noqa: E402
+from connection_pool import ConnectionPool  # noqa: E402
+from graphql import GraphQL  # noqa: E402
+from local_server import LocalAppSync  # noqa: E402
+from test import Test  # noqa: E402
+
+BASELINE_FILE = join(dirname(abspath(__file__)), "client_overhead.json")
+
+USERNAME = "benchmark"
+
+
+def measure(func, repeat, min_time):
+    """ measure
+
+        Median time per call: calls are grouped in runs of at least `min_time` seconds,
+        the median of `repeat` runs is kept (the fastest one swings with the machine as much as the others).
+
+        @param func    : callable without arguments
+        @param repeat  : number of runs
+        @param min_time: minimum seconds per run
+    """
+    number = 1
+    while True:
+        elapsed = _run(func, number)
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    return statistics.median([elapsed] + [_run(func, number) for _ in range(repeat - 1)]) / number
+
+
+def _run(func, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - start
+
+
+class Fixture:
+    def __init__(self, directory):
+        """ __init__
+
+            Local server with the data of a test pass, and a cassette of that pass
+
+            @param directory: directory of the cassette
+        """
+        self.server = LocalAppSync().start()
+        self.token = self.server.mint_token(USERNAME)
+        self.user_id = self.server.identity(USERNAME)["user_id"]
+
+        self.cassette = join(directory, "client_overhead.cassette")
+        client = GraphQL(self.server.url, self.token, RecordingPool(ConnectionPool(), self.cassette))
+        test = Test(self.user_id, client, output=io.StringIO())
+        errors = test.execute_test()
+        if len(errors) != 0:
+            raise RuntimeError(f"test pass failed against the local server: {errors}")
+        client.pool.writer.meta.update({"scenario_values": test.scenario_values})
+        client.close()
+        self.scenario_values = test.scenario_values
+
+        # Largest response of the pass, for the decoding rows
+        replay = ReplayPool(self.cassette)
+        self.response_body = max(
+            (bytes(replay.cassette.response(index)[3]) for index in range(len(replay.cassette.entries))),
+            key=len,
+        )
+        replay.close()
+
+    def close(self):
+        self.server.stop()
+
+
+def build_cases(fixture):
+    """ build_cases
+
+        @param fixture: Fixture
+
+        result struct
+        ([(name, callable)], [GraphQL clients to close])
+    """
+    query = scenarios.GET_USER % scenarios.USER_FIELDS
+    variables = {"id": fixture.user_id}
+    prepared = query_cache.prepare(query)
+    body = fixture.response_body
+    auth = {"AuthenticationResult": {"IdToken": fixture.token}}
+
+    loopback = GraphQL(fixture.server.url, fixture.token)
+    replay = GraphQL(fixture.server.url, fixture.token, ReplayPool(fixture.cassette))
+    # Own cassette cursors: the test pass replays its responses in recording order
+    replay_pass = GraphQL(fixture.server.url, fixture.token, ReplayPool(fixture.cassette))
+    loopback_test = Test(fixture.user_id, loopback, output=io.StringIO(), scenario_values=dict(fixture.scenario_values))
+    replay_test = Test(fixture.user_id, replay_pass, output=io.StringIO(), scenario_values=dict(fixture.scenario_values))
+
+    def test_pass(test):
+        test.output.seek(0)
+        test.output.truncate()
+        if len(test.execute_test()) != 0:
+            raise RuntimeError(test.output.getvalue())
+
+    return [
+        ("body (legacy json.dumps)", lambda: json.dumps({"operationName": None, "query": query, "variables": variables}).encode("utf-8")),
+        ("body (query_cache)", lambda: query_cache.prepare(query).body(variables)),
+        ("body (prepared)", lambda: prepared.body(variables)),
+        ("headers (legacy per call)", lambda: {"Content-Type": "application/json", "Authorization": fixture.token}),
+        ("decode (legacy split)", lambda: json.loads(body.decode("utf-8").split('\n')[0])),
+        ("decode (streaming.loads)", lambda: streaming.loads(body)),
+        ("formatAuth", lambda: cognito.formatAuth(auth)),
+        ("request (replay)", lambda: replay.graphql_request(query, variables)),
+        ("request (loopback)", lambda: loopback.graphql_request(query, variables)),
+        ("test pass (replay)", lambda: test_pass(replay_test)),
+        ("test pass (loopback)", lambda: test_pass(loopback_test)),
+    ], [loopback, replay, replay_pass]
+
+
+def load_baseline(path):
+    """ load_baseline
+
+        @param path: baseline file
+
+        result struct
+        {
+            "python"  : string,
+            "platform": string,
+            "time"    : string,
+            "results" : {[case name]: seconds per call}
+        } or None (no baseline file)
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    """ save_baseline
+
+        @param path   : baseline file (overwritten)
+        @param results: {[case name]: seconds per call}
+    """
+    with open(path, "w") as f:
+        json.dump({
+            "python"  : platform.python_version(),
+            "platform": platform.platform(),
+            "time"    : time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "results" : results,
+        }, f, indent=2)
+        f.write("\n")
+
+
+def _format(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:10.2f} us"
+    return f"{seconds * 1e3:10.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GraphQL client overhead micro-benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help=f"baseline file (default: {BASELINE_FILE})")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.0,
+        help="slowdown over the baseline reported as a regression; run to run noise reaches 40 - 90%% on a shared machine (default: 1.0)",
+    )
+    parser.add_argument("--filter", default=None, help="only run the cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (default: 5)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per run (default: 0.2)")
+    args = parser.parse_args()
+
+    saved = load_baseline(args.baseline)
+    if saved is None and not args.save:
+        print(f"no baseline {os.path.relpath(args.baseline)}: save one with --save, or choose it with --baseline")
+        sys.exit(1)
+    baseline = saved["results"] if saved is not None else {}
+    compared = baseline
+    if saved is not None:
+        print(f"baseline: python {saved['python']}, {saved['platform']}, {saved['time']}")
+        if saved["python"] != platform.python_version() or saved["platform"] != platform.platform():
+            # Timings of another machine say nothing about this change: no comparison, no failure
+            print(f"warning: baseline from another python / platform than this one (python {platform.python_version()}, {platform.platform()}),"
+                  " not compared: save one here with --save")
+            compared = {}
+    results = {}
+    regressions = []
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = Fixture(directory)
+        cases, clients = build_cases(fixture)
+        try:
+            print(f"{'case':<28}{'per call':>14}{'baseline':>14}{'change':>9}")
+            for name, func in cases:
+                if args.filter is not None and args.filter not in name:
+                    continue
+                results[name] = measure(func, args.repeat, args.min_time)
+                line = f"{name:<28}{_format(results[name])}"
+                if name in compared:
+                    change = results[name] / compared[name] - 1
+                    line += f"{_format(compared[name])}{change * 100:>+8.1f}%"
+                    if change > args.threshold:
+                        regressions.append(name)
+                        line += "  regression"
+                print(line)
+        finally:
+            for client in clients:
+                client.close()
+            fixture.close()
+
+    print()
+    if args.save:
+        # Keep the other cases of the baseline when only some were run (of this machine only)
+        save_baseline(args.baseline, dict(compared, **results))
+        print(f"baseline saved to {os.path.relpath(args.baseline)}")
+    if len(regressions) != 0:
+        print(f"regressions over {args.threshold * 100:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+    missing = [name for name in results if name not in compared]
+    if len(compared) != 0 and len(missing) != 0 and not args.save:
+        print(f"not in the baseline: {', '.join(missing)} (add them with --save)")
+        sys.exit(1)
+    if len(compared) != 0:
+        print(f"no regression over {args.threshold * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks/startup.py
+
+    CLI startup benchmark: `python -X importtime` breakdown and wall time
+    support version: Python 3.6.5
+
+    $ python3 benchmarks/startup.py
+    $ python3 benchmarks/startup.py --module cognito --top 10
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from os.path import abspath, dirname
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+# Modules that must not be imported on the default startup path
+HEAVY_MODULES = ["boto3", "botocore", "asyncio", "concurrent.futures", "load", "parallel", "async_graphql", "fanout", "subscription"]
+
+
+def importtime(module):
+    """ importtime
+
+        @param module: module imported in a fresh interpreter
+
+        result struct
+        [{"module": string, "self": number (us), "cumulative": number (us), "depth": number}]
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module"    : name.strip(),
+            "self"      : int(self_us),
+            "cumulative": int(cumulative_us),
+            "depth"     : (len(name) - len(name.lstrip())) // 2,
+        })
+    return rows
+
+
+def wall_time(module, repeat):
+    """ wall_time
+
+        Median seconds to start an interpreter and import `module`
+
+        @param module: module to import
+        @param repeat: number of runs
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI startup benchmark")
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--top", type=int, default=15, help="rows of the breakdown (default: 15)")
+    parser.add_argument("--repeat", type=int, default=10, help="wall time runs (default: 10)")
+    args = parser.parse_args()
+
+    rows = importtime(args.module)
+    baseline = wall_time("sys", args.repeat)
+    total = wall_time(args.module, args.repeat)
+
+    print(f"interpreter startup      : {baseline * 1000:8.1f} ms")
+    print(f"import {args.module:<18}: {(total - baseline) * 1000:8.1f} ms (median of {args.repeat})")
+    print()
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    top_level = [row for row in rows if row["depth"] == 0]
+    for row in sorted(top_level, key=lambda row: row["cumulative"], reverse=True)[:args.top]:
+        print(f"{row['cumulative'] / 1000:>14.1f}{row['self'] / 1000:>10.1f}  {row['module']}")
+
+    loaded = {row["module"] for row in rows}
+    heavy = [module for module in HEAVY_MODULES if module in loaded]
+    print()
+    if len(heavy) != 0:
+        print(f"heavy modules on the startup path: {', '.join(heavy)}")
+        sys.exit(1)
+    print("no heavy modules on the startup path")
+
+
+if __name__ == "__main__":
+    main()
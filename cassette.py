@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+
+"""
+    cassette.py
+
+    Record and replay GraphQL traffic, for benchmarks without network variance
+    support version: Python 3.6.5
+
+    RecordingPool / ReplayPool stand in for connection_pool.ConnectionPool:
+    pass one as the `pool` of a GraphQL client. Everything above the socket
+    (request building, decoding, comparison) runs as usual.
+
+    Cassette file
+    - MAGIC
+    - records: RECORD header (status, head / request / body sizes), head (reason and
+      response headers, HTTP/1.1 text), request body, response body
+    - index: JSON {"meta", "entries": [[request key, operation key, record offset]]}
+    - footer: index offset, MAGIC
+    A cassette without index (recording interrupted) is indexed by scanning its records.
+"""
+
+import contextlib
+import hashlib
+import http.client
+import io
+import json
+import mmap
+import struct
+import threading
+import time
+
+from connection_pool import Response
+from graphql import get_operation_name
+
+MAGIC = b"GQLCASS1"
+RECORD = struct.Struct("<HIII")
+FOOTER = struct.Struct("<Q8s")
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+def request_key(body):
+    """ request_key
+
+        Exact match key: hash of the request body bytes
+
+        @param body: request body bytes
+    """
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def operation_key(body):
+    """ operation_key
+
+        Fallback match key: the operation(s) of the request, without the variables.
+        Requests that differ only by their variables (timestamps, generated ids)
+        are replayed in recording order.
+
+        @param body: request body bytes
+    """
+    try:
+        request = json.loads(body.decode("utf-8"))
+    except ValueError:
+        return "unparsable"
+    requests = request if isinstance(request, list) else [request]
+    names = []
+    for item in requests:
+        if not isinstance(item, dict):
+            names.append("unknown")
+        elif isinstance(item.get("query"), str):
+            names.append(get_operation_name(item["query"], item.get("operationName")))
+        else:
+            names.append(((item.get("extensions") or {}).get("persistedQuery") or {}).get("sha256Hash", "unknown"))
+    return "+".join(names)
+
+
+class CassetteWriter:
+    def __init__(self, path, meta=None):
+        """ __init__
+
+            @param path: cassette file (overwritten)
+            @param meta: JSON data stored with the cassette (e.g. the recording user id)
+        """
+        self.path     = path
+        self.meta     = meta if meta is not None else {}
+        self._file    = open(path, "wb")
+        self._file.write(MAGIC)
+        self._entries = []
+        self._lock    = threading.Lock()
+
+    def write(self, request, status, reason, headers, body):
+        """ write
+
+            @param request: request body bytes
+            @param status : HTTP status
+            @param reason : HTTP reason phrase
+            @param headers: http.client.HTTPMessage
+            @param body   : response body bytes
+        """
+        head = (reason + "\r\n" + "".join(f"{name}: {value}\r\n" for name, value in headers.items())).encode("latin-1")
+        entry = [request_key(request), operation_key(request)]
+        with self._lock:
+            entry.append(self._file.tell())
+            self._file.write(RECORD.pack(status, len(head), len(request), len(body)) + head + request + body)
+            self._entries.append(entry)
+
+    def close(self):
+        """ close
+
+            Write the index and close the file
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            offset = self._file.tell()
+            self._file.write(json.dumps({"meta": self.meta, "entries": self._entries}, separators=(",", ":")).encode("utf-8"))
+            self._file.write(FOOTER.pack(offset, MAGIC))
+            self._file.close()
+
+
+class Cassette:
+    def __init__(self, path):
+        """ __init__
+
+            Memory-mapped cassette. Responses are read from the map when replayed.
+
+            @param path: cassette file
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a cassette")
+        index = self._read_index()
+        self.meta    = index["meta"]
+        self.entries = [tuple(entry) for entry in index["entries"]]
+
+    def response(self, index):
+        """ response
+
+            @param index: entry index
+
+            result struct
+            (status, reason, headers: http.client.HTTPMessage, body: bytes)
+        """
+        offset = self.entries[index][2]
+        status, head_size, request_size, body_size = RECORD.unpack_from(self._map, offset)
+        start = offset + RECORD.size
+        reason, _, header_lines = self._map[start:start + head_size].decode("latin-1").partition("\r\n")
+        headers = http.client.parse_headers(io.BytesIO(header_lines.encode("latin-1") + b"\r\n"))
+        body_start = start + head_size + request_size
+        return status, reason, headers, self._map[body_start:body_start + body_size]
+
+    def close(self):
+        """ close
+
+            Unmap the file
+        """
+        self._map.close()
+
+    def _read_index(self):
+        if len(self._map) >= len(MAGIC) + FOOTER.size:
+            offset, magic = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+            if magic == MAGIC and len(MAGIC) <= offset <= len(self._map) - FOOTER.size:
+                return json.loads(self._map[offset:len(self._map) - FOOTER.size].decode("utf-8"))
+
+        # Interrupted recording: index the complete records
+        entries = []
+        offset = len(MAGIC)
+        while offset + RECORD.size <= len(self._map):
+            _, head_size, request_size, body_size = RECORD.unpack_from(self._map, offset)
+            end = offset + RECORD.size + head_size + request_size + body_size
+            if end > len(self._map):
+                break
+            request = self._map[offset + RECORD.size + head_size:offset + RECORD.size + head_size + request_size]
+            entries.append([request_key(request), operation_key(request), offset])
+            offset = end
+        return {"meta": {}, "entries": entries}
+
+
+class RecordingPool:
+    def __init__(self, pool, path, meta=None):
+        """ __init__
+
+            Send through `pool` and record every request / response pair.
+
+            @param pool: connection_pool.ConnectionPool
+            @param path: cassette file (overwritten)
+            @param meta: JSON data stored with the cassette
+        """
+        self.pool   = pool
+        self.writer = CassetteWriter(path, meta)
+
+    def request(self, url, body, headers, method="POST"):
+        response = self.pool.request(url, body, headers, method)
+        self.writer.write(body, response.status, response.reason, response.headers, response.body)
+        return response
+
+    @contextlib.contextmanager
+    def stream(self, url, body, headers, method="POST"):
+        with self.pool.stream(url, body, headers, method) as response:
+            tee = _TeeResponse(response)
+            yield tee
+            # Only complete bodies are replayable
+            if response.isclosed():
+                self.writer.write(body, response.status, response.reason, response.headers, b"".join(tee.chunks))
+
+    def close(self):
+        """ close
+
+            Close the pool and finish the cassette
+        """
+        self.pool.close()
+        self.writer.close()
+
+
+class ReplayPool:
+    def __init__(self, path, loop=True):
+        """ __init__
+
+            Serve responses from a cassette, without network.
+            A request gets the next unused response recorded for the same body,
+            otherwise the next unused response of the same operation.
+
+            @param path: cassette file
+            @param loop: start over when a request has no unused response left
+                         (replay the same run again and again)
+        """
+        self.cassette = Cassette(path)
+        self.loop     = loop
+        self.exact    = 0
+        self.fallback = 0
+        self._by_key  = {}
+        self._by_op   = {}
+        for index, (key, operation, _) in enumerate(self.cassette.entries):
+            self._by_key.setdefault(key, []).append(index)
+            self._by_op.setdefault(operation, []).append(index)
+        self._lock    = threading.Lock()
+        self._rewind()
+
+    @property
+    def meta(self):
+        """ meta
+
+            JSON data stored with the cassette
+        """
+        return self.cassette.meta
+
+    def request(self, url, body, headers, method="POST"):
+        start = time.perf_counter()
+        status, reason, response_headers, response_body = self.cassette.response(self._find(body))
+        return Response(status, reason, response_headers, response_body, {
+            "connect": 0.0,
+            "tls"    : 0.0,
+            "ttfb"   : time.perf_counter() - start,
+            "body"   : 0.0,
+        })
+
+    @contextlib.contextmanager
+    def stream(self, url, body, headers, method="POST"):
+        response = self.request(url, body, headers, method)
+        yield _ReplayResponse(response)
+
+    def close(self):
+        """ close
+
+            Unmap the cassette
+        """
+        self.cassette.close()
+
+    def _find(self, body):
+        key = request_key(body)
+        operation = operation_key(body)
+        with self._lock:
+            for attempt in range(2):
+                index = self._take(self._by_key.get(key, []), self._key_cursors, key)
+                if index is not None:
+                    self.exact += 1
+                    return index
+                index = self._take(self._by_op.get(operation, []), self._op_cursors, operation)
+                if index is not None:
+                    self.fallback += 1
+                    return index
+                if not self.loop or attempt == 1:
+                    break
+                self._rewind()
+        raise CassetteMiss(f"No recorded response left for {operation}")
+
+    def _take(self, indices, cursors, name):
+        cursor = cursors.get(name, 0)
+        while cursor < len(indices) and indices[cursor] in self._used:
+            cursor += 1
+        cursors[name] = cursor + 1
+        if cursor >= len(indices):
+            return None
+        self._used.add(indices[cursor])
+        return indices[cursor]
+
+    def _rewind(self):
+        self._used        = set()
+        self._key_cursors = {}
+        self._op_cursors  = {}
+
+
+class _TeeResponse:
+    def __init__(self, response):
+        self.response = response
+        self.chunks   = []
+
+    def read(self, *args):
+        data = self.response.read(*args)
+        self.chunks.append(data)
+        return data
+
+    def read1(self, *args):
+        data = self.response.read1(*args)
+        self.chunks.append(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+class _ReplayResponse(io.BytesIO):
+    def __init__(self, response):
+        super().__init__(response.body)
+        self.status  = response.status
+        self.reason  = response.reason
+        self.headers = response.headers
+        self.timings = response.timings
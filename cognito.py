@@ -8,8 +8,23 @@
 """
 import base64
 import json
+import threading
 
-import boto3
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(region_name):
+    # boto3 is slow to import; only load it when Cognito is really called
+    import boto3
+
+    with _clients_lock:
+        if region_name not in _clients:
+            _clients[region_name] = boto3.client(
+                "cognito-idp",
+                region_name=region_name,
+            )
+        return _clients[region_name]
 
 
 def cognito_auth(username, password, region_name, client_id):
@@ -21,10 +36,7 @@ def cognito_auth(username, password, region_name, client_id):
         @param client_id: aws cognito client_id
     """
     try:
-        client = boto3.client(
-            "cognito-idp",
-            region_name=region_name,
-        )
+        client = _get_client(region_name)
         result = client.initiate_auth(
             AuthFlow='USER_PASSWORD_AUTH',
             AuthParameters={
@@ -39,6 +51,31 @@ def cognito_auth(username, password, region_name, client_id):
         return e
 
 
+def cognito_refresh(refresh_token, region_name, client_id):
+    """ cognito_refresh
+
+        New IdToken and AccessToken from a refresh token.
+        The result has no RefreshToken; keep using the one passed in.
+
+        @param refresh_token: aws cognito RefreshToken
+        @param region_name: aws cognito region_name
+        @param client_id: aws cognito client_id
+    """
+    try:
+        client = _get_client(region_name)
+        result = client.initiate_auth(
+            AuthFlow='REFRESH_TOKEN_AUTH',
+            AuthParameters={
+                "REFRESH_TOKEN": refresh_token,
+            },
+            ClientId=client_id
+        )
+        return result
+
+    except Exception as e:
+        return e
+
+
 def formatAuth(client):
     """ formatAuth
 
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+"""
+    concurrency.py
+
+    Adaptive concurrency limit per GraphQL operation (AIMD)
+    support version: Python 3.6.5
+
+    Each operation gets its own in-flight limit. A request that comes back
+    slow (latency over `tolerance` times the no-load latency), throttled,
+    5xx or failed in transport multiplies the limit by `backoff`;
+    a fast success while the limit is in use adds 1 / limit, i.e. +1 per
+    window of `limit` requests. The limit settles around the endpoint's
+    saturation point, where the latency starts to grow.
+"""
+
+import threading
+import time
+
+from bcolors import bcolors
+
+
+class OperationLimit:
+    def __init__(self, initial, min_limit, max_limit, backoff, tolerance, window):
+        """ __init__
+
+            @param initial  : starting limit
+            @param min_limit: lowest limit
+            @param max_limit: highest limit
+            @param backoff  : limit multiplier on an overload signal (0 - 1)
+            @param tolerance: latency / no-load latency ratio seen as overload
+            @param window   : samples per no-load latency window
+        """
+        self.limit          = float(initial)
+        self.min_limit      = min_limit
+        self.max_limit      = max_limit
+        self.backoff        = backoff
+        self.tolerance      = tolerance
+        self.window         = window
+        self.in_flight      = 0
+        self.peak_limit     = self.limit
+        self.low_limit      = self.limit
+        self.requests       = 0
+        self.drops          = 0
+        self._baseline      = None
+        self._window_min    = None
+        self._window_count  = 0
+        self._last_decrease = 0.0
+        self._condition     = threading.Condition()
+
+    def acquire(self):
+        """ acquire
+
+            Wait for a free slot under the limit
+
+            result struct
+            start time (time.monotonic), passed back to release
+        """
+        with self._condition:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, start, dropped=False):
+        """ release
+
+            @param start  : result of acquire
+            @param dropped: the request was throttled or failed (5xx, transport error)
+        """
+        now = time.monotonic()
+        latency = now - start
+        with self._condition:
+            in_use = self.in_flight >= self.limit / 2
+            self.in_flight -= 1
+            self.requests += 1
+            baseline = self._sample(latency)
+
+            if dropped or latency > baseline * self.tolerance:
+                self.drops += 1 if dropped else 0
+                # Once per round trip: requests sent before the last decrease saw the old limit
+                if start >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.low_limit = min(self.low_limit, self.limit)
+                    self._last_decrease = now
+            elif in_use:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+            self._condition.notify_all()
+
+    def _sample(self, latency):
+        # No-load latency: the lowest latency over the last two windows,
+        # so it follows the endpoint if it gets slower for good
+        self._window_min = latency if self._window_min is None else min(self._window_min, latency)
+        self._window_count += 1
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        if self._window_count >= self.window:
+            self._baseline = self._window_min
+            self._window_min = None
+            self._window_count = 0
+        return self._baseline
+
+
+class AdaptiveConcurrency:
+    def __init__(self, initial=4, min_limit=1, max_limit=256, backoff=0.9, tolerance=2.0, window=100):
+        """ __init__
+
+            @param initial  : starting limit of every operation
+            @param min_limit: lowest limit
+            @param max_limit: highest limit (e.g. the connection pool size)
+            @param backoff  : limit multiplier on an overload signal (0 - 1)
+            @param tolerance: latency / no-load latency ratio seen as overload
+            @param window   : samples per no-load latency window
+        """
+        self.initial    = initial
+        self.min_limit  = min_limit
+        self.max_limit  = max_limit
+        self.backoff    = backoff
+        self.tolerance  = tolerance
+        self.window     = window
+        self.operations = {}
+        self._lock      = threading.Lock()
+
+    def get(self, operation):
+        """ get
+
+            @param operation: operation name (graphql.get_operation_name)
+
+            result struct
+            OperationLimit
+        """
+        limit = self.operations.get(operation)
+        if limit is None:
+            with self._lock:
+                limit = self.operations.get(operation)
+                if limit is None:
+                    limit = OperationLimit(self.initial, self.min_limit, self.max_limit, self.backoff, self.tolerance, self.window)
+                    self.operations[operation] = limit
+        return limit
+
+    def summary(self):
+        """ summary
+
+            result struct
+            {
+                [operation name]: {
+                    "limit"    : number (current in-flight limit),
+                    "low"      : number (lowest limit reached),
+                    "peak"     : number (highest limit reached),
+                    "in_flight": number,
+                    "requests" : number,
+                    "drops"    : number (throttled or failed requests)
+                }
+            }
+        """
+        with self._lock:
+            operations = sorted(self.operations.items())
+        return {
+            name: {
+                "limit"    : int(limit.limit),
+                "low"      : int(limit.low_limit),
+                "peak"     : int(limit.peak_limit),
+                "in_flight": limit.in_flight,
+                "requests" : limit.requests,
+                "drops"    : limit.drops,
+            }
+            for name, limit in operations
+        }
+
+
+def print_report(limiter):
+    """ print_report
+
+        @param limiter: AdaptiveConcurrency
+    """
+    summary = limiter.summary()
+    if len(summary) == 0:
+        return
+    print(f"\n{bcolors.OKBLUE}i {bcolors.ENDC}Adaptive concurrency limits")
+    print(f"{'operation':<32}{'limit':>7}{'low':>7}{'peak':>7}{'requests':>10}{'drops':>8}")
+    for name, row in summary.items():
+        drop_color = bcolors.FAIL if row["drops"] > 0 else bcolors.OKGREEN
+        print(
+            f"{name:<32}{bcolors.OKGREEN}{row['limit']:>7}{bcolors.ENDC}{row['low']:>7}{row['peak']:>7}"
+            f"{row['requests']:>10}{drop_color}{row['drops']:>8}{bcolors.ENDC}"
+        )
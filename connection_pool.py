@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+"""
+    connection_pool.py
+
+    Persistent HTTP/1.1 connection pool
+    support version: Python 3.6.5
+"""
+
+import base64
+import contextlib
+import http.client
+import threading
+import time
+import urllib.request
+from urllib.parse import unquote, urlsplit
+
+# Errors raised when the peer dropped an idle keep-alive connection
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    ConnectionAbortedError,
+    BrokenPipeError,
+)
+
+
+class Response:
+    def __init__(self, status, reason, headers, body, timings):
+        """ __init__
+
+            @param status : HTTP status code
+            @param reason : HTTP reason phrase
+            @param headers: http.client.HTTPMessage
+            @param body   : response body bytes
+            @param timings: phase seconds {"connect", "tls", "ttfb", "body"}
+        """
+        self.status  = status
+        self.reason  = reason
+        self.headers = headers
+        self.body    = body
+        self.timings = timings
+
+
+class TimedHTTPConnection(http.client.HTTPConnection):
+    def connect(self):
+        """ connect
+
+            TCP connect, timed
+        """
+        start = time.perf_counter()
+        super().connect()
+        self.connect_time = time.perf_counter() - start
+        self.tls_time = 0.0
+
+
+class TimedHTTPSConnection(http.client.HTTPSConnection):
+    def connect(self):
+        """ connect
+
+            TCP connect and TLS handshake, timed separately
+        """
+        start = time.perf_counter()
+        http.client.HTTPConnection.connect(self)
+        self.connect_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        server_hostname = self._tunnel_host if self._tunnel_host else self.host
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname)
+        self.tls_time = time.perf_counter() - start
+
+
+class ConnectionPool:
+    def __init__(self, max_size=4, idle_timeout=30.0, timeout=60.0, proxies=None):
+        """ __init__
+
+            @param max_size    : max connections per endpoint host
+            @param idle_timeout: seconds before an idle connection is discarded
+            @param timeout     : socket timeout seconds
+            @param proxies     : {[scheme]: proxy URL, "no": hosts without proxy}
+                                 (default: HTTP_PROXY / HTTPS_PROXY / NO_PROXY, like urllib.request.urlopen)
+        """
+        self.max_size     = max_size
+        self.idle_timeout = idle_timeout
+        self.timeout      = timeout
+        self.proxies      = proxies if proxies is not None else urllib.request.getproxies()
+        self._lock        = threading.Lock()
+        self._idle        = {}
+        self._slots       = {}
+
+    def request(self, url, body, headers, method="POST"):
+        """ request
+
+            Send a request over a pooled connection and read the whole body.
+            A reused connection reset by the peer is reopened once.
+
+            @param url    : request URL
+            @param body   : request body bytes
+            @param headers: request headers
+            @param method : HTTP method
+        """
+        with self.stream(url, body, headers, method) as response:
+            start = time.perf_counter()
+            response_body = response.read()
+            response.timings["body"] = time.perf_counter() - start
+            return Response(response.status, response.reason, response.headers, response_body, response.timings)
+
+    @contextlib.contextmanager
+    def stream(self, url, body, headers, method="POST"):
+        """ stream
+
+            Send a request and yield the http.client.HTTPResponse as soon as
+            the headers arrive, so the body can be read incrementally.
+            The connection goes back to the pool only if the body was read to the end.
+
+            @param url    : request URL
+            @param body   : request body bytes
+            @param headers: request headers
+            @param method : HTTP method
+        """
+        split = urlsplit(url)
+        key = (split.scheme, split.hostname, split.port)
+        path = split.path or "/"
+        if split.query:
+            path += "?" + split.query
+        proxy = self._proxy(split.scheme, split.hostname)
+        if proxy is not None and split.scheme == "http":
+            # Plain HTTP through a proxy: absolute URL in the request line
+            path = f"http://{split.netloc}{path}"
+            headers = dict(headers, **_proxy_headers(proxy))
+
+        with self._slot(key):
+            while True:
+                connection, reused = self._acquire(key)
+                try:
+                    if connection.sock is None:
+                        connection.connect()
+                        timings = {"connect": connection.connect_time, "tls": connection.tls_time}
+                    else:
+                        timings = {"connect": 0.0, "tls": 0.0}
+                    start = time.perf_counter()
+                    connection.request(method, path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    timings["ttfb"] = time.perf_counter() - start
+                    response.timings = timings
+                    break
+                except STALE_CONNECTION_ERRORS:
+                    connection.close()
+                    if reused:
+                        continue
+                    raise
+                except Exception:
+                    connection.close()
+                    raise
+
+            try:
+                yield response
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.isclosed() and not response.will_close:
+                self._release(key, connection)
+            else:
+                connection.close()
+
+    def close(self):
+        """ close
+
+            Close every idle connection.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection, _ in connections:
+                connection.close()
+
+    def _slot(self, key):
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(self.max_size)
+            return self._slots[key]
+
+    def _acquire(self, key):
+        now = time.monotonic()
+        with self._lock:
+            connections = self._idle.get(key, [])
+            while connections:
+                connection, last_used = connections.pop()
+                if now - last_used < self.idle_timeout:
+                    return connection, True
+                connection.close()
+
+        scheme, host, port = key
+        proxy = self._proxy(scheme, host)
+        if proxy is None:
+            if scheme == "https":
+                return TimedHTTPSConnection(host, port, timeout=self.timeout), False
+            return TimedHTTPConnection(host, port, timeout=self.timeout), False
+
+        proxy_split = urlsplit(proxy)
+        proxy_port = proxy_split.port or (443 if proxy_split.scheme == "https" else 80)
+        if scheme == "https":
+            # TLS to the endpoint inside a CONNECT tunnel
+            connection = TimedHTTPSConnection(proxy_split.hostname, proxy_port, timeout=self.timeout)
+            connection.set_tunnel(host, port or 443, headers=_proxy_headers(proxy))
+            return connection, False
+        return TimedHTTPConnection(proxy_split.hostname, proxy_port, timeout=self.timeout), False
+
+    def _proxy(self, scheme, host):
+        proxy = self.proxies.get(scheme)
+        if proxy is None or urllib.request.proxy_bypass_environment(host, self.proxies):
+            return None
+        # "host:port" without a scheme, as curl accepts it
+        return proxy if "://" in proxy else f"http://{proxy}"
+
+    def _release(self, key, connection):
+        with self._lock:
+            self._idle.setdefault(key, []).append((connection, time.monotonic()))
+
+
+def _proxy_headers(proxy):
+    split = urlsplit(proxy)
+    if split.username is None:
+        return {}
+    credentials = f"{unquote(split.username)}:{unquote(split.password or '')}"
+    return {"Proxy-Authorization": "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")}
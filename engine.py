@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+"""
+    engine.py
+
+    Declarative scenario engine
+    support version: Python 3.6.5
+
+    A scenario is data:
+    {
+        "name"  : string,
+        "values": callable returning {[name]: value} (optional, evaluated at start),
+        "steps" : [
+            {
+                "name"     : string (optional, referenced by "after"),
+                "title"    : string (e.g. "Mutation(createWork)"),
+                "query"    : GraphQL document,
+                "variables": variables, may contain Ref / Merge,
+                "expect"   : {[dotted path in data]: expected shape (see shape.py)},
+                "capture"  : {[name]: dotted path in data},
+                "message"  : success message, formatted with the scenario values,
+                "after"    : [names of earlier steps to wait for] (optional)
+            }
+        ],
+        "parallel": bool (default: True)
+    }
+
+    Steps run as a dependency graph: a step starts as soon as
+    - the steps capturing the values it refers to,
+    - the last mutation before it (a mutation waits for every step before it)
+    - and its "after" steps
+    are done, so independent queries between two mutations run at the same time.
+"""
+
+import copy
+import io
+import threading
+
+from batch import parse_operation
+from graphql import get_operation_name
+from shape import Merge, Ref, compile_shape
+
+
+class Step:
+    def __init__(self, step):
+        """ __init__
+
+            Compiled step: paths split once, operation name resolved once
+
+            @param step: step dict
+        """
+        self.title     = step["title"]
+        self.query     = step["query"]
+        self.operation = get_operation_name(step["query"])
+        self.variables = step.get("variables", {})
+        self.expect    = [compile_shape(value, _split_path(path)) for path, value in step.get("expect", {}).items()]
+        self.capture   = [(name, _split_path(path)) for name, path in step.get("capture", {}).items()]
+        self.message   = step.get("message", self.operation)
+        self.name      = step.get("name")
+        self.after     = step.get("after", [])
+        self.inputs    = _refs(self.variables) | _refs(list(step.get("expect", {}).values()))
+        self.outputs   = {name for name, _ in self.capture}
+        operation      = parse_operation(self.query)
+        # Unknown documents are ordered like mutations
+        self.is_mutation = operation is None or operation.operation_type != "query"
+        self.depends   = frozenset()
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_scenario(scenario):
+    """ compile_scenario
+
+        Compile a scenario once; later calls return the cached steps.
+
+        @param scenario: scenario dict
+    """
+    with _compiled_lock:
+        key = id(scenario)
+        if key not in _compiled or _compiled[key][0] is not scenario:
+            steps = [Step(step) for step in scenario["steps"]]
+            _link(steps)
+            _compiled[key] = (scenario, steps)
+        return _compiled[key][1]
+
+
+def _link(steps):
+    producers = {}
+    names = {}
+    last_mutation = None
+    for index, step in enumerate(steps):
+        depends = {producers[name] for name in step.inputs if name in producers}
+        for name in step.after:
+            if name not in names:
+                raise ValueError(f"Step {index + 1} ({step.title}) is after unknown or later step {name!r}")
+            depends.add(names[name])
+        if step.is_mutation:
+            depends.update(range(index))
+        elif last_mutation is not None:
+            depends.add(last_mutation)
+        step.depends = frozenset(depends)
+
+        for name in step.outputs:
+            producers[name] = index
+        if step.name is not None:
+            names[step.name] = index
+        if step.is_mutation:
+            last_mutation = index
+
+
+def resolve(template, values):
+    """ resolve
+
+        Replace every Ref / Merge in `template` with its value
+
+        @param template: value, dict or list
+        @param values  : scenario values
+    """
+    if isinstance(template, Ref):
+        return values[template.name]
+    if isinstance(template, Merge):
+        merged = dict(resolve(template.base, values))
+        merged.update(resolve(template.overrides, values))
+        return merged
+    if isinstance(template, dict):
+        return {key: resolve(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [resolve(value, values) for value in template]
+    return template
+
+
+def get_path(data, path):
+    """ get_path
+
+        @param data: response data
+        @param path: split dotted path (list indexes as int)
+    """
+    for key in path:
+        data = data[key]
+    return data
+
+
+def run_scenario(test, scenario):
+    """ run_scenario
+
+        Run every step in order, printing progress through `test`.
+
+        @param test    : Test (client, user_id and progress output)
+        @param scenario: scenario dict
+
+        result struct
+        [Exception] or None
+    """
+    values = {"user_id": test.user_id}
+    if "values" in scenario:
+        if scenario["name"] not in test.scenario_values:
+            test.scenario_values[scenario["name"]] = scenario["values"]()
+        values.update(test.scenario_values[scenario["name"]])
+    errors = []
+
+    steps = compile_scenario(scenario)
+    if scenario.get("parallel", True):
+        _run_graph(test, steps, values, errors)
+    else:
+        for process_count, step in enumerate(steps, start=1):
+            run_step(test, step, process_count, values, errors)
+
+    if len(errors) == 0:
+        return None
+    else:
+        return errors
+
+
+def run_step(test, step, process_count, values, errors):
+    """ run_step
+
+        @param test         : Test
+        @param step         : compiled Step
+        @param process_count: step number
+        @param values       : scenario values, updated with captured outputs
+        @param errors       : errors of the scenario, appended on failure
+    """
+    test._print_process_forward(step.title, process_count)
+    # A value an earlier step failed to capture: that step failed already, skip this one
+    missing = sorted(name for name in step.inputs - step.outputs if name not in values)
+    if len(missing) != 0:
+        test._print_process_backward(f"Skipped, not captured: {', '.join(missing)}", False)
+        errors.append(Exception(f"{step.title} skipped, not captured: {', '.join(missing)}"))
+        return
+    result = test.client.graphql_request(step.query, resolve(step.variables, values))
+
+    if "errors" not in result["body"].keys():
+        try:
+            data = result["body"]["data"]
+            for name, path in step.capture:
+                values[name] = get_path(data, path)
+            diffs = [diff for shape in step.expect for diff in shape.diff(data, values)]
+            if len(diffs) == 0:
+                test._print_process_backward(step.message.format(**values), True)
+            else:
+                test._print_process_backward(
+                    "Not assumed response value: " + ", ".join(f"{path} {message}" for path, message in diffs),
+                    False
+                )
+                errors.append(Exception(result["body"]))
+        except Exception as e:
+            test._print_process_backward(e, False)
+            errors.append(Exception(result["body"]))
+    else:
+        test._print_process_backward(result["body"], False)
+        errors.append(Exception(result["body"]))
+
+
+def _run_graph(test, steps, values, errors):
+    cond = threading.Condition()
+    outputs = [None] * len(steps)
+    pending = list(range(len(steps)))
+    running = set()
+    finished = set()
+    failures = []
+
+    def execute(index):
+        # Own copy of the Test: progress output and current step per thread
+        worker = copy.copy(test)
+        worker.output = outputs[index] = io.StringIO()
+        try:
+            run_step(worker, steps[index], index + 1, values, errors)
+        except Exception as e:
+            failures.append(e)
+        with cond:
+            running.discard(index)
+            finished.add(index)
+            cond.notify()
+
+    printed = 0
+    with cond:
+        while True:
+            if len(failures) == 0:
+                for index in [index for index in pending if steps[index].depends <= finished]:
+                    pending.remove(index)
+                    running.add(index)
+                    threading.Thread(target=execute, args=(index,), daemon=True).start()
+            # Progress in step order, each step as soon as the ones before it are printed
+            while printed in finished:
+                print(outputs[printed].getvalue(), end="", file=test.output)
+                printed += 1
+            if len(running) == 0:
+                break
+            cond.wait()
+
+    if len(failures) != 0:
+        raise failures[0]
+
+
+def _refs(template):
+    if isinstance(template, Ref):
+        return {template.name}
+    if isinstance(template, Merge):
+        return _refs(template.base) | _refs(template.overrides)
+    if isinstance(template, dict):
+        return set().union(*[_refs(value) for value in template.values()])
+    if isinstance(template, list):
+        return set().union(*[_refs(value) for value in template])
+    return set()
+
+
+def _split_path(path):
+    if path == "":
+        return []
+    return [int(key) if key.isdigit() else key for key in path.split(".")]
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+    fanout.py
+
+    Run the tests against several deployments (endpoint / Cognito region profiles) at once
+    support version: Python 3.6.5
+
+    Every profile is signed in at the same time, then runs the whole test list
+    with its own client, connection pool, latency recorder and journal. A release
+    check across all regions takes as long as the slowest one.
+
+    Profiles file (JSON):
+    [
+        {"name": "tokyo", "appsync_url": "https://...", "region_name": "ap-northeast-1", "client_id": "..."},
+        {"name": "virginia-stg", "appsync_url": "https://...", "region_name": "us-east-1", "client_id": "...",
+         "username": "...", "password": "..."},
+        {"name": "local", "local": true, "latency_ms": 20}
+    ]
+    username / password default to the USERNAME / PASSWORD of the environment.
+"""
+
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from test import Test
+
+from graphql import GraphQL
+from metrics import LatencyRecorder
+from results import ResultWriter
+from retry import RetryPolicy
+from token_cache import CognitoSession
+
+import cognito
+import journal
+from bcolors import bcolors
+
+REQUIRED_KEYS = ["appsync_url", "region_name", "client_id"]
+
+
+class FailureCounter:
+    def __init__(self):
+        """ __init__
+
+            GraphQL client observer: requests and failed requests (HTTP error or GraphQL errors) per operation
+        """
+        self.requests = {}
+        self.failures = {}
+
+    def __call__(self, timing):
+        """ __call__
+
+            @param timing: timing record sent by the GraphQL client
+        """
+        operation = timing["operation"]
+        self.requests[operation] = self.requests.get(operation, 0) + 1
+        if timing["status"] >= 400 or timing["errors"] is not None:
+            self.failures[operation] = self.failures.get(operation, 0) + 1
+
+
+def read_profiles(path, username=None, password=None):
+    """ read_profiles
+
+        @param path    : profiles file (JSON list)
+        @param username: default cognito username
+        @param password: default cognito password
+
+        result struct
+        [
+            {
+                "name"       : string,
+                "local"      : boolean (run against a local_server.LocalAppSync),
+                "appsync_url": string,
+                "region_name": string,
+                "client_id"  : string,
+                "username"   : string,
+                "password"   : string or None
+            }
+        ]
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or len(entries) == 0:
+        raise ValueError(f"{path}: expected a non-empty list of profiles")
+
+    profiles = []
+    for index, entry in enumerate(entries):
+        name = entry.get("name", f"profile-{index + 1}")
+        local = bool(entry.get("local", False))
+        missing = [key for key in REQUIRED_KEYS if entry.get(key) is None] if not local else []
+        if len(missing) != 0:
+            raise ValueError(f"{path}: profile {name} has no {', '.join(missing)}")
+        if any(profile["name"] == name for profile in profiles):
+            raise ValueError(f"{path}: profile {name} is defined twice")
+        profile = dict(entry, name=name, local=local)
+        profile["username"] = entry.get("username", username if username is not None else ("local-user" if local else None))
+        profile["password"] = entry.get("password", password)
+        if profile["username"] is None:
+            raise ValueError(f"{path}: profile {name} has no username (set it, or USERNAME)")
+        profiles.append(profile)
+    return profiles
+
+
+def sign_in_profiles(profiles):
+    """ sign_in_profiles
+
+        Sign in to the Cognito pool of every profile at the same time, reusing cached tokens.
+        Local profiles start their local server.
+
+        @param profiles: result of read_profiles (passwords filled in)
+
+        result struct
+        (
+            sessions: {[profile name]: {"session": CognitoSession or LocalSession, "user_id": string, "url": string, "server": LocalAppSync or None}},
+            failures: [(profile name, Exception)]
+        )
+    """
+    def sign_in(profile):
+        server = None
+        if profile["local"]:
+            import local_server
+            server = local_server.LocalAppSync(
+                latency=profile.get("latency_ms", 0) / 1000,
+                error_rate=profile.get("error_rate", 0),
+                throttle_rate=profile.get("throttle_rate", 0),
+            ).start()
+            session = local_server.LocalSession(server, profile["username"])
+        else:
+            session = CognitoSession(profile["username"], profile["password"], profile["region_name"], profile["client_id"])
+        return session, server, session.auth()
+
+    with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+        results = list(executor.map(sign_in, profiles))
+
+    sessions = {}
+    failures = []
+    for profile, (session, server, auth) in zip(profiles, results):
+        if isinstance(auth, Exception):
+            failures.append((profile["name"], auth))
+            continue
+        sessions[profile["name"]] = {
+            "session": session,
+            "user_id": cognito.formatAuth(auth)["payload"]["sub"],
+            "url"    : server.url if server is not None else profile["appsync_url"],
+            "server" : server,
+        }
+    return sessions, failures
+
+
+def journal_path(path, profile_name):
+    """ journal_path
+
+        Journal file of one profile: a user id is only valid in its own Cognito pool
+
+        @param path        : --journal file
+        @param profile_name: profile name
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}-{profile_name}{ext}"
+
+
+def run_profile(name, signed_in, results_path=None, run_id=None, journal_file=None, retries=2, cleanup=True):
+    """ run_profile
+
+        Run the test list against one profile, cleaning up its journal before and after.
+
+        @param name        : profile name
+        @param signed_in   : sign_in_profiles session entry of the profile
+        @param results_path: JSONL results file (optional)
+        @param run_id      : run id, written as `run_id/name` on every results line
+        @param journal_file: journal file of the profile (optional)
+        @param retries     : retries of queries and throttled requests
+        @param cleanup     : delete the data of the journal (otherwise only record it)
+
+        result struct
+        {
+            "name"    : string,
+            "output"  : string,
+            "tests"   : number,
+            "errors"  : [[Exception]],
+            "elapsed" : number (seconds),
+            "recorder": LatencyRecorder,
+            "failures": FailureCounter,
+            "cleanup" : [string] (cleanup problems)
+        }
+    """
+    start = time.perf_counter()
+    user_id = signed_in["user_id"]
+    session = signed_in["session"]
+    recorder = LatencyRecorder()
+    failures = FailureCounter()
+    writer = ResultWriter(results_path, f"{run_id}/{name}") if results_path is not None else None
+    journal_writer = journal.Journal(journal_file, user_id) if journal_file is not None else None
+    observers = [recorder, failures] + [observer for observer in (writer, journal_writer) if observer is not None]
+    client = GraphQL(signed_in["url"], session.id_token, observers=observers, retry_policy=RetryPolicy(max_attempts=retries + 1))
+    output = io.StringIO()
+    cleanup_problems = []
+    errors = []
+    test_list = []
+    session.start_refresh(lambda token: setattr(client, "jwt_token", token))
+    try:
+        if cleanup:
+            cleanup_problems += _cleanup(journal_file, signed_in["url"], user_id, session.id_token)
+        test = Test(user_id, client, output, writer)
+        test_list = test.get_test_list()
+        for test_index, entry in enumerate(test_list):
+            print(f"\n[{test_index + 1}/{len(test_list)}] Execute Test: {entry['name']}", file=output)
+            test.scenario = entry["name"]
+            error = entry["exec"]()
+            if error is not None:
+                errors.append(error)
+        if cleanup:
+            cleanup_problems += _cleanup(journal_file, signed_in["url"], user_id, client.jwt_token)
+    finally:
+        client.close()
+        session.stop()
+        if writer is not None:
+            writer.close()
+        if journal_writer is not None:
+            journal_writer.close()
+
+    return {
+        "name"    : name,
+        "output"  : output.getvalue(),
+        "tests"   : len(test_list),
+        "errors"  : errors,
+        "elapsed" : time.perf_counter() - start,
+        "recorder": recorder,
+        "failures": failures,
+        "cleanup" : cleanup_problems,
+    }
+
+
+def _cleanup(path, url, user_id, jwt):
+    if path is None or len(journal.read_journal(path)) == 0:
+        return []
+    client = GraphQL(url, jwt)
+    try:
+        summary = journal.cleanup(path, {user_id: client})
+    finally:
+        client.close()
+    problems = [str(error) for error in summary["errors"]]
+    if summary["left"] != 0:
+        problems.append(f"{summary['left']} entities left in {path}")
+    return problems
+
+
+def run_fanout(sessions, results_path=None, run_id=None, journal_base=None, retries=2, cleanup=True):
+    """ run_fanout
+
+        Run every profile at the same time.
+
+        @param sessions    : result of sign_in_profiles
+        @param results_path: JSONL results file every profile appends to (optional)
+        @param run_id      : run id of the results lines
+        @param journal_base: --journal file, one journal per profile is derived from it (optional)
+        @param retries     : retries of queries and throttled requests
+        @param cleanup     : delete the data of the journals (otherwise only record it)
+
+        result struct
+        [run_profile result], in profile order; a profile that raised has every test failed with the exception
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(sessions)) as executor:
+        futures = [
+            executor.submit(
+                run_profile,
+                name,
+                signed_in,
+                results_path,
+                run_id,
+                journal_path(journal_base, name) if journal_base is not None else None,
+                retries,
+                cleanup,
+            )
+            for name, signed_in in sessions.items()
+        ]
+        results = []
+        for name, future in zip(sessions, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(_failed_profile(name, e, time.perf_counter() - start))
+        return results
+
+
+def _failed_profile(name, error, elapsed):
+    test_count = len(Test(None, None).get_test_list())
+    return {
+        "name"    : name,
+        "output"  : f"\n{bcolors.FAIL}Failed{bcolors.ENDC} {type(error).__name__}: {error}\n",
+        "tests"   : test_count,
+        "errors"  : [[error]] * test_count,
+        "elapsed" : elapsed,
+        "recorder": LatencyRecorder(),
+        "failures": FailureCounter(),
+        "cleanup" : [],
+    }
+
+
+def print_report(results):
+    """ print_report
+
+        Side-by-side p50 / p99 latency and failed requests per operation and profile,
+        then tests failed and wall time per profile.
+
+        @param results: result of run_fanout
+    """
+    width = max(16, max(len(result["name"]) for result in results) + 2)
+    operations = sorted({operation for result in results for operation, _ in result["recorder"].histograms})
+
+    print("""
+╔═╗┌─┐┌┬┐┌─┐┌─┐┬─┐┬┌─┐┌─┐┌┐┌
+║  │ ││││├─┘├─┤├┬┘│└─┐│ ││││
+╚═╝└─┘┴ ┴┴  ┴ ┴┴└─┴└─┘└─┘┘└┘
+""")
+    print(f"{'operation':<24}" + "".join(f"{result['name']:>{width}}" for result in results))
+    print(f"{'':<24}" + "".join(f"{'p50/p99 ms':>{width}}" for _ in results))
+    for operation in operations:
+        cells = []
+        for result in results:
+            histogram = result["recorder"].histograms.get((operation, "total"))
+            if histogram is None:
+                cells.append(f"{'-':>{width}}")
+                continue
+            cell = f"{histogram.percentile(50) * 1000:.1f}/{histogram.percentile(99) * 1000:.1f}"
+            failed = result["failures"].failures.get(operation, 0)
+            if failed != 0:
+                cell += f" ({failed}x)"
+            cells.append(f"{bcolors.FAIL if failed != 0 else bcolors.OKGREEN}{cell:>{width}}{bcolors.ENDC}")
+        print(f"{operation:<24}" + "".join(cells))
+
+    print()
+    cells = []
+    for result in results:
+        failed = len(result["errors"])
+        cell = f"{result['tests'] - failed}/{result['tests']}"
+        cells.append(f"{bcolors.FAIL if failed != 0 else bcolors.OKGREEN}{cell:>{width}}{bcolors.ENDC}")
+    print(f"{'tests passed':<24}" + "".join(cells))
+    print(f"{'wall s':<24}" + "".join(f"{result['elapsed']:>{width}.2f}" for result in results))
+    print(f"{bcolors.INFO}(Nx): failed requests (HTTP error or GraphQL errors), including the expected ones{bcolors.ENDC}")
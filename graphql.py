@@ -7,49 +7,257 @@
     support version: Python 3.6.5
 """
 
+import io
 import json
-import urllib
+import re
+import time
+import urllib.error
+
+import batch
+import metrics
+import query_cache
+import retry
+import streaming
+from connection_pool import ConnectionPool
+
+# First top-level field of a document, skipping an alias
+ROOT_FIELD_PATTERN = re.compile(r"\{\s*(?:\w+\s*:\s*)?(\w+)")
+
+
+def get_operation_name(query, operation_name=None):
+    """ get_operation_name
+
+        Name used to tag a request in reports: operation_name when given,
+        otherwise the first root field (e.g. `createUser`).
+
+        @param query         : GraphQL request query
+        @param operation_name: GraphQL request operation_name
+    """
+    if operation_name is not None:
+        return operation_name
+    match = ROOT_FIELD_PATTERN.search(query)
+    return match.group(1) if match is not None else "anonymous"
 
 
 class GraphQL:
-    def __init__(self, url, jwt_token):
+    def __init__(self, url, jwt_token, pool=None, observers=None, batch_window=None, batch_size=10, batch_mode="alias",
+                 persisted_queries=False, retry_policy=None, rate_limiter=None, concurrency_limiter=None):
         """ __init__
 
-            @param url      : GraphQL Endpoint URL
-            @param jwt_token: jwt token
+            Query documents are sent normalized (query_cache.normalize), computed once per document.
+
+            @param url                : GraphQL Endpoint URL
+            @param jwt_token          : jwt token
+            @param pool               : ConnectionPool (optional, shared keep-alive connections)
+            @param observers          : callables receiving a timing record per request (see metrics.LatencyRecorder)
+            @param batch_window       : seconds to collect queries from other threads into one request (default: no batching)
+            @param batch_size         : max queries in one batched request
+            @param batch_mode         : "alias" (merged document) or "array" (array of operations)
+            @param persisted_queries  : send only the query hash first (automatic persisted queries, not supported by AppSync)
+            @param retry_policy       : retry.RetryPolicy (default: 3 attempts, queries and throttled requests only)
+            @param rate_limiter       : ratelimit.TokenBucket taken before every attempt, slowed down when throttled (optional)
+            @param concurrency_limiter: concurrency.AdaptiveConcurrency, in-flight limit per operation (optional)
         """
-        self.url       = url
-        self.jwt_token = jwt_token
+        self.url                 = url
+        self.pool                = pool if pool is not None else ConnectionPool()
+        self.observers           = observers if observers is not None else []
+        self.persisted_queries   = persisted_queries
+        self.retry_policy        = retry_policy if retry_policy is not None else retry.RetryPolicy()
+        self.rate_limiter        = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self._batcher            = None
+        self.jwt_token           = jwt_token
+        if batch_window is not None:
+            self._batcher = batch.Batcher(self._send, batch_window, batch_size, batch_mode)
+
+    @property
+    def jwt_token(self):
+        """ jwt_token
+
+            Setting a new token (e.g. after a refresh) rebuilds the request headers
+        """
+        return self._jwt_token
+
+    @jwt_token.setter
+    def jwt_token(self, jwt_token):
+        self._jwt_token = jwt_token
+        self._headers = {
+            "Content-Type" : "application/json",
+            "Authorization": jwt_token
+        }
+        self._stream_headers = dict(self._headers, Accept="multipart/mixed; deferSpec=20220824, application/x-ndjson, application/json")
 
     def graphql_request(self, query, variables, operation_name=None):
         """ graphql_request
 
+            Transient failures are retried according to retry_policy.
+
             @param query         : GraphQL request query
             @param variables     : GraphQL request variables
             @param operation_name: GraphQL request operation_name
         """
 
-        obj = {
-            "operationName": operation_name,
-            "query"        : query,
-            "variables"    : variables
+        start = time.perf_counter()
+        limit = self.concurrency_limiter.get(get_operation_name(query, operation_name)) if self.concurrency_limiter is not None else None
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            permit = limit.acquire() if limit is not None else None
+            try:
+                if self._batcher is not None and batch.is_batchable(query):
+                    response, result = self._batcher.submit(query_cache.prepare(query).text, variables, operation_name)
+                else:
+                    response, result = self._send_prepared(query_cache.prepare(query), variables, operation_name)
+            except retry.TRANSPORT_ERRORS as e:
+                if limit is not None:
+                    limit.release(permit, dropped=True)
+                if not self.retry_policy.should_retry(query, attempt, error=e):
+                    raise
+                time.sleep(self.retry_policy.backoff(attempt))
+                continue
+            except BaseException:
+                if limit is not None:
+                    limit.release(permit)
+                raise
+
+            body = result if result is not None else _error_body(response)
+            throttled = retry.is_throttled(response.status, body)
+            if limit is not None:
+                limit.release(permit, dropped=throttled or response.status >= 500)
+            if self.rate_limiter is not None:
+                if throttled:
+                    self.rate_limiter.throttled()
+                else:
+                    self.rate_limiter.succeeded()
+            if not self.retry_policy.should_retry(query, attempt, response.status, body):
+                break
+            time.sleep(self.retry_policy.backoff(attempt, response.headers.get("Retry-After")))
+        self._notify(query, variables, operation_name, response, result, start, attempt)
+
+        if response.status >= 400:
+            raise urllib.error.HTTPError(
+                self.url,
+                response.status,
+                response.reason,
+                response.headers,
+                io.BytesIO(response.body)
+            )
+        return {
+            "status": response.status,
+            "body"  : result
         }
-        json_data = json.dumps(obj).encode("utf-8")
-        headers = {
-            "Content-Type" : "application/json",
-            "Authorization": self.jwt_token
+
+    def graphql_request_many(self, requests):
+        """ graphql_request_many
+
+            Several queries in one round trip (mutations are sent one by one, in order).
+
+            @param requests: [(query, variables, operation_name)]
+        """
+        if not all(batch.is_batchable(query) for query, _, _ in requests):
+            return [self.graphql_request(*request) for request in requests]
+
+        start = time.perf_counter()
+        body, keys = batch.merge_operations(requests)
+        response, result = self._send(body)
+        results = batch.split_result(result, keys) if result is not None else None
+        if results is None:
+            return [self.graphql_request(*request) for request in requests]
+
+        for (query, variables, operation_name), request_result in zip(requests, results):
+            self._notify(query, variables, operation_name, response, request_result, start)
+        return [{"status": response.status, "body": request_result} for request_result in results]
+
+    def graphql_request_stream(self, query, variables, operation_name=None):
+        """ graphql_request_stream
+
+            Yield response payloads as they arrive: one for a plain JSON response,
+            one per line for NDJSON, one per part for multipart/mixed incremental
+            delivery (`@defer` / `@stream`). Merge them with streaming.merge_incremental.
+
+            @param query         : GraphQL request query
+            @param variables     : GraphQL request variables
+            @param operation_name: GraphQL request operation_name
+        """
+        json_data = query_cache.prepare(query).body(variables, operation_name)
+
+        start = time.perf_counter()
+        with self.pool.stream(self.url, json_data, self._stream_headers) as response:
+            if response.status >= 400:
+                body = response.read()
+                self._notify(query, variables, operation_name, response, None, start)
+                raise urllib.error.HTTPError(self.url, response.status, response.reason, response.headers, io.BytesIO(body))
+
+            content_type = response.headers.get_content_type()
+            if content_type == "multipart/mixed":
+                payloads = streaming.iter_multipart(response, response.headers.get_param("boundary", "-"))
+            elif content_type in ("application/x-ndjson", "application/jsonl"):
+                payloads = streaming.iter_ndjson(response)
+            else:
+                payloads = iter([streaming.loads(response.read())])
+
+            body_start = time.perf_counter()
+            errors = []
+            for payload in payloads:
+                errors += payload.get("errors", [])
+                errors += [error for item in payload.get("incremental", []) for error in item.get("errors", [])]
+                yield payload
+            response.timings["body"] = time.perf_counter() - body_start
+        self._notify(query, variables, operation_name, response, {"errors": errors} if len(errors) != 0 else {}, start)
+
+    def _send_prepared(self, prepared, variables, operation_name):
+        if not self.persisted_queries:
+            return self._send_body(prepared.body(variables, operation_name))
+
+        response, result = self._send_body(prepared.body(variables, operation_name, with_query=False, persisted=True))
+        if query_cache.is_not_found(result if result is not None else _error_body(response)):
+            # First use of the document: register it with the full text
+            response, result = self._send_body(prepared.body(variables, operation_name, persisted=True))
+        return response, result
+
+    def _send(self, obj):
+        return self._send_body(json.dumps(obj).encode("utf-8"))
+
+    def _send_body(self, json_data):
+        response = self.pool.request(self.url, json_data, self._headers)
+        if response.status >= 400:
+            return response, None
+        decode_start = time.perf_counter()
+        result = streaming.loads(response.body)
+        response.timings["decode"] = time.perf_counter() - decode_start
+        return response, result
+
+    def _notify(self, query, variables, operation_name, response, result, start, attempts=1):
+        if len(self.observers) == 0:
+            return
+        timings = dict(response.timings)
+        timings["total"] = time.perf_counter() - start
+        timing = {
+            "operation": get_operation_name(query, operation_name),
+            "step"     : metrics.get_step(),
+            "query"    : query,
+            "variables": variables,
+            "status"   : response.status,
+            "errors"   : result.get("errors") if isinstance(result, dict) else None,
+            "data"     : result.get("data") if isinstance(result, dict) else None,
+            "timings"  : timings,
+            "attempts" : attempts,
         }
+        for observer in self.observers:
+            observer(timing)
+
+    def close(self):
+        """ close
+
+            Close pooled connections
+        """
+        self.pool.close()
+
 
-        request = urllib.request.Request(
-            self.url,
-            data=json_data,
-            headers=headers,
-            method="POST"
-        )
-        with urllib.request.urlopen(request) as response:
-            response_body = response.read().decode("utf-8")
-            result = json.loads(response_body.split('\n')[0])
-            return {
-                "status": response.status,
-                "body"  : result
-            }
+def _error_body(response):
+    try:
+        return streaming.loads(response.body)
+    except ValueError:
+        return None
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+    journal.py
+
+    Journal of the test data created by a run, and cleanup of what is left
+    support version: Python 3.6.5
+
+    A Journal is a GraphQL client observer: every user / work returned by a
+    create* mutation is appended to a JSONL file as soon as the response arrives,
+    every delete* marks it deleted. Entities still alive at the end of the run
+    (or left by a crashed run, found on the next start) are deleted by `cleanup`,
+    in concurrent batches of aliased delete mutations.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import batch
+from results import ResultWriter
+from scenarios import DELETE_USER, DELETE_WORK
+
+# Root field name prefix -> journal record type
+ACTIONS = {"create": "created", "delete": "deleted"}
+
+# Entity name (root field without the prefix) -> delete mutation
+DELETE_MUTATIONS = {
+    "user": DELETE_USER % "id",
+    "work": DELETE_WORK % "id",
+}
+
+
+class Journal:
+    def __init__(self, path, owner):
+        """ __init__
+
+            GraphQL client observer. Lines are written unbuffered, so they
+            survive a crash; several clients and processes can share one file.
+
+            @param path : journal file (JSONL, appended)
+            @param owner: user id of the client's identity (the one who can delete the entities)
+        """
+        self.path    = path
+        self.owner   = owner
+        self._writer = ResultWriter(path, buffer_size=0)
+
+    def __call__(self, timing):
+        """ __call__
+
+            @param timing: timing record sent by the GraphQL client
+        """
+        data = timing.get("data")
+        if not isinstance(data, dict) or timing.get("query") is None:
+            return
+        operation = batch.parse_operation(timing["query"])
+        if operation is None or operation.operation_type != "mutation":
+            return
+        for key, field in operation.fields:
+            action, entity = _action(batch.NAME_PATTERN.match(field).group(0))
+            value = data.get(key)
+            if action is None or not isinstance(value, dict) or value.get("id") is None:
+                continue
+            self._writer.write({"type": action, "entity": entity, "id": value["id"], "owner": self.owner})
+
+    def close(self):
+        """ close
+
+            Close the journal file
+        """
+        self._writer.close()
+
+
+def _action(field_name):
+    for prefix, action in ACTIONS.items():
+        if field_name.startswith(prefix) and len(field_name) > len(prefix):
+            return action, field_name[len(prefix):].lower()
+    return None, None
+
+
+def read_journal(path):
+    """ read_journal
+
+        Entities created and not deleted since the journal was last compacted.
+        Deleting a user deletes its works too.
+
+        @param path: journal file
+
+        result struct
+        {
+            [owner user id]: {"user": {[id]}, "work": {[id]}}
+        }
+    """
+    alive = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Last line of a crashed run
+                    continue
+                entities = alive.setdefault(record["owner"], {"user": set(), "work": set()})
+                if record["entity"] not in entities:
+                    continue
+                if record["type"] == "created":
+                    entities[record["entity"]].add(record["id"])
+                elif record["type"] == "deleted":
+                    entities[record["entity"]].discard(record["id"])
+                    if record["entity"] == "user":
+                        entities["work"].clear()
+    except FileNotFoundError:
+        pass
+    return {owner: entities for owner, entities in alive.items() if any(len(ids) != 0 for ids in entities.values())}
+
+
+def cleanup(path, clients, batch_size=25, concurrency=8):
+    """ cleanup
+
+        Delete the entities left in the journal, then compact it down to
+        what could not be deleted (e.g. owners without a client).
+        Works of a user that is deleted too are not deleted one by one.
+
+        @param path       : journal file
+        @param clients    : {[owner user id]: GraphQL client signed in as that user}
+        @param batch_size : delete mutations per request
+        @param concurrency: requests in flight
+
+        result struct
+        {
+            "deleted": number,
+            "left"   : number (still in the journal),
+            "errors" : [Exception]
+        }
+    """
+    alive = read_journal(path)
+    requests = []
+    for owner, entities in alive.items():
+        if owner not in clients:
+            continue
+        works = entities["work"] if len(entities["user"]) == 0 else set()
+        for entity, ids in (("work", works), ("user", entities["user"])):
+            ids = sorted(ids)
+            for first in range(0, len(ids), batch_size):
+                requests.append((owner, entity, ids[first:first + batch_size]))
+
+    def delete(owner, entity, ids):
+        body, keys = batch.merge_operations([(DELETE_MUTATIONS[entity], {"id": entity_id}, None) for entity_id in ids])
+        try:
+            result = clients[owner].graphql_request(body["query"], body["variables"], body["operationName"])
+        except Exception as e:
+            return [], e
+        data = result["body"].get("data") or {}
+        errors = result["body"].get("errors") or []
+        failed = {error["path"][0] for error in errors if len(error.get("path") or []) != 0}
+        # Already gone (null without an error) counts as deleted
+        deleted = [
+            entity_id for entity_id, request_keys in zip(ids, keys)
+            if request_keys[0][0] in data and request_keys[0][0] not in failed
+        ]
+        return deleted, Exception(errors) if len(errors) != 0 else None
+
+    errors = []
+    deleted = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [(owner, entity, executor.submit(delete, owner, entity, ids)) for owner, entity, ids in requests]
+        for owner, entity, future in futures:
+            ids, error = future.result()
+            deleted.setdefault(owner, {"user": set(), "work": set()})[entity].update(ids)
+            if error is not None:
+                errors.append(error)
+
+    left = []
+    for owner, entities in alive.items():
+        user_deleted = len(deleted.get(owner, {}).get("user", ())) != 0
+        for entity, ids in entities.items():
+            for entity_id in sorted(ids):
+                if entity_id in deleted.get(owner, {}).get(entity, ()) or (entity == "work" and user_deleted):
+                    continue
+                left.append({"type": "created", "entity": entity, "id": entity_id, "owner": owner})
+    _compact(path, left)
+
+    return {
+        "deleted": sum(len(ids) for entities in alive.values() for ids in entities.values()) - len(left),
+        "left"   : len(left),
+        "errors" : errors,
+    }
+
+
+def _compact(path, records):
+    if not os.path.exists(path):
+        return
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(temporary, path)
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+"""
+    load.py
+
+    Open-loop load generation from the Test scenarios
+    support version: Python 3.6.5
+"""
+
+import io
+import itertools
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from test import Test
+
+from batch import NAME_PATTERN, parse_operation
+from bcolors import bcolors
+from graphql import get_operation_name
+from metrics import Histogram
+from scenarios import CREATE_USER, CREATE_WORK, IMAGE_URL
+
+
+class RecordingGraphQL:
+    def __init__(self, client):
+        """ __init__
+
+            Forward requests to `client` and keep every operation sent,
+            and the ids of the entities created by them.
+
+            @param client: GraphQL client
+        """
+        self.client     = client
+        self.operations = []
+        self.created    = {}
+
+    def graphql_request(self, query, variables, operation_name=None):
+        self.operations.append((query, variables, operation_name))
+        result = self.client.graphql_request(query, variables, operation_name)
+        operation = parse_operation(query)
+        data = result["body"].get("data") if isinstance(result["body"], dict) else None
+        if operation is not None and operation.operation_type == "mutation" and isinstance(data, dict):
+            for key, field in operation.fields:
+                name = NAME_PATTERN.match(field).group(0)
+                value = data.get(key)
+                if name.startswith("create") and isinstance(value, dict) and value.get("id") is not None:
+                    self.created.setdefault(name[len("create"):].lower(), []).append(value["id"])
+        return result
+
+
+class TimedGraphQL:
+    def __init__(self, client, stats):
+        """ __init__
+
+            Forward requests to `client` and record their service time.
+
+            @param client: GraphQL client
+            @param stats : LoadStats
+        """
+        self.client = client
+        self.stats  = stats
+
+    def graphql_request(self, query, variables, operation_name=None):
+        name = get_operation_name(query, operation_name)
+        start = time.monotonic()
+        try:
+            result = self.client.graphql_request(query, variables, operation_name)
+        except Exception:
+            self.stats.add(name, time.monotonic() - start, False)
+            raise
+        self.stats.add(name, time.monotonic() - start, "errors" not in result["body"])
+        return result
+
+
+class LoadStats:
+    def __init__(self):
+        self._lock       = threading.Lock()
+        self._histograms = {}
+        self._errors     = {}
+        self.started_at  = None
+        self.finished_at = None
+
+    def add(self, name, latency, is_success):
+        """ add
+
+            @param name      : operation name
+            @param latency   : seconds
+            @param is_success: request succeeded
+        """
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram()
+            self._histograms[name].record(latency)
+            self._errors[name] = self._errors.get(name, 0) + (0 if is_success else 1)
+
+    def summary(self):
+        """ summary
+
+            result struct
+            {
+                [operation name]: {
+                    "count"     : number,
+                    "throughput": number (requests / second),
+                    "error_rate": number (0 - 1),
+                    "p50"       : number (seconds),
+                    "p90"       : number (seconds),
+                    "p99"       : number (seconds),
+                    "max"       : number (seconds)
+                }
+            }
+        """
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        with self._lock:
+            return {
+                name: {
+                    "count"     : histogram.count,
+                    "throughput": histogram.count / elapsed if elapsed > 0 else 0,
+                    "error_rate": self._errors[name] / histogram.count,
+                    "p50"       : histogram.percentile(50),
+                    "p90"       : histogram.percentile(90),
+                    "p99"       : histogram.percentile(99),
+                    "max"       : histogram.max / 1000000,
+                }
+                for name, histogram in sorted(self._histograms.items())
+            }
+
+
+def arrival_times(rate, duration, ramp_up):
+    """ arrival_times
+
+        Intended send offsets (seconds) for a target rate that ramps up
+        linearly over `ramp_up` seconds, then holds until `duration`.
+
+        @param rate    : target requests per second
+        @param duration: total seconds
+        @param ramp_up : ramp-up seconds
+    """
+    ramp_up = min(ramp_up, duration)
+    ramp_count = rate * ramp_up / 2
+    for k in itertools.count():
+        if k < ramp_count:
+            offset = math.sqrt(2 * k * ramp_up / rate)
+        else:
+            offset = ramp_up + (k - ramp_count) / rate
+        if offset >= duration:
+            return
+        yield offset
+
+
+def run_load(jobs, rate, duration, ramp_up, stats, max_workers=256):
+    """ run_load
+
+        Start one job per arrival, open-loop: a job starts at its intended time
+        whether or not earlier jobs have finished. A job's latency is measured
+        from its intended start, so queueing delay is not hidden.
+
+        @param jobs       : [(name, callable returning True on success)], replayed round-robin
+        @param rate       : target requests per second
+        @param duration   : total seconds
+        @param ramp_up    : ramp-up seconds
+        @param stats      : LoadStats
+        @param max_workers: max jobs in flight
+    """
+
+    def execute(name, job, intended):
+        try:
+            is_success = job()
+        except Exception:
+            is_success = False
+        stats.add(name, time.monotonic() - intended, is_success)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    stats.started_at = time.monotonic()
+    try:
+        for (name, job), offset in zip(itertools.cycle(jobs), arrival_times(rate, duration, ramp_up)):
+            intended = stats.started_at + offset
+            delay = intended - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(execute, name, job, intended)
+    finally:
+        executor.shutdown(wait=True)
+        stats.finished_at = time.monotonic()
+    return stats
+
+
+def operation_jobs(user_id, client):
+    """ operation_jobs
+
+        Run every Test scenario once and turn each query it sent into a replayable job.
+        Mutations are not replayed: the recorded ones change or delete entities the
+        scenarios have deleted since, so they would fail because of the replay itself
+        (--load-target scenarios creates its own entities). The queries read a user and
+        a work created for the load, the recorded entity ids are bound to theirs.
+
+        @param user_id: Portal user id
+        @param client : GraphQL client
+    """
+    recorder = RecordingGraphQL(client)
+    Test(user_id, recorder, io.StringIO()).execute_test()
+    fixture = create_fixture(user_id, client)
+    bindings = {
+        recorded_id: fixture[entity]
+        for entity, ids in recorder.created.items() if entity in fixture
+        for recorded_id in ids
+    }
+
+    def replay(query, variables, operation_name):
+        return lambda: "errors" not in client.graphql_request(query, variables, operation_name)["body"]
+
+    jobs = []
+    for query, variables, operation_name in recorder.operations:
+        operation = parse_operation(query)
+        if operation is None or operation.operation_type != "query":
+            continue
+        jobs.append((get_operation_name(query, operation_name), replay(query, _bind(variables, bindings), operation_name)))
+    return jobs
+
+
+def create_fixture(user_id, client):
+    """ create_fixture
+
+        Create the user and one work read by the replayed queries
+
+        @param user_id: Portal user id
+        @param client : GraphQL client
+
+        result struct
+        {"user": string, "work": string}
+    """
+    user = client.graphql_request(CREATE_USER % "id", {
+        "user": {
+            "displayName": "AppSync-test load user",
+            "email"      : "AppSync-test@sample.xyz",
+            "career"     : "AppSync-test load",
+            "avatarUri"  : IMAGE_URL,
+            "message"    : "",
+        }
+    })["body"]
+    work = client.graphql_request(CREATE_WORK, {
+        "work": {
+            "userId"     : user_id,
+            "title"      : "AppSync-test load work",
+            "description": "AppSync-test load work",
+            "tags"       : ["AppSync-test"],
+            "imageUrl"   : IMAGE_URL,
+        }
+    })["body"]
+    for body in (user, work):
+        if "errors" in body or body.get("data") is None:
+            raise RuntimeError(f"Failed to create the load data: {body}")
+    return {"user": user["data"]["createUser"]["id"], "work": work["data"]["createWork"]["id"]}
+
+
+def _bind(template, bindings):
+    if isinstance(template, dict):
+        return {key: _bind(value, bindings) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_bind(value, bindings) for value in template]
+    if isinstance(template, str):
+        return bindings.get(template, template)
+    return template
+
+
+def scenario_seconds(user_id, client):
+    """ scenario_seconds
+
+        Mean duration of a Test scenario, run once each, without load
+
+        @param user_id: Portal user id
+        @param client : GraphQL client
+    """
+    test = Test(user_id, client, io.StringIO())
+    start = time.monotonic()
+    test.execute_test()
+    return (time.monotonic() - start) / len(test.get_test_list())
+
+
+def identities_needed(rate, seconds):
+    """ identities_needed
+
+        Scenarios in flight at `rate` (Little's law), with room for slower responses under load
+
+        @param rate   : target scenarios per second
+        @param seconds: mean scenario duration
+    """
+    return max(1, math.ceil(rate * seconds * 2))
+
+
+def scenario_jobs(identities, stats):
+    """ scenario_jobs
+
+        Each job runs a whole Test scenario. Operations inside it are recorded
+        by service time, the scenario by latency from its intended start.
+        Every scenario resets its user's data, so a job takes an identity no
+        other job is using, and waits for one when all are busy (the wait is
+        part of its latency).
+
+        @param identities: [(user_id, GraphQL client signed in as that user)]
+        @param stats     : LoadStats
+    """
+    idle = queue.Queue()
+    for user_id, client in identities:
+        idle.put((user_id, TimedGraphQL(client, stats)))
+
+    def scenario(test_index):
+        def job():
+            user_id, timed = idle.get()
+            try:
+                return Test(user_id, timed, io.StringIO()).get_test_list()[test_index]["exec"]() is None
+            finally:
+                idle.put((user_id, timed))
+        return job
+
+    return [
+        (f"scenario:{entry['name']}", scenario(test_index))
+        for test_index, entry in enumerate(Test(None, None).get_test_list())
+    ]
+
+
+def print_report(stats, rate):
+    """ print_report
+
+        @param stats: LoadStats
+        @param rate : target requests per second
+    """
+    print(f"""
+╦  ┌─┐┌─┐┌┬┐
+║  │ │├─┤ ││
+╩═╝└─┘┴ ┴─┴┘
+> Target rate: {bcolors.OKGREEN}{rate}{bcolors.ENDC} req/s
+> Elapsed    : {bcolors.OKGREEN}{stats.finished_at - stats.started_at:.1f}{bcolors.ENDC} s
+""")
+    print(f"{'operation':<32}{'count':>8}{'req/s':>10}{'errors':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in stats.summary().items():
+        error_color = bcolors.FAIL if row["error_rate"] > 0 else bcolors.OKGREEN
+        print(
+            f"{name:<32}{row['count']:>8}{row['throughput']:>10.1f}"
+            f"{error_color}{row['error_rate'] * 100:>8.1f}%{bcolors.ENDC}"
+            f"{row['p50'] * 1000:>10.1f}{row['p90'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}{row['max'] * 1000:>10.1f}"
+        )
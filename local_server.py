@@ -0,0 +1,1086 @@
+# -*- coding: utf-8 -*-
+
+"""
+    local_server.py
+
+    Local AppSync stand-in: the Portal schema on an in-memory store
+    support version: Python 3.6.5
+
+    Serves the operations used by the tests (createUser, getUser, updateUser,
+    deleteUser, createWork, getWork, updateWork, deleteWork, listWorks, listUsers)
+    over HTTP/1.1 keep-alive, with
+    - Authorization checked against locally minted HS256 JWTs (Cognito IdToken claims)
+    - injected latency, 5xx errors and throttling (429)
+    - aliases, variables, array batching and automatic persisted queries
+    - real-time subscriptions over WebSocket (AppSync graphql-ws protocol, GET /graphql/realtime)
+    Nothing leaves the machine: use it in CI, and to measure the client's own throughput ceiling.
+
+    $ python3 local_server.py --port 8000 --latency 20
+"""
+
+import argparse
+import base64
+import bisect
+import functools
+import hashlib
+import hmac
+import json
+import queue
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlsplit
+
+import websocket
+from bcolors import bcolors
+
+# JWT header of the minted tokens: kid / alg like a Cognito IdToken
+TOKEN_HEADER = {"kid": "local-key", "alg": "HS256"}
+TOKEN_ISSUER = "local-appsync"
+
+# AppSync response to a missing, invalid or expired token
+UNAUTHORIZED = {"errors": [{"errorType": "UnauthorizedException", "message": "Valid authorization header not provided."}]}
+
+DEFAULT_PAGE_SIZE = 20
+
+# Subscription field -> mutation it is subscribed to (@aws_subscribe)
+SUBSCRIPTION_MUTATIONS = {
+    "onCreateUser": "createUser",
+    "onUpdateUser": "updateUser",
+    "onDeleteUser": "deleteUser",
+    "onCreateWork": "createWork",
+    "onUpdateWork": "updateWork",
+    "onDeleteWork": "deleteWork",
+}
+
+
+class GraphQLError(Exception):
+    def __init__(self, message, error_type="Unknown"):
+        """ __init__
+
+            Error of one root field, returned in `errors` with its path
+
+            @param message   : error message
+            @param error_type: AppSync errorType
+        """
+        super().__init__(message)
+        self.error_type = error_type
+
+
+# Tokens
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def mint_token(secret, username, sub=None, expires_in=3600, email=None, display_name=None):
+    """ mint_token
+
+        HS256 JWT with the claims of a Cognito IdToken (cognito.formatAuth reads it)
+
+        @param secret      : signing key (bytes)
+        @param username    : cognito:username
+        @param sub         : user id (default: derived from the username, stable across runs)
+        @param expires_in  : seconds until exp
+        @param email       : email claim (default: <username>@local)
+        @param display_name: custom:display_name claim (default: username)
+    """
+    now = int(time.time())
+    claims = {
+        "sub"                : sub if sub is not None else str(uuid.uuid5(uuid.NAMESPACE_URL, f"local-appsync:{username}")),
+        "aud"                : TOKEN_ISSUER,
+        "email_verified"     : True,
+        "event_id"           : str(uuid.uuid4()),
+        "token_use"          : "id",
+        "auth_time"          : now,
+        "iss"                : TOKEN_ISSUER,
+        "cognito:username"   : username,
+        "custom:display_name": display_name if display_name is not None else username,
+        "exp"                : now + expires_in,
+        "iat"                : now,
+        "email"              : email if email is not None else f"{username}@local",
+    }
+    signing_input = _b64encode(json.dumps(TOKEN_HEADER, separators=(",", ":")).encode()) + "." + _b64encode(json.dumps(claims).encode())
+    signature = hmac.new(secret, signing_input.encode("ascii"), hashlib.sha256).digest()
+    return signing_input + "." + _b64encode(signature)
+
+
+def verify_token(secret, token):
+    """ verify_token
+
+        @param secret: signing key (bytes)
+        @param token : JWT, optionally prefixed by `Bearer `
+
+        result struct
+        claims, or None when the token is missing, malformed, forged or expired
+    """
+    if token is None:
+        return None
+    if token.startswith("Bearer "):
+        token = token[len("Bearer "):]
+    try:
+        signing_input, signature = token.rsplit(".", 1)
+        expected = hmac.new(secret, signing_input.encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        claims = json.loads(_b64decode(signing_input.split(".", 1)[1]).decode("utf-8"))
+    except (ValueError, IndexError, UnicodeError):
+        return None
+    return claims if claims.get("exp", 0) > time.time() else None
+
+
+# GraphQL documents
+
+TOKEN_PATTERN = re.compile(r'''
+    (?P<ignored>[\s,\ufeff]+|\#[^\n\r]*)
+  | (?P<spread>\.\.\.)
+  | (?P<punctuator>[!$&()\[\]{}:=@|])
+  | (?P<name>[_A-Za-z][_0-9A-Za-z]*)
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<block>"""(?:\\"""|[^"]|"(?!""))*""")
+  | (?P<string>"(?:\\.|[^"\\\n\r])*")
+''', re.VERBOSE)
+
+
+class Field:
+    def __init__(self, alias, name, arguments, selections):
+        """ __init__
+
+            @param alias     : response key
+            @param name      : field name
+            @param arguments : {[name]: value node}
+            @param selections: [Field] or None for a leaf
+        """
+        self.alias      = alias
+        self.name       = name
+        self.arguments  = arguments
+        self.selections = selections
+
+
+class Variable:
+    def __init__(self, name):
+        self.name = name
+
+
+class Document:
+    def __init__(self, operation_type, selections, defaults):
+        """ __init__
+
+            @param operation_type: "query" or "mutation"
+            @param selections    : root fields ([Field])
+            @param defaults      : {[variable name]: default value}
+        """
+        self.operation_type = operation_type
+        self.selections     = selections
+        self.defaults       = defaults
+
+
+@functools.lru_cache(maxsize=1024)
+def parse(query):
+    """ parse
+
+        Parse a single-operation document (no fragments, directives are ignored).
+        Raises ValueError on a syntax error.
+
+        @param query: GraphQL request query
+    """
+    return _Parser(query).document()
+
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = []
+        index = 0
+        while index < len(text):
+            match = TOKEN_PATTERN.match(text, index)
+            if match is None:
+                raise ValueError(f"Syntax Error: unexpected character {text[index]!r} at {index}")
+            if match.lastgroup != "ignored":
+                self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            index = match.end()
+        self.index = 0
+
+    def document(self):
+        operation_type = "query"
+        defaults = {}
+        if self._peek()[0] == "name" and self._peek()[1] in ("query", "mutation", "subscription"):
+            operation_type = self._next()[1]
+            if self._peek()[0] == "name":
+                self._next()
+            if self._peek() == ("punctuator", "("):
+                defaults = self._variable_definitions()
+        while self._peek() == ("punctuator", "@"):
+            self._directive()
+        selections = self._selection_set()
+        if self.index != len(self.tokens):
+            raise ValueError("Syntax Error: only one operation per document is supported")
+        return Document(operation_type, selections, defaults)
+
+    def _variable_definitions(self):
+        defaults = {}
+        self._expect("(")
+        while self._peek() != ("punctuator", ")"):
+            self._expect("$")
+            name = self._expect_name()
+            self._expect(":")
+            self._type()
+            if self._peek() == ("punctuator", "="):
+                self._next()
+                defaults[name] = self._value(const=True)
+        self._expect(")")
+        return defaults
+
+    def _type(self):
+        if self._peek() == ("punctuator", "["):
+            self._next()
+            self._type()
+            self._expect("]")
+        else:
+            self._expect_name()
+        if self._peek() == ("punctuator", "!"):
+            self._next()
+
+    def _selection_set(self):
+        self._expect("{")
+        selections = []
+        while self._peek() != ("punctuator", "}"):
+            if self._peek()[0] == "spread":
+                raise ValueError("Syntax Error: fragments are not supported")
+            name = self._expect_name()
+            alias = name
+            if self._peek() == ("punctuator", ":"):
+                self._next()
+                name = self._expect_name()
+            arguments = {}
+            if self._peek() == ("punctuator", "("):
+                self._next()
+                while self._peek() != ("punctuator", ")"):
+                    argument = self._expect_name()
+                    self._expect(":")
+                    arguments[argument] = self._value()
+                self._expect(")")
+            while self._peek() == ("punctuator", "@"):
+                self._directive()
+            children = self._selection_set() if self._peek() == ("punctuator", "{") else None
+            selections.append(Field(alias, name, arguments, children))
+        self._expect("}")
+        if len(selections) == 0:
+            raise ValueError("Syntax Error: empty selection set")
+        return selections
+
+    def _directive(self):
+        self._expect("@")
+        self._expect_name()
+        if self._peek() == ("punctuator", "("):
+            self._next()
+            while self._peek() != ("punctuator", ")"):
+                self._expect_name()
+                self._expect(":")
+                self._value()
+            self._expect(")")
+
+    def _value(self, const=False):
+        kind, text = self._next()
+        if kind == "punctuator" and text == "$" and not const:
+            return Variable(self._expect_name())
+        if kind == "number":
+            return float(text) if any(c in text for c in ".eE") else int(text)
+        if kind == "string":
+            return json.loads(text)
+        if kind == "block":
+            return text[3:-3].replace('\\"""', '"""')
+        if kind == "name":
+            return {"true": True, "false": False, "null": None}.get(text, text)
+        if kind == "punctuator" and text == "[":
+            values = []
+            while self._peek() != ("punctuator", "]"):
+                values.append(self._value(const))
+            self._next()
+            return values
+        if kind == "punctuator" and text == "{":
+            values = {}
+            while self._peek() != ("punctuator", "}"):
+                name = self._expect_name()
+                self._expect(":")
+                values[name] = self._value(const)
+            self._next()
+            return values
+        raise ValueError(f"Syntax Error: unexpected {text!r}")
+
+    def _peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None)
+
+    def _next(self):
+        token = self._peek()
+        if token[0] is None:
+            raise ValueError("Syntax Error: unexpected end of document")
+        self.index += 1
+        return token
+
+    def _expect(self, punctuator):
+        token = self._next()
+        if token != ("punctuator", punctuator):
+            raise ValueError(f"Syntax Error: expected {punctuator!r}, found {token[1]!r}")
+
+    def _expect_name(self):
+        kind, text = self._next()
+        if kind != "name":
+            raise ValueError(f"Syntax Error: expected a name, found {text!r}")
+        return text
+
+
+def _argument_values(arguments, variables):
+    def resolve(value):
+        if isinstance(value, Variable):
+            return variables.get(value.name)
+        if isinstance(value, list):
+            return [resolve(item) for item in value]
+        if isinstance(value, dict):
+            return {key: resolve(item) for key, item in value.items()}
+        return value
+    return {name: resolve(value) for name, value in arguments.items()}
+
+
+# Store
+
+
+class Store:
+    def __init__(self):
+        """ __init__
+
+            Users and works in memory. Lists are kept in creation order
+            (sorted sequence numbers), so a page is a bisect, like a DynamoDB query.
+        """
+        self.users       = {}
+        self.works       = {}
+        self._lock       = threading.Lock()
+        self._sequence   = 0
+        self._user_order = []
+        self._work_order = []
+        self._user_works = {}
+
+    def _next_sequence(self):
+        self._sequence += 1
+        return self._sequence
+
+    # Query
+
+    def get_user(self, claims, id):
+        with self._lock:
+            user = self.users.get(id)
+            return self._user_view(user) if user is not None else None
+
+    def get_work(self, claims, id):
+        with self._lock:
+            work = self.works.get(id)
+            return _public(work) if work is not None else None
+
+    def list_works(self, claims, limit=None, exclusiveStartKey=None):
+        with self._lock:
+            return self._page(self._work_order, self.works, limit, exclusiveStartKey)
+
+    def list_users(self, claims, limit=None, exclusiveStartKey=None):
+        with self._lock:
+            page = self._page(self._user_order, self.users, limit, exclusiveStartKey)
+            page["items"] = [self._user_view(self.users[item["id"]]) for item in page["items"]]
+            return page
+
+    # Mutation
+
+    def create_user(self, claims, user):
+        with self._lock:
+            if claims["sub"] in self.users:
+                raise GraphQLError(f"User {claims['sub']} already exists", "DynamoDB:ConditionalCheckFailedException")
+            record = dict(_stored(user), id=claims["sub"], _sequence=self._next_sequence())
+            self.users[record["id"]] = record
+            self._user_order.append((record["_sequence"], record["id"]))
+            self._user_works[record["id"]] = []
+            return self._user_view(record)
+
+    def update_user(self, claims, user):
+        with self._lock:
+            record = self._own_user(claims, user.get("id", claims["sub"]))
+            record.update(_stored({key: value for key, value in user.items() if key != "id"}))
+            return self._user_view(record)
+
+    def delete_user(self, claims, id):
+        with self._lock:
+            if id not in self.users and id == claims["sub"]:
+                # Like the DynamoDB DeleteItem resolver: the key comes back even if nothing was deleted
+                return {"id": id, "works": lambda limit=None, exclusiveStartKey=None: {"items": [], "exclusiveStartKey": None}}
+            record = self._own_user(claims, id)
+            for _, work_id in self._user_works.pop(id):
+                self._remove_work(self.works[work_id])
+            del self.users[id]
+            del self._user_order[bisect.bisect_left(self._user_order, (record["_sequence"], id))]
+            return self._user_view(record)
+
+    def create_work(self, claims, work):
+        with self._lock:
+            self._own_user(claims, work.get("userId"))
+            record = dict(
+                _stored(work),
+                id=str(uuid.uuid4()),
+                createdAt=datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+                _sequence=self._next_sequence(),
+            )
+            self.works[record["id"]] = record
+            self._work_order.append((record["_sequence"], record["id"]))
+            self._user_works[record["userId"]].append((record["_sequence"], record["id"]))
+            return _public(record)
+
+    def update_work(self, claims, work):
+        with self._lock:
+            record = self._own_work(claims, work.get("id"))
+            record.update(_stored({key: value for key, value in work.items() if key not in ("id", "userId", "createdAt")}))
+            return _public(record)
+
+    def delete_work(self, claims, id):
+        with self._lock:
+            if id not in self.works:
+                return None
+            record = self._own_work(claims, id)
+            self._remove_work(record)
+            order = self._user_works[record["userId"]]
+            del order[bisect.bisect_left(order, (record["_sequence"], id))]
+            return _public(record)
+
+    # Helpers, called with the lock held
+
+    def _own_user(self, claims, id):
+        if id != claims["sub"]:
+            raise GraphQLError("Not Authorized to access this user", "Unauthorized")
+        if id not in self.users:
+            raise GraphQLError(f"User {id} not found", "NotFound")
+        return self.users[id]
+
+    def _own_work(self, claims, id):
+        record = self.works.get(id)
+        if record is None:
+            raise GraphQLError(f"Work {id} not found", "NotFound")
+        if record["userId"] != claims["sub"]:
+            raise GraphQLError("Not Authorized to access this work", "Unauthorized")
+        return record
+
+    def _remove_work(self, record):
+        del self.works[record["id"]]
+        del self._work_order[bisect.bisect_left(self._work_order, (record["_sequence"], record["id"]))]
+
+    def _user_view(self, record):
+        user = _public(record)
+        user_id = record["id"]
+
+        def works(limit=None, exclusiveStartKey=None):
+            with self._lock:
+                return self._page(self._user_works.get(user_id, []), self.works, limit, exclusiveStartKey)
+        user["works"] = works
+        return user
+
+    @staticmethod
+    def _page(order, records, limit, exclusive_start_key):
+        limit = limit if limit is not None else DEFAULT_PAGE_SIZE
+        start = 0
+        if exclusive_start_key is not None:
+            try:
+                start = bisect.bisect_left(order, (int(exclusive_start_key) + 1,))
+            except ValueError:
+                raise GraphQLError(f"Invalid exclusiveStartKey {exclusive_start_key!r}", "ValidationException")
+        entries = order[start:start + limit]
+        is_last = start + limit >= len(order)
+        return {
+            "items"            : [_public(records[record_id]) for _, record_id in entries],
+            "exclusiveStartKey": None if is_last or len(entries) == 0 else str(entries[-1][0]),
+        }
+
+
+def _stored(values):
+    # DynamoDB (and so AppSync) stores an empty string as " "
+    return {key: " " if value == "" else value for key, value in values.items()}
+
+
+def _public(record):
+    return {key: value for key, value in record.items() if not key.startswith("_")}
+
+
+# Execution
+
+
+class Executor:
+    def __init__(self, store, publish=None):
+        """ __init__
+
+            @param store  : Store
+            @param publish: called with (mutation name, result) after every successful mutation (see Realtime)
+        """
+        self.store = store
+        self.publish = publish
+        self.resolvers = {
+            "query": {
+                "getUser"  : store.get_user,
+                "getWork"  : store.get_work,
+                "listWorks": store.list_works,
+                "listUsers": store.list_users,
+            },
+            "mutation": {
+                "createUser": store.create_user,
+                "updateUser": store.update_user,
+                "deleteUser": store.delete_user,
+                "createWork": store.create_work,
+                "updateWork": store.update_work,
+                "deleteWork": store.delete_work,
+            },
+        }
+
+    def execute(self, claims, query, variables):
+        """ execute
+
+            @param claims   : verified token claims
+            @param query    : GraphQL request query
+            @param variables: GraphQL request variables
+
+            result struct
+            GraphQL response body
+        """
+        try:
+            document = parse(query)
+        except ValueError as e:
+            return {"errors": [{"errorType": "MalformedHttpRequestException", "message": str(e)}]}
+        resolvers = self.resolvers.get(document.operation_type)
+        if resolvers is None:
+            return {"data": None, "errors": [{"errorType": "ValidationError", "message": f"{document.operation_type} is not supported"}]}
+        undefined = [field.name for field in document.selections if field.name not in resolvers]
+        if len(undefined) != 0:
+            type_name = document.operation_type.capitalize()
+            return {"data": None, "errors": [
+                {"errorType": "ValidationError", "message": f"Validation error of type FieldUndefined: Field '{name}' in type '{type_name}' is undefined"}
+                for name in undefined
+            ]}
+
+        values = dict(document.defaults, **(variables or {}))
+        data = {}
+        errors = []
+        for field in document.selections:
+            try:
+                value = resolvers[field.name](claims, **_argument_values(field.arguments, values))
+                data[field.alias] = _select(value, field.selections, values)
+                if self.publish is not None and document.operation_type == "mutation":
+                    self.publish(field.name, value)
+            except GraphQLError as e:
+                data[field.alias] = None
+                errors.append({"path": [field.alias], "data": None, "errorType": e.error_type, "errorInfo": None, "message": str(e)})
+            except (TypeError, AttributeError, KeyError) as e:
+                # Missing or mistyped arguments
+                data[field.alias] = None
+                errors.append({"path": [field.alias], "errorType": "ValidationError", "message": f"{type(e).__name__}: {e}"})
+        return {"data": data, "errors": errors} if len(errors) != 0 else {"data": data}
+
+
+def _select(value, selections, variables):
+    if value is None or selections is None:
+        return value
+    if isinstance(value, list):
+        return [_select(item, selections, variables) for item in value]
+    result = {}
+    for field in selections:
+        child = value.get(field.name)
+        if callable(child):
+            # Nested arguments may reference the operation variables too
+            child = child(**_argument_values(field.arguments, variables))
+        result[field.alias] = _select(child, field.selections, variables)
+    return result
+
+
+# Real-time
+
+
+class _RealtimeConnection:
+    def __init__(self, sock):
+        """ __init__
+
+            Server side of a real-time WebSocket: frames are sent whole, from any thread
+
+            @param sock: upgraded socket
+        """
+        self.sock   = sock
+        self.closed = False
+        self._lock  = threading.Lock()
+
+    def send(self, message):
+        self.send_text(json.dumps(message, separators=(",", ":")))
+
+    def send_text(self, text):
+        self.send_frame(websocket.encode_frame(websocket.OP_TEXT, text.encode("utf-8"), mask=False))
+
+    def send_frame(self, frame):
+        with self._lock:
+            if self.closed:
+                return
+            try:
+                self.sock.sendall(frame)
+            except OSError:
+                self.closed = True
+
+    def close(self):
+        self.send_frame(websocket.close_frame(mask=False))
+        with self._lock:
+            self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class Realtime:
+    def __init__(self, keepalive=60.0):
+        """ __init__
+
+            Subscriptions of the real-time connections. Mutation results are
+            delivered by one thread, in mutation order, without holding up the
+            mutation response.
+
+            @param keepalive: seconds between `ka` messages on an idle connection
+        """
+        self.keepalive      = keepalive
+        self.connections    = set()
+        self._subscriptions = {}
+        self._lock          = threading.Lock()
+        self._queue         = queue.Queue()
+        self._thread        = threading.Thread(target=self._deliver, daemon=True)
+        self._thread.start()
+
+    def publish(self, mutation, value):
+        """ publish
+
+            @param mutation: mutation name
+            @param value   : mutation result (before selection)
+        """
+        if value is None or len(self._subscriptions.get(mutation, ())) == 0:
+            return
+        self._queue.put((mutation, value))
+
+    def open(self, connection):
+        with self._lock:
+            self.connections.add(connection)
+
+    def subscribe(self, connection, subscription_id, field, arguments, variables):
+        """ subscribe
+
+            @param connection     : _RealtimeConnection
+            @param subscription_id: id of the start message
+            @param field          : subscription Field (SUBSCRIPTION_MUTATIONS)
+            @param arguments      : argument values; non-null ones filter the events
+            @param variables      : operation variables, for arguments of the selected fields
+        """
+        with self._lock:
+            self._subscriptions.setdefault(SUBSCRIPTION_MUTATIONS[field.name], {})[(connection, subscription_id)] = (field, arguments, variables)
+
+    def unsubscribe(self, connection, subscription_id):
+        with self._lock:
+            for subscriptions in self._subscriptions.values():
+                subscriptions.pop((connection, subscription_id), None)
+
+    def drop(self, connection):
+        with self._lock:
+            self.connections.discard(connection)
+            for subscriptions in self._subscriptions.values():
+                for key in [key for key in subscriptions if key[0] is connection]:
+                    del subscriptions[key]
+
+    def close(self):
+        """ close
+
+            Close every connection
+        """
+        with self._lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+
+    def _deliver(self):
+        while True:
+            mutation, value = self._queue.get()
+            with self._lock:
+                targets = list(self._subscriptions.get(mutation, {}).items())
+            encoded = {}
+            for (connection, subscription_id), (field, arguments, variables) in targets:
+                # Like AppSync: every non-null argument must equal the same field of the result
+                if any(argument is not None and value.get(name) != argument for name, argument in arguments.items()):
+                    continue
+                # Subscribers of one document share its parsed fields (parse cache): select and encode once per variables
+                key = (id(field), json.dumps(variables, sort_keys=True))
+                data = encoded.get(key)
+                if data is None:
+                    data = encoded[key] = json.dumps({field.alias: _select(value, field.selections, variables)}, separators=(",", ":"))
+                connection.send_text(f'{{"type":"data","id":{json.dumps(subscription_id)},"payload":{{"data":{data}}}}}')
+
+
+def _header_authorization(path):
+    # ?header=<base64 JSON {"host", "Authorization"}>
+    try:
+        header = parse_qs(urlsplit(path).query).get("header", [""])[0]
+        return json.loads(base64.b64decode(header).decode("utf-8")).get("Authorization")
+    except (ValueError, UnicodeError, AttributeError):
+        return None
+
+
+# HTTP
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Bursts of connections (load mode, subscribers): the default backlog of 5 drops SYNs, retried after 1s
+    request_queue_size = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server.local_appsync
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            status, response = server.handle(self.headers.get("Authorization"), body)
+        except Exception as e:
+            status, response = 500, {"errors": [{"errorType": "InternalFailure", "message": f"{type(e).__name__}: {e}"}]}
+        self._respond(status, json.dumps(response, separators=(",", ":")).encode("utf-8"))
+
+    def do_GET(self):
+        if self.headers.get("Upgrade", "").lower() == "websocket" and urlsplit(self.path).path.endswith("/realtime"):
+            self._upgrade()
+            return
+        self._respond(404, b'{"errors":[{"message":"POST GraphQL requests to /graphql"}]}')
+
+    def _upgrade(self):
+        protocols = [protocol.strip() for protocol in self.headers.get("Sec-WebSocket-Protocol", "").split(",")]
+        if "graphql-ws" not in protocols or self.headers.get("Sec-WebSocket-Key") is None:
+            self._respond(400, b'{"errors":[{"message":"WebSocket upgrade with Sec-WebSocket-Protocol graphql-ws expected"}]}')
+            return
+        self.close_connection = True
+        self.wfile.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {websocket.accept_key(self.headers['Sec-WebSocket-Key'])}\r\n"
+            "Sec-WebSocket-Protocol: graphql-ws\r\n"
+            "\r\n"
+        ).encode("latin-1"))
+        self.server.local_appsync.serve_realtime(self.connection, self.path)
+
+    def _respond(self, status, body, content_type="application/json"):
+        # Status line, headers and body in one write: no Nagle / delayed ACK stall on keep-alive
+        head = (
+            f"HTTP/1.1 {status} {self.responses.get(status, ('',))[0]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Date: {self.date_time_string()}\r\n"
+            "\r\n"
+        )
+        self.wfile.write(head.encode("latin-1") + body)
+
+
+class LocalAppSync:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, secret=None):
+        """ __init__
+
+            @param host         : listen address
+            @param port         : listen port (0: any free port)
+            @param latency      : seconds added to every request
+            @param jitter       : up to this many seconds added at random
+            @param error_rate   : share of requests answered 500 (0 - 1)
+            @param throttle_rate: share of requests answered 429 with a Throttling error (0 - 1)
+            @param secret       : JWT signing key (default: random)
+        """
+        self.latency       = latency
+        self.jitter        = jitter
+        self.error_rate    = error_rate
+        self.throttle_rate = throttle_rate
+        self.secret        = secret if secret is not None else uuid.uuid4().bytes
+        self.store         = Store()
+        self.realtime      = Realtime()
+        self.executor      = Executor(self.store, self.realtime.publish)
+        self._persisted    = {}
+        self._server       = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.local_appsync = self
+        self._thread       = None
+
+    @property
+    def url(self):
+        """ url
+
+            GraphQL Endpoint URL
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/graphql"
+
+    def start(self):
+        """ start
+
+            Serve in a background thread
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """ serve_forever
+
+            Serve in this thread
+        """
+        self._server.serve_forever()
+
+    def stop(self):
+        """ stop
+
+            Stop serving and close the socket
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self.realtime.close()
+
+    def mint_token(self, username, sub=None, expires_in=3600):
+        """ mint_token
+
+            @param username  : cognito:username
+            @param sub       : user id (default: derived from the username)
+            @param expires_in: seconds until exp
+        """
+        return mint_token(self.secret, username, sub, expires_in)
+
+    def identity(self, username):
+        """ identity
+
+            Worker identity signed in with a minted token (see parallel.sign_in_workers)
+
+            @param username: cognito:username
+
+            result struct
+            {"username", "user_id", "jwt"}
+        """
+        token = self.mint_token(username)
+        return {"username": username, "user_id": verify_token(self.secret, token)["sub"], "jwt": token}
+
+    def handle(self, authorization, body):
+        """ handle
+
+            @param authorization: Authorization header
+            @param body         : request body (bytes)
+
+            result struct
+            (status: number, response body)
+        """
+        if self.latency > 0 or self.jitter > 0:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        claims = verify_token(self.secret, authorization)
+        if claims is None:
+            return 401, UNAUTHORIZED
+        draw = random.random()
+        if draw < self.throttle_rate:
+            return 429, {"errors": [{"errorType": "Throttling", "message": "Rate exceeded"}]}
+        if draw < self.throttle_rate + self.error_rate:
+            return 500, {"errors": [{"errorType": "InternalFailure", "message": "Injected error"}]}
+
+        try:
+            request = json.loads(body.decode("utf-8"))
+        except ValueError:
+            return 400, {"errors": [{"errorType": "MalformedHttpRequestException", "message": "Invalid JSON body"}]}
+        if isinstance(request, list):
+            return 200, [self._execute(claims, item) for item in request]
+        return 200, self._execute(claims, request)
+
+    def _execute(self, claims, request):
+        if not isinstance(request, dict):
+            return {"errors": [{"errorType": "MalformedHttpRequestException", "message": "Expected a JSON object"}]}
+        query = request.get("query")
+        persisted = (request.get("extensions") or {}).get("persistedQuery")
+        if persisted is not None:
+            if query is None:
+                query = self._persisted.get(persisted.get("sha256Hash"))
+                if query is None:
+                    return {"errors": [{"message": "PersistedQueryNotFound", "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}}]}
+            else:
+                self._persisted[persisted.get("sha256Hash")] = query
+        if not isinstance(query, str):
+            return {"errors": [{"errorType": "MalformedHttpRequestException", "message": "Missing query"}]}
+        return self.executor.execute(claims, query, request.get("variables"))
+
+    def serve_realtime(self, sock, path):
+        """ serve_realtime
+
+            AppSync real-time protocol on an upgraded connection, until it closes:
+            connection_init / connection_ack, start / start_ack, stop / complete,
+            `data` for every mutation a subscription matches, `ka` when idle.
+
+            @param sock: upgraded socket
+            @param path: request path, with the base64 `header` authorization
+        """
+        connection = _RealtimeConnection(sock)
+        reader = websocket.FrameReader()
+        claims = None
+        self.realtime.open(connection)
+        sock.settimeout(self.realtime.keepalive)
+        try:
+            while not connection.closed:
+                try:
+                    data = sock.recv(65536)
+                except socket.timeout:
+                    if claims is not None:
+                        connection.send({"type": "ka"})
+                    continue
+                except OSError:
+                    break
+                if not data:
+                    break
+                for opcode, payload in reader.feed(data):
+                    if opcode == websocket.OP_CLOSE:
+                        connection.send_frame(websocket.close_frame(mask=False))
+                        return
+                    if opcode == websocket.OP_PING:
+                        connection.send_frame(websocket.encode_frame(websocket.OP_PONG, payload, mask=False))
+                        continue
+                    if opcode != websocket.OP_TEXT:
+                        continue
+                    try:
+                        message = json.loads(payload.decode("utf-8"))
+                        kind = message.get("type")
+                    except (ValueError, AttributeError):
+                        connection.send({"type": "error", "payload": {"errors": [{"errorType": "MalformedMessage", "message": "Invalid JSON message"}]}})
+                        continue
+                    if kind == "connection_init":
+                        claims = verify_token(self.secret, _header_authorization(path))
+                        if claims is None:
+                            connection.send({"type": "connection_error", "payload": UNAUTHORIZED})
+                            return
+                        connection.send({"type": "connection_ack", "payload": {"connectionTimeoutMs": int(self.realtime.keepalive * 5000)}})
+                        connection.send({"type": "ka"})
+                    elif kind == "start":
+                        self._start(connection, claims, message)
+                    elif kind == "stop":
+                        self.realtime.unsubscribe(connection, message.get("id"))
+                        connection.send({"type": "complete", "id": message.get("id")})
+        finally:
+            self.realtime.drop(connection)
+
+    def _start(self, connection, claims, message):
+        subscription_id = message.get("id")
+
+        def error(error_type, text):
+            connection.send({"type": "error", "id": subscription_id, "payload": {"errors": [{"errorType": error_type, "message": text}]}})
+
+        payload = message.get("payload") or {}
+        authorization = ((payload.get("extensions") or {}).get("authorization") or {}).get("Authorization")
+        if claims is None or verify_token(self.secret, authorization) is None:
+            return error("UnauthorizedException", UNAUTHORIZED["errors"][0]["message"])
+        try:
+            request = json.loads(payload.get("data") or "")
+            document = parse(request["query"])
+        except (ValueError, KeyError, TypeError) as e:
+            return error("MalformedHttpRequestException", str(e))
+        fields = document.selections
+        if document.operation_type != "subscription" or len(fields) != 1 or fields[0].name not in SUBSCRIPTION_MUTATIONS:
+            return error("ValidationError", f"Expected one subscription field of {', '.join(SUBSCRIPTION_MUTATIONS)}")
+        values = dict(document.defaults, **(request.get("variables") or {}))
+        self.realtime.subscribe(connection, subscription_id, fields[0], _argument_values(fields[0].arguments, values), values)
+        connection.send({"type": "start_ack", "id": subscription_id})
+
+
+class LocalSession:
+    def __init__(self, server, username, expires_in=3600):
+        """ __init__
+
+            Stand-in for token_cache.CognitoSession signing in to a LocalAppSync
+
+            @param server    : LocalAppSync
+            @param username  : cognito:username
+            @param expires_in: token lifetime (seconds)
+        """
+        self.server      = server
+        self.username    = username
+        self.expires_in  = expires_in
+        self.auth_result = None
+        self.from_cache  = False
+
+    def auth(self):
+        """ auth
+
+            Same result as cognito.cognito_auth
+        """
+        token = self.server.mint_token(self.username, expires_in=self.expires_in)
+        self.auth_result = {"IdToken": token, "AccessToken": token, "ExpiresIn": self.expires_in, "TokenType": "Bearer"}
+        return {"AuthenticationResult": self.auth_result}
+
+    @property
+    def id_token(self):
+        """ id_token
+
+            Current IdToken
+        """
+        return self.auth_result["IdToken"]
+
+    def start_refresh(self, listener):
+        """ start_refresh
+
+            Mint a new token a minute before exp.
+
+            @param listener: called with the new IdToken after every refresh
+        """
+        def refresh():
+            listener(self.auth()["AuthenticationResult"]["IdToken"])
+            self.start_refresh(listener)
+        timer = threading.Timer(max(1, self.expires_in - 60), refresh)
+        timer.daemon = True
+        timer.start()
+
+    def stop(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local AppSync stand-in for the Portal schema")
+    parser.add_argument("--host", default="127.0.0.1", help="listen address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="listen port (default: 8000)")
+    parser.add_argument("--latency", metavar="MS", type=float, default=0, help="milliseconds added to every request")
+    parser.add_argument("--jitter", metavar="MS", type=float, default=0, help="up to MS milliseconds added at random")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered 500 (0 - 1)")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="share of requests answered 429 (0 - 1)")
+    parser.add_argument("--secret", default=None, help="JWT signing key (default: random)")
+    parser.add_argument("--username", default="local-user", help="username of the printed token (default: local-user)")
+    args = parser.parse_args()
+
+    server = LocalAppSync(
+        args.host,
+        args.port,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        secret=args.secret.encode("utf-8") if args.secret is not None else None,
+    )
+    print(f"""
+{bcolors.OKBLUE}i {bcolors.ENDC}APPSYNC_URL : {bcolors.OKGREEN}{server.url}{bcolors.ENDC}
+{bcolors.OKBLUE}i {bcolors.ENDC}Real-time   : {bcolors.OKGREEN}{server.url.replace("http://", "ws://")}/realtime{bcolors.ENDC}
+{bcolors.OKBLUE}i {bcolors.ENDC}IdToken     : {bcolors.OKGREEN}{server.mint_token(args.username)}{bcolors.ENDC}
+""")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
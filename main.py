@@ -10,6 +10,7 @@
     used font: http://patorjk.com/software/taag/#p=display&f=Calvin%20S&t=Type%20Something%20
 """
 
+import argparse
 import os
 import sys
 from datetime import datetime
@@ -17,13 +18,685 @@ from getpass import getpass
 from os.path import dirname, join
 from test import Test
 
+from connection_pool import ConnectionPool
 from dotenv import load_dotenv
 from graphql import GraphQL
+from metrics import LatencyRecorder
+from results import ResultWriter
+from retry import RetryPolicy
+from token_cache import CognitoSession
 
 import cognito
+import concurrency
 from bcolors import bcolors
 
 ERROR_LOGS_FILE = "portal-error.log"
+RESULTS_FILE = "portal-results.jsonl"
+SEED_PROGRESS_FILE = "portal-seed-progress.jsonl"
+JOURNAL_FILE = "portal-journal.jsonl"
+
+
+def parse_args():
+    """ parse_args
+        command line options
+    """
+    parser = argparse.ArgumentParser(description="AppSync-Resolver-Mapping-Lambda Test tool")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="run tests at the same time in up to N threads, one user each (--local), sharing the asyncio client's connections",
+    )
+    parser.add_argument(
+        "--workers",
+        metavar="FILE",
+        default=None,
+        help="file of `username:password` lines; run tests in parallel with one Cognito identity per worker",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="with --workers, use a process pool instead of a thread pool",
+    )
+    parser.add_argument(
+        "--load",
+        metavar="RATE",
+        type=float,
+        default=None,
+        help="load mode: replay the tests open-loop at RATE requests per second",
+    )
+    parser.add_argument("--duration", type=float, default=60, help="load mode: seconds to run (default: 60)")
+    parser.add_argument("--ramp-up", type=float, default=10, help="load mode: seconds to reach RATE (default: 10)")
+    parser.add_argument(
+        "--load-target",
+        choices=["operations", "scenarios"],
+        default="operations",
+        help="load mode: replay the recorded GraphQL queries, or whole test scenarios with their mutations (default: operations)",
+    )
+    parser.add_argument(
+        "--batch-window",
+        metavar="MS",
+        type=float,
+        default=None,
+        help="merge queries sent at the same time within MS milliseconds into one request",
+    )
+    parser.add_argument(
+        "--persisted-queries",
+        action="store_true",
+        help="send query hashes instead of the documents (automatic persisted queries; the endpoint must support them, AppSync does not)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="retry queries and throttled requests up to N times, with exponential backoff (default: 2)",
+    )
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="limit requests in flight per operation, raised while latency holds and lowered on slowdowns and throttling (AIMD)",
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="run against a local in-memory AppSync stand-in (local_server.py) with locally minted tokens, instead of APPSYNC_URL",
+    )
+    parser.add_argument("--local-latency", metavar="MS", type=float, default=0, help="local mode: milliseconds added to every request")
+    parser.add_argument("--local-error-rate", type=float, default=0, help="local mode: share of requests answered 500 (0 - 1)")
+    parser.add_argument("--local-throttle-rate", type=float, default=0, help="local mode: share of requests answered 429 (0 - 1)")
+    parser.add_argument(
+        "--self-test",
+        action="store_true",
+        help="run the table-driven behaviour checks of selftest.py, offline, and exit",
+    )
+    parser.add_argument(
+        "--profiles",
+        metavar="FILE",
+        default=None,
+        help="JSON list of endpoint / Cognito region profiles; run the tests against all of them at the same time and compare",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="FILE",
+        default=None,
+        help="record every request / response to the cassette FILE (not with --concurrency)",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        default=None,
+        help="run the tests against the cassette FILE, as its recording user, without signing in or network (not with --concurrency)",
+    )
+    parser.add_argument(
+        "--results",
+        metavar="FILE",
+        default=join(dirname(__file__), RESULTS_FILE),
+        help=f"append one JSON line per test step (per request in load mode) to FILE (default: {RESULTS_FILE})",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        default=join(dirname(__file__), JOURNAL_FILE),
+        help=f"record the users and works created by the tests in FILE, deleted at the end or on the next start (default: {JOURNAL_FILE})",
+    )
+    parser.add_argument("--no-cleanup", action="store_true", help="keep the data recorded in --journal (delete it on a later run)")
+    parser.add_argument("--connections", type=int, default=64, help="load mode: max keep-alive connections (default: 64)")
+    parser.add_argument(
+        "--paginate",
+        nargs="*",
+        choices=["listWorks", "listUsers"],
+        default=None,
+        help="pagination mode: walk every page of the list queries (default: both) with every --page-sizes",
+    )
+    parser.add_argument(
+        "--page-sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[10, 50, 100],
+        help="pagination mode: comma separated page sizes (default: 10,50,100)",
+    )
+    parser.add_argument("--prefetch", action="store_true", help="pagination mode: request the next page while checking the current one")
+    parser.add_argument("--max-pages", type=int, default=None, help="pagination mode: max pages per walk (default: all)")
+    parser.add_argument(
+        "--subscriptions",
+        metavar="N",
+        type=int,
+        default=None,
+        help="subscription mode: open N real-time WebSocket subscribers and time the delivery of user / work updates to all of them",
+    )
+    parser.add_argument("--subscription-events", type=int, default=20, help="subscription mode: mutations per event (default: 20)")
+    parser.add_argument(
+        "--subscription-memory-sample",
+        type=int,
+        default=50,
+        help="subscription mode: connections of the memory per connection measurement, 0 to skip it (default: 50)",
+    )
+    parser.add_argument(
+        "--seed",
+        metavar="WORKS",
+        type=int,
+        default=None,
+        help="seed mode: create the user of every identity (--workers, or the signed-in user) and WORKS works per user",
+    )
+    parser.add_argument("--seed-batch", type=int, default=25, help="seed mode: createWork mutations per request (default: 25)")
+    parser.add_argument("--seed-rate", type=float, default=None, help="seed mode: max requests per second (default: no limit)")
+    parser.add_argument(
+        "--seed-progress",
+        metavar="FILE",
+        default=join(dirname(__file__), SEED_PROGRESS_FILE),
+        help=f"seed mode: progress file, a new run only creates what is missing (default: {SEED_PROGRESS_FILE})",
+    )
+    args = parser.parse_args()
+    # The lanes of --concurrency use the asyncio client, which has no cassette pool
+    if args.concurrency is not None and args.record is not None:
+        parser.error("argument --record: not allowed with argument --concurrency")
+    if args.concurrency is not None and args.replay is not None:
+        parser.error("argument --replay: not allowed with argument --concurrency")
+    return args
+
+
+def print_result(test_count, errors):
+    """ print_result
+
+        @param test_count: number of executed tests
+        @param errors    : errors of failed tests
+    """
+    print(f"""
+╦═╗┌─┐┌─┐┬ ┬┬ ┌┬┐
+╠╦╝├┤ └─┐│ ││  │
+╩╚═└─┘└─┘└─┘┴─┘┴
+
+> Number of test items: {bcolors.OKGREEN}{test_count}{bcolors.ENDC}
+> Success count       : {bcolors.OKGREEN}{test_count - len(errors)}{bcolors.ENDC}
+> Faild count         : {bcolors.OKGREEN}{len(errors)}{bcolors.ENDC}
+    """)
+
+
+def print_retries(retry_policy):
+    """ print_retries
+
+        @param retry_policy: retry.RetryPolicy of the client
+    """
+    if retry_policy.retries == 0 and retry_policy.throttled == 0 and retry_policy.exhausted == 0:
+        return
+    print(
+        f"{bcolors.WARNING}Retries{bcolors.ENDC} {retry_policy.retries} retried, {retry_policy.throttled} throttled,"
+        f" {retry_policy.exhausted} not retried (retry budget spent)"
+    )
+
+
+def write_error_logs(errors):
+    """ write_error_logs
+
+        @param errors: errors of failed tests
+    """
+    with open(join(dirname(__file__), ERROR_LOGS_FILE), mode="a") as f:
+        f.write(f"{str(datetime.now())}\n")
+        for index, error in enumerate(errors):
+            f.write(f"Error {index + 1}: \n")
+            for i, e in enumerate(error):
+                f.write(f"{i + 1}. {str(e)}\n")
+
+
+def run_workers(args, region_name, client_id, url, local=None):
+    """ run_workers
+
+        Sign in every worker identity and spread the tests across them.
+
+        @param args       : command line options
+        @param region_name: aws cognito region_name
+        @param client_id  : aws cognito client_id
+        @param url        : GraphQL Endpoint URL
+        @param local      : local_server.LocalAppSync minting the worker tokens (local mode)
+    """
+    import parallel
+
+    credentials = parallel.read_credentials(args.workers)
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Sign in {len(credentials)} workers...")
+
+    if local is not None:
+        identities, failures = [local.identity(username) for username, _ in credentials], []
+    else:
+        identities, failures = parallel.sign_in_workers(credentials, region_name, client_id)
+    if len(failures) != 0:
+        for username, e in failures:
+            print(f"{bcolors.FAIL}Failed{bcolors.ENDC} Sign in {username}: {bcolors.FAIL}{e}{bcolors.ENDC}")
+        return 1
+
+    for identity in identities:
+        print(f"{bcolors.OKGREEN}Success{bcolors.ENDC} Sign in {identity['username']} ({identity['user_id']})")
+
+    if args.seed is not None:
+        return run_seed(args, url, identities)
+
+    run_cleanup(args, url, identities)
+    recorder = LatencyRecorder()
+    results = parallel.execute_test_parallel(
+        url,
+        identities,
+        args.processes,
+        recorder,
+        args.results,
+        datetime.now().isoformat(),
+        journal_path=args.journal,
+        retries=args.retries,
+        batch_window=args.batch_window / 1000 if args.batch_window is not None else None,
+    )
+    run_cleanup(args, url, identities)
+
+    print(f"""
+╔═╗─┐ ┬┌─┐┌─┐┬ ┬┌┬┐┌─┐  ╔╦╗╔═╗╔═╗╔╦╗
+║╣ ┌┴┬┘├┤ │  │ │ │ ├┤    ║ ║╣ ╚═╗ ║
+╚═╝┴ └─└─┘└─┘└─┘ ┴ └─┘   ╩ ╚═╝╚═╝ ╩
+> Number of test items: {bcolors.OKGREEN}{len(results)}{bcolors.ENDC}
+> Number of workers   : {bcolors.OKGREEN}{len(identities)}{bcolors.ENDC}
+    """)
+
+    for test_index, result in enumerate(results):
+        print(f"\n[{test_index + 1}/{len(results)}] Execute Test: {result['name']}")
+        print(result["output"], end="")
+
+    errors = [result["error"] for result in results if result["error"] is not None]
+    recorder.print_report()
+    print_result(len(results), errors)
+
+    if len(errors) != 0:
+        write_error_logs(errors)
+        return 1
+    return 0
+
+
+def run_profiles(args, username, password):
+    """ run_profiles
+
+        Sign in to every profile at the same time, run the tests against all of them
+        in parallel and compare latency and failures side by side.
+
+        @param args    : command line options
+        @param username: default cognito username
+        @param password: default cognito password
+    """
+    import fanout
+
+    try:
+        profiles = fanout.read_profiles(args.profiles, username, password)
+    except (OSError, ValueError) as e:
+        print(f"{bcolors.FAIL}Failed{bcolors.ENDC} Read profiles\n{bcolors.FAIL}{e}{bcolors.ENDC}")
+        return 1
+    for profile in profiles:
+        if not profile["local"] and profile["password"] is None:
+            profile["password"] = getpass(f"Input cognito Password of {profile['username']} ({profile['name']}) > ")
+
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Sign in {len(profiles)} profiles...")
+    sessions, failures = fanout.sign_in_profiles(profiles)
+    for name, e in failures:
+        print(f"{bcolors.FAIL}Failed{bcolors.ENDC} Sign in {name}: {bcolors.FAIL}{e}{bcolors.ENDC}")
+    if len(sessions) == 0:
+        return 1
+    for name, signed_in in sessions.items():
+        print(f"{bcolors.OKGREEN}Success{bcolors.ENDC} Sign in {name} ({signed_in['user_id']}) {signed_in['url']}")
+
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Run the tests against {len(sessions)} profiles...")
+    results = fanout.run_fanout(
+        sessions,
+        args.results,
+        datetime.now().isoformat(),
+        journal_base=args.journal,
+        retries=args.retries,
+        cleanup=not args.no_cleanup,
+    )
+    for signed_in in sessions.values():
+        if signed_in["server"] is not None:
+            signed_in["server"].stop()
+
+    errors = []
+    for result in results:
+        print(f"\n{bcolors.HEADER}{result['name']}{bcolors.ENDC}{result['output']}", end="")
+        for problem in result["cleanup"]:
+            print(f"{bcolors.WARNING}Cleanup{bcolors.ENDC} {result['name']}: {problem}")
+        errors += result["errors"]
+    fanout.print_report(results)
+    print_result(sum(result["tests"] for result in results), errors)
+
+    if len(errors) != 0 or len(failures) != 0:
+        write_error_logs(errors + [[e] for _, e in failures])
+        return 1
+    return 0
+
+
+def concurrency_identities(args, local, username, identity, test_count):
+    """ concurrency_identities
+
+        Identities of the --concurrency lanes. Every test resets its user's data,
+        so tests only run at the same time as different users: local mode mints
+        one user per lane, a single Cognito identity runs the tests one after another.
+
+        @param args      : command line options
+        @param local     : local_server.LocalAppSync or None
+        @param username  : signed-in username
+        @param identity  : {"user_id"} of the signed-in user
+        @param test_count: number of tests
+
+        result struct
+        [{"user_id", "jwt" (not on the first lane), "observers": [journal.Journal]}]
+    """
+    import journal
+
+    # No jwt: the first lane follows the client's token, refreshed by the session
+    identities = [{"user_id": identity["user_id"]}]
+    if local is not None:
+        identities += [local.identity(f"{username}-{lane + 1}") for lane in range(1, min(args.concurrency, test_count))]
+    elif args.concurrency > 1:
+        print(
+            f"{bcolors.WARNING}Warning{bcolors.ENDC} --concurrency {args.concurrency} with one Cognito identity:"
+            " every test resets its user, so the tests run one after another."
+            " Use --workers FILE (one identity per worker) or --local to run them at the same time."
+        )
+    for lane in identities:
+        lane["observers"] = [journal.Journal(args.journal, lane["user_id"])]
+    return identities
+
+
+def make_pool(args, max_size=4):
+    """ make_pool
+
+        Connection pool of the GraphQL client, recording or replaying a cassette (--record / --replay)
+
+        @param args    : command line options
+        @param max_size: max keep-alive connections
+    """
+    if args.replay is not None:
+        import cassette
+        return cassette.ReplayPool(args.replay)
+    pool = ConnectionPool(max_size=max_size)
+    if args.record is not None:
+        import cassette
+        return cassette.RecordingPool(pool, args.record)
+    return pool
+
+
+def run_self_test():
+    """ run_self_test
+
+        Offline checks of selftest.py, without .env, Cognito or network
+    """
+    import selftest
+
+    print("""
+╔═╗┌─┐┬  ┌─┐  ╔╦╗┌─┐┌─┐┌┬┐
+╚═╗├┤ │  ├┤    ║ ├┤ └─┐ │
+╚═╝└─┘┴─┘└    ╩ └─┘└─┘ ┴
+""")
+    errors = selftest.run_tables()
+    print_result(sum(len(rows) for _, rows, _ in selftest.TABLES), errors)
+    return 0 if len(errors) == 0 else 1
+
+
+def run_replay(args, url):
+    """ run_replay
+
+        Run the tests against a cassette, without signing in or any network:
+        the user id and scenario values are the ones of the recording.
+
+        @param args: command line options
+        @param url : GraphQL Endpoint URL (only named in the results, the cassette answers)
+    """
+    pool = make_pool(args)
+    user_id = pool.meta.get("user_id")
+    if user_id is None:
+        pool.close()
+        print(f"{bcolors.FAIL}Failed{bcolors.ENDC} Replay {args.replay}: the cassette has no recording user id (record it again)")
+        return 1
+
+    recorder = LatencyRecorder()
+    writer = ResultWriter(args.results)
+    graphql_client = GraphQL(
+        url if url is not None else "https://replay.invalid/graphql",
+        "",
+        pool,
+        observers=[recorder, writer],
+        batch_window=args.batch_window / 1000 if args.batch_window is not None else None,
+        persisted_queries=args.persisted_queries,
+        retry_policy=RetryPolicy(max_attempts=args.retries + 1),
+    )
+    test = Test(user_id, graphql_client, reporter=writer, scenario_values=pool.meta.get("scenario_values"))
+    test_list = test.get_test_list()
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Replay {args.replay} as {user_id}...")
+    errors = test.execute_test()
+    writer.close()
+    graphql_client.close()
+
+    recorder.print_report()
+    print_result(len(test_list), errors)
+    if len(errors) != 0:
+        write_error_logs(errors)
+        return 1
+    return 0
+
+
+def run_cleanup(args, url, identities):
+    """ run_cleanup
+
+        Delete the data of this run, or of a crashed run, recorded in --journal.
+
+        @param args      : command line options
+        @param url       : GraphQL Endpoint URL
+        @param identities: [{"user_id", "jwt"}] owners of the data
+    """
+    import journal
+
+    if args.no_cleanup or args.replay is not None or len(journal.read_journal(args.journal)) == 0:
+        return
+    pool = ConnectionPool(max_size=8)
+    clients = {identity["user_id"]: GraphQL(url, identity["jwt"], pool) for identity in identities}
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Clean up test data recorded in {args.journal}...")
+    summary = journal.cleanup(args.journal, clients)
+    pool.close()
+
+    color = bcolors.OKGREEN if summary["left"] == 0 else bcolors.WARNING
+    print(f"{color}Cleanup{bcolors.ENDC} {summary['deleted']} deleted, {summary['left']} left")
+    for error in summary["errors"]:
+        print(f"{bcolors.FAIL}{error}{bcolors.ENDC}")
+
+
+def run_load(args, url, session, user_id, local=None, username=None):
+    """ run_load
+
+        @param args    : command line options
+        @param url     : GraphQL Endpoint URL
+        @param session : signed-in CognitoSession
+        @param user_id : Portal user id
+        @param local   : local_server.LocalAppSync minting the users of the scenario jobs (local mode)
+        @param username: signed-in username
+    """
+    import journal
+    import load
+
+    identities = [{"user_id": user_id, "jwt": session.id_token}]
+    run_cleanup(args, url, identities)
+    recorder = LatencyRecorder()
+    writer = ResultWriter(args.results, per_request=True)
+    graphql_client = GraphQL(
+        url,
+        session.id_token,
+        make_pool(args, args.connections),
+        [recorder],
+        batch_window=args.batch_window / 1000 if args.batch_window is not None else None,
+        persisted_queries=args.persisted_queries,
+        retry_policy=RetryPolicy(max_attempts=args.retries + 1),
+        concurrency_limiter=concurrency.AdaptiveConcurrency(max_limit=args.connections) if args.adaptive_concurrency else None,
+    )
+    session.start_refresh(lambda token: setattr(graphql_client, "jwt_token", token))
+    stats = load.LoadStats()
+    # Before the recording: the data created for the replayed queries is cleaned up too
+    journal_writer = journal.Journal(args.journal, user_id)
+    if args.replay is None:
+        graphql_client.observers.append(journal_writer)
+
+    journals = [journal_writer]
+    if args.load_target == "operations":
+        print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Record queries...")
+        jobs = load.operation_jobs(user_id, graphql_client)
+        graphql_client.observers.append(writer)
+    else:
+        print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Time the scenarios...")
+        needed = min(load.identities_needed(args.load, load.scenario_seconds(user_id, graphql_client)), args.connections)
+        graphql_client.observers.append(writer)
+        if local is None and needed > 1:
+            print(
+                f"{bcolors.FAIL}Failed{bcolors.ENDC} --load {args.load} scenarios/s needs about {needed} users at once,"
+                " and every scenario resets its user: one Cognito identity runs one scenario at a time."
+                " Lower the rate, or use --local"
+            )
+            graphql_client.close()
+            writer.close()
+            journal_writer.close()
+            run_cleanup(args, url, identities)
+            return 1
+        users = [(user_id, graphql_client)]
+        for lane in range(1, needed):
+            identity = local.identity(f"{username}-load-{lane + 1}")
+            identities.append(identity)
+            journals.append(journal.Journal(args.journal, identity["user_id"]))
+            observers = [observer for observer in graphql_client.observers if observer is not journal_writer] + [journals[-1]]
+            users.append((identity["user_id"], GraphQL(
+                url,
+                identity["jwt"],
+                graphql_client.pool,
+                observers,
+                retry_policy=graphql_client.retry_policy,
+                concurrency_limiter=graphql_client.concurrency_limiter,
+            )))
+        run_cleanup(args, url, identities[1:])
+        print(f"{bcolors.OKBLUE}i {bcolors.ENDC}{len(users)} users run the scenarios")
+        jobs = load.scenario_jobs(users, stats)
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Load {args.load} req/s for {args.duration}s (ramp-up {args.ramp_up}s), {len(jobs)} jobs...")
+    load.run_load(jobs, args.load, args.duration, args.ramp_up, stats, max_workers=args.connections)
+    recorder.print_report()
+    print_retries(graphql_client.retry_policy)
+    load.print_report(stats, args.load)
+    if graphql_client.concurrency_limiter is not None:
+        concurrency.print_report(graphql_client.concurrency_limiter)
+    graphql_client.close()
+    writer.close()
+    for journal_file in journals:
+        journal_file.close()
+    identities[0]["jwt"] = session.id_token
+    run_cleanup(args, url, identities)
+
+    summary = stats.summary()
+    return 1 if any(row["error_rate"] > 0 for row in summary.values()) else 0
+
+
+def run_seed(args, url, identities):
+    """ run_seed
+
+        Create the users and works of the seed mode.
+
+        @param args      : command line options
+        @param url       : GraphQL Endpoint URL
+        @param identities: [{"username", "user_id", "jwt"}]
+    """
+    import seed
+
+    recorder = LatencyRecorder()
+    seeder = seed.Seeder(
+        url,
+        identities,
+        args.seed,
+        batch_size=args.seed_batch,
+        concurrency=args.concurrency if args.concurrency is not None else 8,
+        rate=args.seed_rate,
+        progress_path=args.seed_progress,
+        observers=[recorder],
+        retry_policy=RetryPolicy(max_attempts=args.retries + 1),
+    )
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Seed {len(identities)} users, {args.seed} works per user...")
+
+    def on_progress(created, total):
+        if created == total or created % (args.seed_batch * 20) < args.seed_batch:
+            print(f"{bcolors.OKBLUE}i {bcolors.ENDC}{created}/{total} works")
+
+    summary = seeder.run(on_progress)
+    recorder.print_report()
+    print(f"""
+╔═╗┌─┐┌─┐┌┬┐
+╚═╗├┤ ├┤  ││
+╚═╝└─┘└─┘─┴┘
+> Number of users     : {bcolors.OKGREEN}{summary["users"]}{bcolors.ENDC}
+> Created works       : {bcolors.OKGREEN}{summary["created"]}{bcolors.ENDC} ({summary["created"] / max(summary["elapsed"], 1e-9):.1f}/s)
+> Works of past runs  : {bcolors.OKGREEN}{summary["skipped"]}{bcolors.ENDC}
+> Faild count         : {bcolors.OKGREEN}{len(summary["errors"])}{bcolors.ENDC}
+    """)
+
+    if len(summary["errors"]) != 0:
+        write_error_logs([summary["errors"]])
+        return 1
+    return 0
+
+
+def run_pagination(args, url, session):
+    """ run_pagination
+
+        Pagination throughput of the list queries.
+
+        @param args   : command line options
+        @param url    : GraphQL Endpoint URL
+        @param session: signed-in CognitoSession
+    """
+    import pagination
+
+    recorder = LatencyRecorder()
+    graphql_client = GraphQL(url, session.id_token, observers=[recorder], retry_policy=RetryPolicy(max_attempts=args.retries + 1))
+    session.start_refresh(lambda token: setattr(graphql_client, "jwt_token", token))
+    fields = args.paginate if len(args.paginate) != 0 else list(pagination.LIST_QUERIES)
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Paginate {', '.join(fields)} by {', '.join(str(size) for size in args.page_sizes)}...")
+
+    results = pagination.run_pagination(graphql_client, fields, args.page_sizes, args.prefetch, args.max_pages)
+    graphql_client.close()
+    recorder.print_report()
+    pagination.print_report(results)
+
+    errors = [result["error"] for result in results if result["error"] is not None]
+    if len(errors) != 0:
+        write_error_logs([errors])
+        return 1
+    return 0
+
+
+def run_subscriptions(args, url, session, user_id):
+    """ run_subscriptions
+
+        Real-time subscription delivery latency, connection setup rate and memory per connection.
+
+        @param args   : command line options
+        @param url    : GraphQL Endpoint URL
+        @param session: signed-in CognitoSession
+        @param user_id: Portal user id
+    """
+    import subscription
+
+    recorder = LatencyRecorder()
+    graphql_client = GraphQL(url, session.id_token, observers=[recorder], retry_policy=RetryPolicy(max_attempts=args.retries + 1))
+    session.start_refresh(lambda token: setattr(graphql_client, "jwt_token", token))
+    print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Subscribe {args.subscriptions} connections, {args.subscription_events} mutations per event...")
+
+    summary = subscription.run_subscriptions(
+        graphql_client,
+        user_id,
+        args.subscriptions,
+        args.subscription_events,
+        concurrency=args.concurrency if args.concurrency is not None else 16,
+        memory_sample=args.subscription_memory_sample,
+    )
+    graphql_client.close()
+    recorder.print_report()
+    subscription.print_report(summary)
+
+    errors = summary["failures"] + [Exception(errors) for errors in summary["errors"]]
+    if len(errors) != 0:
+        write_error_logs([errors])
+    missed = sum(probe.missed for probe in summary["probes"])
+    return 1 if len(errors) != 0 or missed != 0 else 0
 
 
 def main():
@@ -31,6 +704,11 @@ def main():
         entry point
     """
 
+    args = parse_args()
+
+    if args.self_test:
+        sys.exit(run_self_test())
+
     dotenv_path = join(dirname(__file__), '.env')
     load_dotenv(dotenv_path)
     COGNIT_RREGION_NAME = os.environ.get("COGNIT_RREGION_NAME")
@@ -39,6 +717,22 @@ def main():
     USERNAME            = os.environ.get("USERNAME")
     PASSWORD            = os.environ.get("PASSWORD")
 
+    if args.profiles is not None:
+        sys.exit(run_profiles(args, USERNAME, PASSWORD))
+
+    if args.replay is not None and args.load is None:
+        sys.exit(run_replay(args, APPSYNC_URL))
+
+    local = None
+    if args.local:
+        import local_server
+        local = local_server.LocalAppSync(
+            latency=args.local_latency / 1000,
+            error_rate=args.local_error_rate,
+            throttle_rate=args.local_throttle_rate,
+        ).start()
+        APPSYNC_URL = local.url
+
     print(f"""
 ╔═╗┌─┐┬─┐┌┬┐┌─┐┬    ╔═╗┌─┐┌─┐╔═╗┬ ┬┌┐┌┌─┐  ╔╦╗┌─┐┌─┐┌┬┐
 ╠═╝│ │├┬┘ │ ├─┤│    ╠═╣├─┘├─┘╚═╗└┬┘││││     ║ ├┤ └─┐ │
@@ -48,20 +742,24 @@ def main():
 > APPSYNC_URL        : {bcolors.OKGREEN}{APPSYNC_URL}{bcolors.ENDC}
     """)
 
-    if USERNAME is None:
-        USERNAME = input("Input cognito Username > ")
+    if args.workers is not None:
+        sys.exit(run_workers(args, COGNIT_RREGION_NAME, COGNITO_CLIENT_KEY, APPSYNC_URL, local))
 
-    if PASSWORD is None:
-        PASSWORD = getpass("Input cognito Password > ")
+    if local is not None:
+        USERNAME = USERNAME if USERNAME is not None else "local-user"
+        session = local_server.LocalSession(local, USERNAME)
+    else:
+        if USERNAME is None:
+            USERNAME = input("Input cognito Username > ")
+        session = CognitoSession(
+            USERNAME,
+            PASSWORD if PASSWORD is not None else lambda: getpass("Input cognito Password > "),
+            COGNIT_RREGION_NAME,
+            COGNITO_CLIENT_KEY
+        )
 
     print(f"{bcolors.OKBLUE}Try{bcolors.ENDC} Sign in...")
-
-    auth = cognito.cognito_auth(
-        USERNAME,
-        PASSWORD,
-        COGNIT_RREGION_NAME,
-        COGNITO_CLIENT_KEY
-    )
+    auth = session.auth()
 
     if isinstance(auth, Exception):
         print(f"""
@@ -72,7 +770,7 @@ def main():
     else:
         user = cognito.formatAuth(auth)
         print(f"""\
-{bcolors.OKGREEN}Success{bcolors.ENDC} Sign in
+{bcolors.OKGREEN}Success{bcolors.ENDC} Sign in{" (cached token)" if session.from_cache else ""}
 {bcolors.OKBLUE}i {bcolors.ENDC}username           : {bcolors.OKGREEN}{USERNAME}{bcolors.ENDC}
 {bcolors.OKBLUE}i {bcolors.ENDC}sub                : {bcolors.OKGREEN}{user["payload"]["sub"]}{bcolors.ENDC}
 {bcolors.OKBLUE}i {bcolors.ENDC}email              : {bcolors.OKGREEN}{user["payload"]["email"]}{bcolors.ENDC}
@@ -80,9 +778,51 @@ def main():
         """)
 
     jwt = auth["AuthenticationResult"]["IdToken"]
-    graphql_client = GraphQL(APPSYNC_URL, jwt)
-    test = Test(user["payload"]["sub"], graphql_client)
+
+    if args.seed is not None:
+        status = run_seed(args, APPSYNC_URL, [{"username": USERNAME, "user_id": user["payload"]["sub"], "jwt": jwt}])
+        # --paginate right after seeding: the data of a local server only lives as long as this run
+        if status != 0 or args.paginate is None:
+            sys.exit(status)
+
+    if args.paginate is not None:
+        sys.exit(run_pagination(args, APPSYNC_URL, session))
+
+    if args.subscriptions is not None:
+        sys.exit(run_subscriptions(args, APPSYNC_URL, session, user["payload"]["sub"]))
+
+    if args.load is not None:
+        sys.exit(run_load(args, APPSYNC_URL, session, user["payload"]["sub"], local, USERNAME))
+
+    import journal
+
+    identities = [{"user_id": user["payload"]["sub"], "jwt": jwt}]
+    run_cleanup(args, APPSYNC_URL, identities)
+    recorder = LatencyRecorder()
+    writer = ResultWriter(args.results)
+    journal_writer = journal.Journal(args.journal, user["payload"]["sub"])
+    if args.concurrency is None:
+        graphql_client = GraphQL(
+            APPSYNC_URL,
+            jwt,
+            make_pool(args),
+            observers=[recorder, writer, journal_writer],
+            batch_window=args.batch_window / 1000 if args.batch_window is not None else None,
+            persisted_queries=args.persisted_queries,
+            retry_policy=RetryPolicy(max_attempts=args.retries + 1),
+            concurrency_limiter=concurrency.AdaptiveConcurrency() if args.adaptive_concurrency else None,
+        )
+    else:
+        from async_graphql import AsyncGraphQL
+        # Journals per identity instead (lanes), see concurrency_identities
+        graphql_client = AsyncGraphQL(APPSYNC_URL, jwt, max_connections=args.concurrency, observers=[recorder, writer])
+    session.start_refresh(lambda token: setattr(graphql_client, "jwt_token", token))
+    test = Test(user["payload"]["sub"], graphql_client, reporter=writer)
     test_list = test.get_test_list()
+    lanes = None
+    if args.concurrency is not None:
+        lanes = concurrency_identities(args, local, USERNAME, identities[0], len(test_list))
+        run_cleanup(args, APPSYNC_URL, lanes[1:])
 
     print(f"""
 ╔═╗─┐ ┬┌─┐┌─┐┬ ┬┌┬┐┌─┐  ╔╦╗╔═╗╔═╗╔╦╗
@@ -91,25 +831,36 @@ def main():
 > Number of test items: {bcolors.OKGREEN}{len(test_list)}{bcolors.ENDC}
     """)
 
-    errors = test.execute_test()
-
-    print(f"""
-╦═╗┌─┐┌─┐┬ ┬┬ ┌┬┐
-╠╦╝├┤ └─┐│ ││  │
-╩╚═└─┘└─┘└─┘┴─┘┴
+    if args.concurrency is None:
+        errors = test.execute_test()
+    else:
+        import asyncio
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        errors = loop.run_until_complete(test.execute_test_threaded(args.concurrency, lanes))
+        loop.run_until_complete(graphql_client.close())
+        loop.close()
+        for lane in lanes:
+            lane["observers"][0].close()
+        identities += lanes[1:]
+    writer.close()
+    journal_writer.close()
+    if isinstance(graphql_client, GraphQL):
+        if args.record is not None:
+            graphql_client.pool.writer.meta.update({"user_id": test.user_id, "scenario_values": test.scenario_values})
+        graphql_client.close()
+    identities[0]["jwt"] = graphql_client.jwt_token
+    run_cleanup(args, APPSYNC_URL, identities)
 
-> Number of test items: {bcolors.OKGREEN}{len(test_list)}{bcolors.ENDC}
-> Success count       : {bcolors.OKGREEN}{len(test_list) - len(errors)}{bcolors.ENDC}
-> Faild count         : {bcolors.OKGREEN}{len(errors)}{bcolors.ENDC}
-    """)
+    recorder.print_report()
+    if isinstance(graphql_client, GraphQL):
+        print_retries(graphql_client.retry_policy)
+        if graphql_client.concurrency_limiter is not None:
+            concurrency.print_report(graphql_client.concurrency_limiter)
+    print_result(len(test_list), errors)
 
     if (len(errors) != 0):
-        with open(join(dirname(__file__), ERROR_LOGS_FILE), mode="w") as f:
-            f.write(f"{str(datetime.now())}\n")
-            for index, error in enumerate(errors):
-                f.write(f"Error {index + 1}: \n")
-                for i, e in enumerate(error):
-                    f.write(f"{i + 1}. {str(e)}\n")
+        write_error_logs(errors)
         sys.exit(1)
 
     sys.exit(0)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""
+    metrics.py
+
+    Request latency histograms and report
+    support version: Python 3.6.5
+"""
+
+import threading
+
+from bcolors import bcolors
+
+PHASES = ["total", "connect", "tls", "ttfb", "body", "decode"]
+
+_step = threading.local()
+
+
+def set_step(title, count):
+    """ set_step
+
+        Tag requests sent from this thread with the current test step.
+
+        @param title: step title (e.g. `Query(getUser)`)
+        @param count: step number
+    """
+    _step.value = (title, count)
+
+
+def get_step():
+    """ get_step
+
+        result struct
+        (title: string, count: number) or None
+    """
+    return getattr(_step, "value", None)
+
+
+class Histogram:
+    def __init__(self, sub_bucket_bits=7):
+        """ __init__
+
+            HDR-histogram-style log-linear buckets over integer microseconds.
+            Every bucket is within 1 / 2^(sub_bucket_bits - 1) of its values,
+            so memory stays fixed however many values are recorded.
+
+            @param sub_bucket_bits: linear sub-buckets per power of two (2^bits)
+        """
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts          = {}
+        self.count           = 0
+        self.total           = 0
+        self.max             = 0
+
+    def record(self, seconds):
+        """ record
+
+            @param seconds: value to record
+        """
+        value = max(0, int(seconds * 1000000))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """ merge
+
+            @param other: Histogram with the same sub_bucket_bits
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """ percentile
+
+            Highest value equivalent to the bucket holding `percent`, in seconds
+
+            @param percent: 0 - 100
+        """
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(self.count * percent / 100 + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max) / 1000000
+        return self.max / 1000000
+
+    def mean(self):
+        """ mean
+
+            Mean value in seconds
+        """
+        return self.total / self.count / 1000000 if self.count != 0 else 0.0
+
+    def _index(self, value):
+        shift = max(0, value.bit_length() - self.sub_bucket_bits)
+        return (shift << self.sub_bucket_bits) + (value >> shift)
+
+    def _highest_equivalent(self, index):
+        shift = index >> self.sub_bucket_bits
+        sub_bucket = index & ((1 << self.sub_bucket_bits) - 1)
+        return ((sub_bucket + 1) << shift) - 1
+
+
+class LatencyRecorder:
+    def __init__(self):
+        """ __init__
+
+            GraphQL client observer: one Histogram per operation and phase.
+        """
+        self._lock      = threading.Lock()
+        self.histograms = {}
+        self.slowest    = {}
+
+    def __call__(self, timing):
+        """ __call__
+
+            @param timing: timing record sent by the GraphQL client
+
+            timing struct
+            {
+                "operation": string,
+                "step"     : (title: string, count: number) or None,
+                "variables": GraphQL request variables,
+                "status"   : number,
+                "errors"   : GraphQL errors or None,
+                "timings"  : {[phase]: seconds}
+            }
+        """
+        with self._lock:
+            operation = timing["operation"]
+            for phase, seconds in timing["timings"].items():
+                key = (operation, phase)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram()
+                self.histograms[key].record(seconds)
+
+            total = timing["timings"]["total"]
+            if operation not in self.slowest or self.slowest[operation][0] < total:
+                self.slowest[operation] = (total, timing["step"])
+
+    def merge(self, histograms):
+        """ merge
+
+            @param histograms: LatencyRecorder.histograms of another recorder
+        """
+        with self._lock:
+            for key, histogram in histograms.items():
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(histogram.sub_bucket_bits)
+                self.histograms[key].merge(histogram)
+
+    def print_report(self):
+        """ print_report
+
+            p50/p90/p99/max per operation and phase, in milliseconds
+        """
+        operations = sorted({operation for operation, _ in self.histograms})
+        if len(operations) == 0:
+            return
+
+        print("""
+╦  ┌─┐┌┬┐┌─┐┌┐┌┌─┐┬ ┬
+║  ├─┤ │ ├┤ ││││  └┬┘
+╩═╝┴ ┴ ┴ └─┘┘└┘└─┘ ┴
+""")
+        print(f"{'operation':<24}{'phase':<10}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for operation in operations:
+            for phase in PHASES:
+                histogram = self.histograms.get((operation, phase))
+                if histogram is None:
+                    continue
+                color = bcolors.OKGREEN if phase == "total" else bcolors.INFO
+                print(
+                    f"{operation if phase == 'total' else '':<24}{color}{phase:<10}{bcolors.ENDC}{histogram.count:>8}"
+                    f"{histogram.percentile(50) * 1000:>10.1f}{histogram.percentile(90) * 1000:>10.1f}"
+                    f"{histogram.percentile(99) * 1000:>10.1f}{histogram.max / 1000:>10.1f}"
+                )
+            if operation in self.slowest and self.slowest[operation][1] is not None:
+                title, count = self.slowest[operation][1]
+                print(f"{'':<24}{bcolors.INFO}slowest at step {count}. {title}{bcolors.ENDC}")
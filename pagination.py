@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+"""
+    pagination.py
+
+    Pagination throughput benchmark for list queries (listWorks / listUsers)
+    support version: Python 3.6.5
+
+    Walks every page of a list query (`limit` / `exclusiveStartKey`) and records
+    the latency of each page, items per second and how latency grows with the offset.
+    Seed data first (see seed.py) to measure at realistic sizes.
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from bcolors import bcolors
+from metrics import Histogram
+
+LIST_WORKS = """
+    query listWorks($limit: Int, $exclusiveStartKey: String) {
+        listWorks(limit: $limit, exclusiveStartKey: $exclusiveStartKey) {
+            items {
+                id
+                description
+                userId
+                title
+                tags
+                imageUrl
+                createdAt
+            }
+            exclusiveStartKey
+        }
+    }
+"""
+
+LIST_USERS = """
+    query listUsers($limit: Int, $exclusiveStartKey: String) {
+        listUsers(limit: $limit, exclusiveStartKey: $exclusiveStartKey) {
+            items {
+                id
+                email
+                displayName
+                career
+                avatarUri
+                message
+            }
+            exclusiveStartKey
+        }
+    }
+"""
+
+LIST_QUERIES = {
+    "listWorks": LIST_WORKS,
+    "listUsers": LIST_USERS,
+}
+
+
+class WalkError(Exception):
+    def __init__(self, error, walk):
+        """ __init__
+
+            A walk stopped by a failed page or check, with the pages before it
+
+            @param error: exception that stopped the walk
+            @param walk : walk result of the pages collected so far (see walk)
+        """
+        super().__init__(str(error))
+        self.error = error
+        self.walk  = walk
+
+
+def walk(client, field, page_size, prefetch=False, max_pages=None, check=None):
+    """ walk
+
+        Request every page of `field`, in order.
+
+        @param client   : GraphQL client
+        @param field    : list query root field (key of LIST_QUERIES)
+        @param page_size: `limit` of each page
+        @param prefetch : request the next page while the current one is checked
+        @param max_pages: stop after this many pages (default: all)
+        @param check    : callable(items) run on every page, raises on invalid items (default: check_items)
+
+        result struct
+        {
+            "pages"  : [{"page": number, "offset": number, "items": number, "seconds": number}],
+            "items"  : number,
+            "elapsed": seconds (wall time of the whole walk)
+        }
+        raises WalkError with the pages collected so far when a page or its check fails
+    """
+    query = LIST_QUERIES[field]
+    check = check if check is not None else check_items()
+
+    def fetch(cursor):
+        start = time.perf_counter()
+        result = client.graphql_request(query, {"limit": page_size, "exclusiveStartKey": cursor})
+        seconds = time.perf_counter() - start
+        if "errors" in result["body"]:
+            raise Exception(result["body"])
+        return result["body"]["data"][field], seconds
+
+    pages = []
+    offset = 0
+    following = None
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            connection, seconds = fetch(None)
+            while True:
+                cursor = connection.get("exclusiveStartKey")
+                is_last = cursor is None or (max_pages is not None and len(pages) + 1 >= max_pages)
+                following = executor.submit(fetch, cursor) if prefetch and not is_last else None
+
+                items = connection.get("items") or []
+                pages.append({"page": len(pages) + 1, "offset": offset, "items": len(items), "seconds": seconds})
+                offset += len(items)
+                check(items)
+
+                if is_last:
+                    break
+                connection, seconds = following.result() if following is not None else fetch(cursor)
+        except Exception as e:
+            # The prefetched page must not outlive the walk (its result is dropped)
+            if following is not None and not following.cancel():
+                wait([following])
+            raise WalkError(e, {"pages": pages, "items": offset, "elapsed": time.perf_counter() - start}) from e
+
+    return {
+        "pages"  : pages,
+        "items"  : offset,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def check_items():
+    """ check_items
+
+        Default page check: every item has an id, and no id is returned twice
+        (a broken exclusiveStartKey repeats or loops over pages).
+    """
+    seen = set()
+
+    def check(items):
+        for item in items:
+            if item.get("id") is None:
+                raise ValueError(f"Item without id: {item}")
+            if item["id"] in seen:
+                raise ValueError(f"Item {item['id']} returned twice")
+            seen.add(item["id"])
+    return check
+
+
+def degradation(pages, threshold=1.5):
+    """ degradation
+
+        How page latency grows with the offset.
+
+        @param pages    : "pages" of a walk result
+        @param threshold: deep / shallow latency ratio reported as degraded
+
+        result struct
+        {
+            "ratio"      : median latency of the last quarter of the pages / of the first quarter,
+            "ms_per_1000": least squares slope of the latency, ms per 1000 items of offset,
+            "degraded"   : bool
+        }
+    """
+    if len(pages) < 4:
+        return {"ratio": 1.0, "ms_per_1000": 0.0, "degraded": False}
+
+    quarter = len(pages) // 4
+    shallow = statistics.median(page["seconds"] for page in pages[:quarter])
+    deep = statistics.median(page["seconds"] for page in pages[-quarter:])
+    ratio = deep / shallow if shallow > 0 else 1.0
+
+    offsets = [page["offset"] for page in pages]
+    seconds = [page["seconds"] for page in pages]
+    mean_offset = statistics.mean(offsets)
+    mean_seconds = statistics.mean(seconds)
+    variance = sum((offset - mean_offset) ** 2 for offset in offsets)
+    covariance = sum((offset - mean_offset) * (second - mean_seconds) for offset, second in zip(offsets, seconds))
+    slope = covariance / variance if variance > 0 else 0.0
+
+    return {
+        "ratio"      : ratio,
+        "ms_per_1000": slope * 1000 * 1000,
+        "degraded"   : ratio >= threshold,
+    }
+
+
+def run_pagination(client, fields, page_sizes, prefetch=False, max_pages=None, threshold=1.5):
+    """ run_pagination
+
+        Walk every list query with every page size.
+
+        @param client    : GraphQL client
+        @param fields    : list query root fields (keys of LIST_QUERIES)
+        @param page_sizes: `limit` values
+        @param prefetch  : request the next page while the current one is checked
+        @param max_pages : max pages per walk (default: all)
+        @param threshold : deep / shallow latency ratio reported as degraded
+
+        result struct
+        [
+            {
+                "field", "page_size", "pages", "items", "elapsed",
+                "histogram"  : metrics.Histogram of the page latency,
+                "degradation": result of degradation,
+                "error"      : Exception or None
+            }
+        ]
+    """
+    results = []
+    for field in fields:
+        for page_size in page_sizes:
+            result = {"field": field, "page_size": page_size, "pages": [], "items": 0, "elapsed": 0.0, "error": None}
+            try:
+                result.update(walk(client, field, page_size, prefetch, max_pages))
+            except WalkError as e:
+                # Report the pages before the failure too
+                result.update(e.walk)
+                result["error"] = e.error
+            except Exception as e:
+                result["error"] = e
+            histogram = Histogram()
+            for page in result["pages"]:
+                histogram.record(page["seconds"])
+            result["histogram"] = histogram
+            result["degradation"] = degradation(result["pages"], threshold)
+            results.append(result)
+    return results
+
+
+def print_report(results):
+    """ print_report
+
+        @param results: result of run_pagination
+    """
+    print("""
+╔═╗┌─┐┌─┐┬┌┐┌┌─┐┌┬┐┬┌─┐┌┐┌
+╠═╝├─┤│ ┬││││├─┤ │ ││ ││││
+╩  ┴ ┴└─┘┴┘└┘┴ ┴ ┴ ┴└─┘┘└┘
+""")
+    print(
+        f"{'query':<12}{'limit':>7}{'pages':>7}{'items':>9}{'items/s':>10}"
+        f"{'p50 ms':>9}{'p99 ms':>9}{'deep/1st':>10}{'ms/1k':>8}"
+    )
+    for result in results:
+        histogram = result["histogram"]
+        degradation_result = result["degradation"]
+        color = bcolors.FAIL if degradation_result["degraded"] or result["error"] is not None else bcolors.OKGREEN
+        print(
+            f"{result['field']:<12}{result['page_size']:>7}{len(result['pages']):>7}{result['items']:>9}"
+            f"{result['items'] / max(result['elapsed'], 1e-9):>10.1f}"
+            f"{histogram.percentile(50) * 1000:>9.1f}{histogram.percentile(99) * 1000:>9.1f}"
+            f"{color}{degradation_result['ratio']:>10.2f}{bcolors.ENDC}{degradation_result['ms_per_1000']:>8.2f}"
+        )
+        if result["error"] is not None:
+            print(f"{'':<12}{bcolors.FAIL}{result['error']}{bcolors.ENDC}")
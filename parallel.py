@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+    parallel.py
+
+    Run the test list across a pool of Cognito identities.
+    Each worker owns its own user, so the Reset step only wipes its own data.
+    support version: Python 3.6.5
+"""
+
+import io
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from test import Test
+
+from graphql import GraphQL
+from journal import Journal
+from metrics import LatencyRecorder
+from results import ResultWriter
+from retry import RetryPolicy
+from token_cache import CognitoSession
+
+import cognito
+
+
+def read_credentials(path):
+    """ read_credentials
+
+        @param path: file with one `username:password` per line
+
+        result struct
+        [(username: string, password: string)]
+    """
+    credentials = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            username, password = line.split(":", 1)
+            credentials.append((username, password))
+    return credentials
+
+
+def sign_in_workers(credentials, region_name, client_id):
+    """ sign_in_workers
+
+        Sign in every identity at the same time, reusing cached tokens.
+
+        @param credentials: [(username, password)]
+        @param region_name: aws cognito region_name
+        @param client_id  : aws cognito client_id
+
+        result struct
+        (
+            identities: [{"username": string, "user_id": string, "jwt": string, "password": string, "region_name": string, "client_id": string}],
+            failures  : [(username: string, Exception)]
+        )
+    """
+    with ThreadPoolExecutor(max_workers=len(credentials)) as executor:
+        auths = list(executor.map(
+            lambda credential: CognitoSession(credential[0], credential[1], region_name, client_id).auth(),
+            credentials
+        ))
+
+    identities = []
+    failures = []
+    for (username, password), auth in zip(credentials, auths):
+        if isinstance(auth, Exception):
+            failures.append((username, auth))
+            continue
+        identities.append({
+            "username": username,
+            "user_id" : cognito.formatAuth(auth)["payload"]["sub"],
+            "jwt"     : auth["AuthenticationResult"]["IdToken"],
+            # Workers sign in again from the token cache to refresh their token (also in another process)
+            "password"   : password,
+            "region_name": region_name,
+            "client_id"  : client_id,
+        })
+    return identities, failures
+
+
+def execute_test_parallel(url, identities, use_processes=False, recorder=None, results_path=None, run_id=None, journal_path=None,
+                          retries=2, batch_window=None):
+    """ execute_test_parallel
+
+        Spread `Test.get_test_list()` across one worker per identity.
+        Workers of Cognito identities refresh their token before it expires.
+
+        @param url          : GraphQL Endpoint URL
+        @param identities   : result of sign_in_workers
+        @param use_processes: use a process pool instead of a thread pool
+        @param recorder     : metrics.LatencyRecorder receiving every worker's timings
+        @param results_path : JSONL results file every worker appends to (optional)
+        @param run_id       : run id written on every results line
+        @param journal_path : journal.Journal file every worker appends the data it creates to (optional)
+        @param retries      : retries of queries and throttled requests, per worker
+        @param batch_window : seconds to wait for queries to merge into one request (optional)
+
+        result struct
+        [
+            {
+                "name"  : string,
+                "output": string,
+                "error" : [Exception] or None
+            }
+        ]
+    """
+    test_count = len(Test(None, None).get_test_list())
+    worker_count = min(len(identities), test_count)
+    pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+
+    with pool(max_workers=worker_count) as executor:
+        futures = [
+            executor.submit(
+                _run_worker,
+                url,
+                identities[worker],
+                list(range(worker, test_count, worker_count)),
+                results_path,
+                run_id,
+                journal_path,
+                retries,
+                batch_window,
+            )
+            for worker in range(worker_count)
+        ]
+        results = []
+        for future in futures:
+            worker_results, histograms = future.result()
+            results += worker_results
+            if recorder is not None:
+                recorder.merge(histograms)
+
+    return [result for _, result in sorted(results, key=lambda result: result[0])]
+
+
+def _run_worker(url, identity, test_indices, results_path, run_id, journal_path, retries, batch_window):
+    recorder = LatencyRecorder()
+    writer = ResultWriter(results_path, run_id) if results_path is not None else None
+    journal_writer = Journal(journal_path, identity["user_id"]) if journal_path is not None else None
+    observers = [recorder] + [observer for observer in (writer, journal_writer) if observer is not None]
+    client = GraphQL(
+        url,
+        identity["jwt"],
+        observers=observers,
+        batch_window=batch_window,
+        retry_policy=RetryPolicy(max_attempts=retries + 1),
+    )
+    session = None
+    if identity.get("client_id") is not None:
+        # Local identities (local_server.LocalAppSync.identity) have no refresh
+        session = CognitoSession(identity["username"], identity["password"], identity["region_name"], identity["client_id"])
+        if not isinstance(session.auth(), Exception):
+            client.jwt_token = session.id_token
+            session.start_refresh(lambda token: setattr(client, "jwt_token", token))
+    results = []
+    try:
+        for test_index in test_indices:
+            output = io.StringIO()
+            test = Test(identity["user_id"], client, output, writer)
+            entry = test.get_test_list()[test_index]
+            test.scenario = entry["name"]
+            error = entry["exec"]()
+            results.append((test_index, {
+                "name"  : entry["name"],
+                "output": output.getvalue(),
+                "error" : error,
+            }))
+    finally:
+        client.close()
+        if session is not None:
+            session.stop()
+        if writer is not None:
+            writer.close()
+        if journal_writer is not None:
+            journal_writer.close()
+    return results, recorder.histograms
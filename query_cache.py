@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+    query_cache.py
+
+    Normalized query documents and their persisted query (APQ) hashes, computed once per document
+    support version: Python 3.6.5
+"""
+
+import functools
+import hashlib
+import json
+import re
+
+NAME_CHAR_PATTERN = re.compile(r"[_0-9A-Za-z]")
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+
+
+class PreparedQuery:
+    def __init__(self, text):
+        """ __init__
+
+            @param text: normalized GraphQL document
+        """
+        self.text       = text
+        self.sha256     = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self._templates = {}
+
+    def extensions(self):
+        """ extensions
+
+            `extensions` of an automatic persisted query request
+        """
+        return {"persistedQuery": {"version": 1, "sha256Hash": self.sha256}}
+
+    def body(self, variables, operation_name=None, with_query=True, persisted=False):
+        """ body
+
+            Request body bytes: the part before the variables is serialized
+            once per operation name, only the variables are encoded per call.
+
+            @param variables     : GraphQL request variables
+            @param operation_name: GraphQL request operation_name
+            @param with_query    : include the query text
+            @param persisted     : include the persisted query hash
+        """
+        key = (operation_name, with_query, persisted)
+        template = self._templates.get(key)
+        if template is None:
+            parts = [f'"operationName": {json.dumps(operation_name)}']
+            if with_query:
+                parts.append(f'"query": {json.dumps(self.text)}')
+            if persisted:
+                parts.append(f'"extensions": {json.dumps(self.extensions())}')
+            template = self._templates[key] = ("{" + ", ".join(parts) + ', "variables": ').encode("utf-8")
+        return template + json.dumps(variables).encode("utf-8") + b"}"
+
+
+@functools.lru_cache(maxsize=1024)
+def prepare(query):
+    """ prepare
+
+        @param query: GraphQL request query
+    """
+    return PreparedQuery(normalize(query))
+
+
+def normalize(query):
+    """ normalize
+
+        Same document without comments, commas and insignificant whitespace.
+        String and block string literals are kept as they are.
+
+        @param query: GraphQL request query
+    """
+    tokens = []
+    separated = False
+    index = 0
+    while index < len(query):
+        char = query[index]
+        if char in " \t\r\n,\ufeff":
+            separated = True
+            index += 1
+            continue
+        if char == "#":
+            while index < len(query) and query[index] not in "\r\n":
+                index += 1
+            separated = True
+            continue
+
+        if query.startswith('"""', index):
+            end = index + 3
+            while not query.startswith('"""', end):
+                if end >= len(query):
+                    raise ValueError("Unterminated block string")
+                end += 2 if query.startswith('\\"""', end) else 1
+            end += 3
+        elif char == '"':
+            end = index + 1
+            while end < len(query) and query[end] != '"':
+                end += 2 if query[end] == "\\" else 1
+            end += 1
+        else:
+            end = index + 1
+
+        token = query[index:end]
+        # A space is only needed between two names / numbers
+        if separated and len(tokens) != 0 and NAME_CHAR_PATTERN.match(tokens[-1][-1]) and NAME_CHAR_PATTERN.match(token[0]):
+            tokens.append(" ")
+        tokens.append(token)
+        separated = False
+        index = end
+    return "".join(tokens)
+
+
+def is_not_found(result):
+    """ is_not_found
+
+        The server does not know the hash: send the full query
+
+        @param result: decoded GraphQL response body
+    """
+    if not isinstance(result, dict):
+        return False
+    for error in result.get("errors") or []:
+        code = (error.get("extensions") or {}).get("code")
+        if error.get("message") == PERSISTED_QUERY_NOT_FOUND or code == "PERSISTED_QUERY_NOT_FOUND":
+            return True
+    return False
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+    ratelimit.py
+
+    Token bucket rate limiter shared by threads
+    support version: Python 3.6.5
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None, min_rate=None):
+        """ __init__
+
+            @param rate    : tokens added per second (also the max rate after throttling)
+            @param burst   : max tokens saved up while idle (default: one second worth, at least 1)
+            @param min_rate: lowest rate throttling can bring it to (default: rate / 100)
+        """
+        self.rate     = rate
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 100
+        self.burst    = burst if burst is not None else max(1.0, rate)
+        self._tokens  = self.burst
+        self._updated = time.monotonic()
+        self._lock    = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """ acquire
+
+            Take `tokens`, waiting until they are available.
+            Waiting callers are served in call order.
+
+            @param tokens: tokens to take
+
+            result struct
+            seconds waited
+        """
+        with self._lock:
+            self._refill()
+            # Reserve now, possibly going negative: later callers wait behind this one
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, tokens=1):
+        """ try_acquire
+
+            Take `tokens` only if they are available now.
+
+            @param tokens: tokens to take
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def set_rate(self, rate):
+        """ set_rate
+
+            @param rate: new tokens per second
+        """
+        with self._lock:
+            self._refill()
+            self.rate = rate
+
+    def throttled(self):
+        """ throttled
+
+            The server throttled a request: halve the rate
+        """
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        """ succeeded
+
+            A request went through: raise the rate back by 1% of the max rate
+        """
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
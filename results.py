@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""
+    results.py
+
+    Machine-readable results stream (one JSON object per line)
+    support version: Python 3.6.5
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+def hash_variables(variables):
+    """ hash_variables
+
+        Stable short hash of GraphQL variables
+
+        @param variables: GraphQL request variables
+    """
+    canonical = json.dumps(variables, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class ResultWriter:
+    def __init__(self, path, run_id=None, buffer_size=65536, flush_interval=1.0, per_request=False):
+        """ __init__
+
+            Append-only, buffered JSONL writer. Only whole lines are written,
+            with O_APPEND, so several processes can share one file.
+            Also a GraphQL client observer: the last request of each thread
+            is attached to the next step result.
+
+            @param path          : results file
+            @param run_id        : id written on every line (default: start time)
+            @param buffer_size   : bytes buffered before writing
+            @param flush_interval: max seconds a line stays buffered
+            @param per_request   : write one line per request instead of per test step (load mode)
+        """
+        self.path           = path
+        self.run_id         = run_id if run_id is not None else datetime.now().isoformat()
+        self.buffer_size    = buffer_size
+        self.flush_interval = flush_interval
+        self.per_request    = per_request
+        self._fd            = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._lock          = threading.Lock()
+        self._buffer        = []
+        self._buffered      = 0
+        self._flushed_at    = time.monotonic()
+        self._last          = threading.local()
+
+    def __call__(self, timing):
+        """ __call__
+
+            @param timing: timing record sent by the GraphQL client
+        """
+        if self.per_request:
+            is_success = timing["status"] < 400 and timing["errors"] is None
+            self.write(self._request_record(timing, None, is_success, timing["errors"]))
+        else:
+            self._last.timing = timing
+
+    def step(self, scenario, step, is_success, value):
+        """ step
+
+            Write the result of one test step.
+
+            @param scenario  : test name
+            @param step      : (title: string, count: number)
+            @param is_success: step passed
+            @param value     : step message, or the error payload when failed
+        """
+        timing = getattr(self._last, "timing", None)
+        self._last.timing = None
+        record = self._request_record(timing, scenario, is_success, None if is_success else _payload(value))
+        record["step"] = step[1] if step is not None else None
+        record["title"] = step[0] if step is not None else None
+        self.write(record)
+
+    def write(self, record):
+        """ write
+
+            @param record: JSON serializable dict
+        """
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered += len(line)
+            if self._buffered >= self.buffer_size or time.monotonic() - self._flushed_at >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """ flush
+
+            Write buffered lines now
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """ close
+
+            Flush and close the file
+        """
+        with self._lock:
+            self._flush()
+            os.close(self._fd)
+
+    def _flush(self):
+        if len(self._buffer) != 0:
+            os.write(self._fd, b"".join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+        self._flushed_at = time.monotonic()
+
+    def _request_record(self, timing, scenario, is_success, error):
+        record = {
+            "run"     : self.run_id,
+            "time"    : datetime.now().isoformat(),
+            "scenario": scenario,
+        }
+        if timing is not None:
+            record["operation"] = timing["operation"]
+            record["variables"] = hash_variables(timing["variables"])
+            record["status"] = timing["status"]
+            record["latency_ms"] = round(timing["timings"]["total"] * 1000, 3)
+        record["passed"] = is_success
+        record["error"] = error
+        return record
+
+
+def _payload(value):
+    if isinstance(value, (dict, list)):
+        return value
+    if isinstance(value, Exception) and len(value.args) == 1 and isinstance(value.args[0], (dict, list)):
+        return value.args[0]
+    return str(value)
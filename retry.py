@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+    retry.py
+
+    Retry policy of the GraphQL client: exponential backoff with full jitter,
+    a retry budget, and AppSync throttling detection
+    support version: Python 3.6.5
+"""
+
+import http.client
+import random
+import threading
+
+from batch import parse_operation
+
+# Worth another attempt, for idempotent operations
+TRANSIENT_STATUS = {500, 502, 503, 504}
+
+# Rejected before execution: safe to retry any operation
+THROTTLE_STATUS = 429
+
+# errorType of throttled resolvers (AppSync, DynamoDB, Lambda)
+THROTTLE_ERROR_TYPES = ["Throttl", "ProvisionedThroughputExceeded", "TooManyRequests", "RequestLimitExceeded"]
+
+# Connection reset / refused, timeouts (socket.timeout), malformed responses
+TRANSPORT_ERRORS = (http.client.HTTPException, OSError)
+
+
+def is_idempotent(query):
+    """ is_idempotent
+
+        Queries are; mutations, subscriptions and unparsable documents are not.
+
+        @param query: GraphQL request query
+    """
+    operation = parse_operation(query)
+    return operation is not None and operation.operation_type == "query"
+
+
+def is_throttled(status, result):
+    """ is_throttled
+
+        @param status: HTTP status
+        @param result: decoded GraphQL response body (or None)
+    """
+    if status == THROTTLE_STATUS:
+        return True
+    if not isinstance(result, dict):
+        return False
+    for error in result.get("errors") or []:
+        error_type = str(error.get("errorType") or "")
+        if any(throttle in error_type for throttle in THROTTLE_ERROR_TYPES):
+            return True
+    return False
+
+
+class RetryBudget:
+    def __init__(self, ratio=0.2, burst=10):
+        """ __init__
+
+            Retries allowed over all requests of a client: every request adds
+            `ratio` retry, up to `burst` saved. Keeps retries from multiplying
+            the load on a backend that is already failing.
+
+            @param ratio: retries per request
+            @param burst: max retries saved up
+        """
+        self.ratio   = ratio
+        self.burst   = burst
+        self._tokens = float(burst)
+        self._lock   = threading.Lock()
+
+    def deposit(self):
+        """ deposit
+
+            One request was sent
+        """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """ withdraw
+
+            Take one retry, False when the budget is spent
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=3, base_delay=0.1, max_delay=5.0, budget=None, retry_non_idempotent=False):
+        """ __init__
+
+            @param max_attempts        : attempts per request, including the first (1: no retry)
+            @param base_delay          : seconds before the first retry (upper bound of the jitter)
+            @param max_delay           : max seconds between two attempts
+            @param budget              : RetryBudget (default: RetryBudget())
+            @param retry_non_idempotent: also retry mutations after transport errors and 5xx
+                                         (throttled requests are always retried)
+        """
+        self.max_attempts         = max_attempts
+        self.base_delay           = base_delay
+        self.max_delay            = max_delay
+        self.budget               = budget if budget is not None else RetryBudget()
+        self.retry_non_idempotent = retry_non_idempotent
+        self.retries              = 0
+        self.throttled            = 0
+        self.exhausted            = 0
+        self._lock                = threading.Lock()
+
+    def backoff(self, attempt, retry_after=None):
+        """ backoff
+
+            Full jitter: uniform between 0 and base_delay * 2 ** (attempt - 1) (capped),
+            at least the server's Retry-After.
+
+            @param attempt    : number of attempts done
+            @param retry_after: Retry-After header value (seconds)
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        try:
+            return max(delay, min(self.max_delay, float(retry_after))) if retry_after is not None else delay
+        except ValueError:
+            return delay
+
+    def should_retry(self, query, attempt, status=None, result=None, error=None):
+        """ should_retry
+
+            @param query  : GraphQL request query
+            @param attempt: number of attempts done
+            @param status : HTTP status (None after a transport error)
+            @param result : decoded GraphQL response body
+            @param error  : transport error
+        """
+        if attempt == 1:
+            self.budget.deposit()
+
+        throttled = error is None and is_throttled(status, result)
+        if throttled:
+            with self._lock:
+                self.throttled += 1
+        if error is not None:
+            retryable = isinstance(error, TRANSPORT_ERRORS)
+        else:
+            retryable = throttled or status in TRANSIENT_STATUS
+        if not retryable or attempt >= self.max_attempts:
+            return False
+        # A 429 was rejected before execution; anything else may have run
+        if not (status == THROTTLE_STATUS or self.retry_non_idempotent or is_idempotent(query)):
+            return False
+
+        if not self.budget.withdraw():
+            with self._lock:
+                self.exhausted += 1
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
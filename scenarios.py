@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+"""
+    scenarios.py
+
+    AWS AppSync Portal Test scenarios, run by engine.py
+    support version: Python 3.6.5
+"""
+
+from datetime import datetime
+
+from shape import ANY, Merge, Ref
+
+IMAGE_URL = "https://s3-ap-northeast-1.amazonaws.com/is09-portal-image/system/broken-image.png"
+
+# Queries
+
+USER_FIELDS = """
+    id
+    email
+    displayName
+    career
+    avatarUri
+    message
+"""
+
+WORK_FIELDS = """
+    id
+    description
+    userId
+    title
+    tags
+    imageUrl
+    createdAt
+"""
+
+CREATE_USER = """
+    mutation createUser(
+        $user: UserCreate!
+    ) {
+        createUser(
+            user: $user
+        ) {%s}
+    }
+"""
+
+GET_USER = """
+    query($id: ID!) {
+        getUser(id: $id) {%s}
+    }
+"""
+
+UPDATE_USER = """
+    mutation(
+        $user: UserUpdate!
+    ) {
+        updateUser(
+            user: $user
+        ) {%s}
+    }
+""" % USER_FIELDS
+
+DELETE_USER = """
+    mutation ($id: ID!) {
+        deleteUser(id: $id) {%s}
+    }
+"""
+
+CREATE_WORK = """
+    mutation createWork(
+        $work: WorkCreate!
+    ) {
+        createWork(
+            work: $work
+        ) {%s}
+    }
+""" % WORK_FIELDS
+
+GET_WORK = """
+    query($id: ID!) {
+        getWork(id: $id) {%s}
+    }
+""" % WORK_FIELDS
+
+DELETE_WORK = """
+    mutation ($id: ID!) {
+        deleteWork(id: $id) {%s}
+    }
+"""
+
+UPDATE_WORK = """
+    mutation(
+        $work: WorkUpdate!
+    ) {
+        updateWork(
+            work: $work
+        ) {%s}
+    }
+""" % WORK_FIELDS
+
+# Subscriptions: onUpdateX is subscribed (@aws_subscribe) to updateX, events are filtered by the arguments
+
+ON_UPDATE_USER = """
+    subscription ($id: ID) {
+        onUpdateUser(id: $id) {%s}
+    }
+""" % USER_FIELDS
+
+ON_UPDATE_WORK = """
+    subscription ($userId: ID) {
+        onUpdateWork(userId: $userId) {%s}
+    }
+""" % WORK_FIELDS
+
+USER_WORKS_FIELDS = USER_FIELDS + """
+    works {
+        items {%s}
+        exclusiveStartKey
+    }
+""" % WORK_FIELDS
+
+# Steps
+
+RESET = {
+    "title"    : "Reset(deleteUser)",
+    "query"    : DELETE_USER % "id",
+    "variables": {"id": Ref("user_id")},
+    "capture"  : {"deleted_user_id": "deleteUser.id"},
+    "message"  : "Delete own user data {deleted_user_id}",
+}
+
+CREATE_USER_NO_VERIFICATION = {
+    "title"    : "Mutation(createUser)",
+    "query"    : CREATE_USER % "id",
+    "variables": {
+        "user": {
+            "displayName": Ref("test_user_name"),
+            "email"      : "AppSync-test@sample.xyz",
+            "career"     : "AppSync-test test_user test",
+            "avatarUri"  : IMAGE_URL,
+            "message"    : "",
+        }
+    },
+    "capture"  : {"created_user_id": "createUser.id"},
+    "message"  : "Create user {created_user_id}",
+}
+
+
+def _test_user_values():
+    return {
+        "user_input": {
+            "displayName": f"AppSync-test sample user {str(datetime.now())}",
+            "email"      : "AppSync-test@sample.xyz",
+            "career"     : "AppSync-test test_user test",
+            "avatarUri"  : IMAGE_URL,
+            "message"    : "",
+        },
+        "user_update": {
+            "displayName": f"AppSync-test sample user {str(datetime.now())} (updated)",
+            "email"      : "AppSync-test@sample.xyz (updated)",
+            "career"     : "AppSync-test test_user test (updated)",
+            "avatarUri"  : f"{IMAGE_URL} (updated)",
+            "message"    : "AppSync-test test_user test message (updated)",
+        },
+    }
+
+
+# AppSync stores an empty message as " "
+_CREATED_USER = Merge(Ref("user_input"), {"id": Ref("user_id"), "message": " "})
+_UPDATED_USER = Merge(Ref("user_update"), {"id": Ref("user_id")})
+
+# Flow
+# 1. Reset
+# 2. createUser: Confirmation equal to createUser request data
+# 3. getUser   : Confirmation equal to createUser request data
+# 4. updateUser: Confirmation equal to updateUser request data
+# 5. getUser   : Confirmation equal to updateUser request data
+# 6. deleteUser: Confirm whether it was deleted
+# 7. getUser   : Confirm whether it was deleted
+USER_TEST = {
+    "name"  : "User test",
+    "values": _test_user_values,
+    "steps" : [
+        RESET,
+        {
+            "title"    : "Mutation(createUser)",
+            "query"    : CREATE_USER % USER_FIELDS,
+            "variables": {"user": Ref("user_input")},
+            "expect"   : {"createUser": _CREATED_USER},
+            "capture"  : {"created_user_id": "createUser.id"},
+            "message"  : "Create user {created_user_id}",
+        },
+        {
+            "title"    : "Query(getUser)",
+            "query"    : GET_USER % USER_FIELDS,
+            "variables": {"id": Ref("user_id")},
+            "expect"   : {"getUser": _CREATED_USER},
+            "message"  : "Get user {user_id}",
+        },
+        {
+            "title"    : "Mutation(updateUser)",
+            "query"    : UPDATE_USER,
+            "variables": {"user": _UPDATED_USER},
+            "expect"   : {"updateUser": _UPDATED_USER},
+            "message"  : "Update user {user_id}",
+        },
+        {
+            "title"    : "Query(getUser)",
+            "query"    : GET_USER % USER_FIELDS,
+            "variables": {"id": Ref("user_id")},
+            "expect"   : {"getUser": _UPDATED_USER},
+            "message"  : "Get user {user_id}",
+        },
+        RESET,
+        {
+            "title"    : "Query(getUser)",
+            "query"    : GET_USER % USER_FIELDS,
+            "variables": {"id": Ref("user_id")},
+            "expect"   : {"getUser": None},
+            "message"  : "Delete own user data",
+        },
+    ],
+}
+
+
+def _test_work_values():
+    return {
+        "test_user_name": f"AppSync-test test user {str(datetime.now())}",
+        "work_input": {
+            "title"      : "AppSync-test test user",
+            "description": f"AppSync-test work {str(datetime.now())}",
+            "tags"       : ["AppSync-test"],
+            "imageUrl"   : IMAGE_URL,
+        },
+        "work_update": {
+            "title"      : "AppSync-test test user (updated)",
+            "description": f"AppSync-test work {str(datetime.now())} (updated)",
+            "tags"       : ["AppSync-test", "AppSync-test-updated"],
+            "imageUrl"   : IMAGE_URL,
+        },
+    }
+
+
+_CREATED_WORK = Merge(Ref("work_input"), {
+    "id"       : Ref("created_work_id"),
+    "userId"   : Ref("user_id"),
+    "createdAt": Ref("created_work_createdAt"),
+})
+_UPDATED_WORK = Merge(Ref("work_update"), {
+    "id"       : Ref("created_work_id"),
+    "userId"   : Ref("user_id"),
+    "createdAt": Ref("created_work_createdAt"),
+})
+
+# Flow
+# 1. Reset
+# 2. createUser     : No verification
+# 3. createWork     : Confirmation equal to createWork request data
+# 4. getUser(works) : Confirmation equal to createWork request data
+# 5. getWork        : Confirmation equal to createWork request data
+# 6. updateWork     : Confirmation equal to updateWork request data
+# 7. getUser(works) : Confirmation equal to updateWork request data
+# 8. getWork        : Confirmation equal to updateWork request data
+# 9. deleteUser     : Confirm whether it was work deleted
+# 10. getUser(works): Confirm whether it was work deleted
+# 11. getWork       : Confirm whether it was work deleted
+WORK_TEST = {
+    "name"  : "Work test",
+    "values": _test_work_values,
+    "steps" : [
+        RESET,
+        CREATE_USER_NO_VERIFICATION,
+        {
+            "title"    : "Mutation(createWork)",
+            "query"    : CREATE_WORK,
+            "variables": {"work": Merge(Ref("work_input"), {"userId": Ref("user_id")})},
+            "capture"  : {"created_work_id": "createWork.id", "created_work_createdAt": "createWork.createdAt"},
+            "expect"   : {"createWork": _CREATED_WORK},
+            "message"  : "Create work {created_work_id}",
+        },
+        {
+            "title"    : "Query(getUser)",
+            "query"    : GET_USER % USER_WORKS_FIELDS,
+            "variables": {"id": Ref("user_id")},
+            "expect"   : {"getUser.works.items.0": _CREATED_WORK},
+            "message"  : "Get work on getUser {created_work_id}",
+        },
+        {
+            "title"    : "Query(getWork)",
+            "query"    : GET_WORK,
+            "variables": {"id": Ref("created_work_id")},
+            "expect"   : {"getWork": _CREATED_WORK},
+            "message"  : "Get work {created_work_id}",
+        },
+        {
+            "title"    : "Mutation(updateWork)",
+            "query"    : UPDATE_WORK,
+            "variables": {"work": Merge(Ref("work_update"), {"id": Ref("created_work_id"), "userId": Ref("user_id")})},
+            "expect"   : {"updateWork": _UPDATED_WORK},
+            "message"  : "Update work {created_work_id}",
+        },
+        {
+            "title"    : "Query(getUser)",
+            "query"    : GET_USER % USER_WORKS_FIELDS,
+            "variables": {"id": Ref("user_id")},
+            "expect"   : {"getUser.works.items.0": _UPDATED_WORK},
+            "message"  : "Get work on getUser {created_work_id}",
+        },
+        {
+            "title"    : "Query(getWork)",
+            "query"    : GET_WORK,
+            "variables": {"id": Ref("created_work_id")},
+            "expect"   : {"getWork": _UPDATED_WORK},
+            "message"  : "Get work {created_work_id}",
+        },
+        {
+            "title"    : "Reset(deleteUser)",
+            "query"    : DELETE_USER % ("id\nworks {items {%s}}" % WORK_FIELDS),
+            "variables": {"id": Ref("user_id")},
+            "expect"   : {"deleteUser.works.items": []},
+            "capture"  : {"deleted_user_id": "deleteUser.id"},
+            "message"  : "Delete own user data {deleted_user_id}",
+        },
+        {
+            "title"    : "Query(getUser)",
+            "query"    : GET_USER % USER_WORKS_FIELDS,
+            "variables": {"id": Ref("user_id")},
+            "expect"   : {"getUser": None},
+            "message"  : "Get work on getUser, deleted works",
+        },
+        {
+            "title"    : "Query(getWork)",
+            "query"    : GET_WORK,
+            "variables": {"id": Ref("created_work_id")},
+            "expect"   : {"getWork": None},
+            "message"  : "Get work, deleted works",
+        },
+    ],
+}
+
+
+def _test_work_list_values():
+    return {
+        "test_user_name"  : f"AppSync-test test user {str(datetime.now())}",
+        "work_description": f"AppSync-test work {str(datetime.now())}",
+    }
+
+
+def _create_work_step(index):
+    work_input = {
+        "userId"     : Ref("user_id"),
+        "title"      : f"AppSync-test Work {index + 1}",
+        "description": Ref("work_description"),
+        "tags"       : ["test", "even" if (index + 1) % 2 == 0 else "odd"],
+        "imageUrl"   : IMAGE_URL,
+    }
+    return {
+        "title"    : "Mutation(createWork)",
+        "query"    : CREATE_WORK,
+        "variables": {"work": work_input},
+        "expect"   : {"createWork": Merge(work_input, {"id": ANY, "createdAt": ANY})},
+        "capture"  : {"created_work_id": "createWork.id"},
+        "message"  : "Create work {created_work_id}",
+    }
+
+
+# TODO: creating...
+# Flow
+# 1. Reset
+# 2. createUser: No verification
+# 3. createWork: Confirmation equal to createWork request data (x25)
+WORK_LIST_TEST = {
+    "name"  : "Work list test",
+    "values": _test_work_list_values,
+    "steps" : [RESET, CREATE_USER_NO_VERIFICATION] + [_create_work_step(index) for index in range(25)],
+}
+
+SCENARIOS = [
+    USER_TEST,
+    WORK_TEST,
+    # WORK_LIST_TEST,
+]
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+    seed.py
+
+    Bulk data seeding for listWorks / listUsers scale tests
+    support version: Python 3.6.5
+
+    One user per Cognito identity (createUser creates the caller's own user),
+    any number of works per user, created with aliased createWork mutations
+    (one request per batch), concurrently and rate limited.
+    Every finished batch is appended to a progress file: a new run with the
+    same file and endpoint only creates what is missing. Progress of a user
+    that no longer exists (deleted by the tests' reset, or a fresh endpoint)
+    is ignored and the user is seeded again.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import batch
+from connection_pool import ConnectionPool
+from graphql import GraphQL
+from ratelimit import TokenBucket
+from results import ResultWriter
+from scenarios import CREATE_USER, GET_USER, IMAGE_URL
+
+SEED_CREATE_WORK = """
+    mutation createWork(
+        $work: WorkCreate!
+    ) {
+        createWork(
+            work: $work
+        ) {
+            id
+        }
+    }
+"""
+
+
+def read_progress(path, url):
+    """ read_progress
+
+        @param path: progress file
+        @param url : GraphQL Endpoint URL the progress was made on
+
+        result struct
+        {
+            "users": {[user_id]},
+            "works": {[user_id]: number of created works}
+        }
+    """
+    progress = {"users": set(), "works": {}}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Last line of an interrupted run
+                    continue
+                if record.get("url") != url:
+                    continue
+                if record.get("type") == "user":
+                    progress["users"].add(record["user_id"])
+                elif record.get("type") == "works":
+                    progress["works"][record["user_id"]] = progress["works"].get(record["user_id"], 0) + record["count"]
+    except FileNotFoundError:
+        pass
+    return progress
+
+
+class Seeder:
+    def __init__(self, url, identities, works_per_user, batch_size=25, concurrency=8, rate=None,
+                 progress_path="portal-seed-progress.jsonl", observers=None, retry_policy=None):
+        """ __init__
+
+            @param url           : GraphQL Endpoint URL
+            @param identities    : [{"username", "user_id", "jwt"}] (see parallel.sign_in_workers)
+            @param works_per_user: works each user should own
+            @param batch_size    : createWork mutations per request
+            @param concurrency   : requests in flight
+            @param rate          : max requests per second, halved on throttling (default: no limit)
+            @param progress_path : progress file (JSONL, appended)
+            @param observers     : GraphQL client observers (e.g. metrics.LatencyRecorder)
+            @param retry_policy  : retry.RetryPolicy shared by the clients (optional)
+        """
+        self.url            = url
+        self.identities     = identities
+        self.works_per_user = works_per_user
+        self.batch_size     = batch_size
+        self.concurrency    = concurrency
+        self.bucket         = TokenBucket(rate) if rate is not None else None
+        self.progress_path  = progress_path
+        self.observers      = observers if observers is not None else []
+        self.retry_policy   = retry_policy
+        self.created        = 0
+        self.errors         = []
+        self._lock          = threading.Lock()
+
+    def run(self, on_progress=None):
+        """ run
+
+            @param on_progress: called with (created works, works to create) after every batch
+
+            result struct
+            {
+                "users"  : number of seeded users,
+                "created": number of works created by this run,
+                "skipped": number of works created by earlier runs,
+                "errors" : [Exception],
+                "elapsed": seconds
+            }
+        """
+        progress = read_progress(self.progress_path, self.url)
+        writer = ResultWriter(self.progress_path, buffer_size=0)
+        pool = ConnectionPool(max_size=self.concurrency)
+        clients = {
+            identity["user_id"]: GraphQL(
+                self.url, identity["jwt"], pool, self.observers, retry_policy=self.retry_policy, rate_limiter=self.bucket
+            )
+            for identity in self.identities
+        }
+        start = time.perf_counter()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                seeded = []
+                users = list(clients)
+                for user_id, (created, error) in zip(users, executor.map(lambda user_id: self._seed_user(clients[user_id], user_id), users)):
+                    if error is not None:
+                        self.errors.append(error)
+                        continue
+                    if created:
+                        # A user created now has no works, whatever the progress file says
+                        progress["works"].pop(user_id, None)
+                        writer.write({"type": "user", "url": self.url, "user_id": user_id, "time": datetime.now().isoformat()})
+                    seeded.append(user_id)
+
+                batches = []
+                for user_id in seeded:
+                    done = progress["works"].get(user_id, 0)
+                    for first in range(done, self.works_per_user, self.batch_size):
+                        batches.append((user_id, first, min(self.batch_size, self.works_per_user - first)))
+                total = sum(count for _, _, count in batches)
+
+                def seed_batch(user_id, first, count):
+                    ids = self._seed_works(clients[user_id], user_id, first, count)
+                    if len(ids) != 0:
+                        writer.write({"type": "works", "url": self.url, "user_id": user_id, "count": len(ids), "ids": ids})
+                    with self._lock:
+                        self.created += len(ids)
+                        if on_progress is not None:
+                            on_progress(self.created, total)
+
+                for future in [executor.submit(seed_batch, *entry) for entry in batches]:
+                    future.result()
+        finally:
+            writer.close()
+            pool.close()
+
+        return {
+            "users"  : len(clients),
+            "created": self.created,
+            "skipped": sum(min(progress["works"].get(user_id, 0), self.works_per_user) for user_id in clients),
+            "errors" : self.errors,
+            "elapsed": time.perf_counter() - start,
+        }
+
+    def _seed_user(self, client, user_id):
+        """ _seed_user
+
+            createUser for the client's identity, unless it already exists.
+            Returns (created, Exception on failure).
+        """
+        try:
+            result = client.graphql_request(GET_USER % "id", {"id": user_id})
+            if (result["body"].get("data") or {}).get("getUser") is not None:
+                return False, None
+            result = client.graphql_request(CREATE_USER % "id", {
+                "user": {
+                    "displayName": f"AppSync-test seed user {str(datetime.now())}",
+                    "email"      : "AppSync-test@sample.xyz",
+                    "career"     : "AppSync-test seed",
+                    "avatarUri"  : IMAGE_URL,
+                    "message"    : "",
+                }
+            })
+            if "errors" in result["body"]:
+                return False, Exception(result["body"])
+            return True, None
+        except Exception as e:
+            return False, e
+
+    def _seed_works(self, client, user_id, first, count):
+        """ _seed_works
+
+            One request creating `count` works. Returns the created ids.
+        """
+        requests = [
+            (SEED_CREATE_WORK, {"work": {
+                "userId"     : user_id,
+                "title"      : f"AppSync-test seed work {first + index + 1}",
+                "description": f"AppSync-test seed work {first + index + 1} of {user_id}",
+                "tags"       : ["AppSync-test-seed", "even" if (first + index + 1) % 2 == 0 else "odd"],
+                "imageUrl"   : IMAGE_URL,
+            }}, None)
+            for index in range(count)
+        ]
+        body, keys = batch.merge_operations(requests)
+        try:
+            result = client.graphql_request(body["query"], body["variables"], body["operationName"])
+        except Exception as e:
+            with self._lock:
+                self.errors.append(e)
+            return []
+
+        data = result["body"].get("data") or {}
+        ids = [data[alias]["id"] for request_keys in keys for alias, _ in request_keys if data.get(alias) is not None]
+        if "errors" in result["body"]:
+            with self._lock:
+                self.errors.append(Exception(result["body"]["errors"]))
+        return ids
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+
+"""
+    selftest.py
+
+    Table-driven behaviour checks of the response parsers, the shape matcher, batching
+    and the local server, offline (the last table runs a test pass on loopback)
+    support version: Python 3.6.5
+
+    Every table row is (name, arguments..., expected): the check of the table is
+    called with the arguments and its result compared with `expected`. An exception
+    class as `expected` passes when the check raises it.
+
+    $ python3 main.py --self-test
+"""
+
+import io
+import uuid
+from test import Test
+
+import batch
+import local_server
+import streaming
+from bcolors import bcolors
+from graphql import GraphQL
+from shape import ANY, Merge, Ref, compile_shape
+
+# Reads of 1 byte split every delimiter, line and JSON document
+CHUNK_SIZES = (1, 7, streaming.CHUNK_SIZE)
+
+
+class _Chunked:
+    def __init__(self, body, size):
+        """ __init__
+
+            File-like response returning at most `size` bytes per read
+
+            @param body: response body bytes
+            @param size: max bytes per read
+        """
+        self.body = body
+        self.size = size
+
+    def read(self, size):
+        size = min(size, self.size)
+        chunk, self.body = self.body[:size], self.body[size:]
+        return chunk
+
+
+def check_streaming(parser, body):
+    """ check_streaming
+
+        Payloads of `body`, which must not depend on how the reads split it
+
+        @param parser: streaming.iter_ndjson or streaming.iter_multipart
+        @param body  : response body bytes
+
+        result struct
+        [payload], or the payloads of every CHUNK_SIZES when they differ
+    """
+    results = [list(parser(_Chunked(body, size))) for size in CHUNK_SIZES]
+    return results[0] if all(result == results[0] for result in results[1:]) else results
+
+
+def check_merge(payloads):
+    """ check_merge
+
+        @param payloads: initial payload, then the subsequent ones
+    """
+    result = {}
+    for payload in payloads:
+        streaming.merge_incremental(result, payload)
+    return result
+
+
+def check_shape(spec, path, actual, values):
+    """ check_shape
+
+        @param spec  : expected shape (see shape.py)
+        @param path  : keys from the response data to the checked value
+        @param actual: response data
+        @param values: values of the Ref in the shape
+
+        result struct
+        [(JSON path, message)] of shape.Shape.diff
+    """
+    return compile_shape(spec, path).diff(actual, values)
+
+
+def check_batch(requests):
+    """ check_batch
+
+        Merged document and split responses against the local server executor,
+        with a user of two works
+
+        @param requests: [(query, variables, operation_name)]
+
+        result struct
+        per request: "differs" when its split response is not the one of running it alone,
+        else "errors" or "ok" for that response
+    """
+    executor = local_server.Executor(local_server.Store())
+    claims = local_server.verify_token(SECRET, local_server.mint_token(SECRET, USERNAME))
+    executor.execute(claims, "mutation { createUser(user: {}) { id } }", None)
+    for title in ("a", "b"):
+        executor.execute(claims, CREATE_WORK, {"work": {"userId": USER_ID, "title": title}})
+
+    alone = [executor.execute(claims, query, variables) for query, variables, _ in requests]
+    body, keys = batch.merge_operations(requests)
+    split = batch.split_result(executor.execute(claims, body["query"], body["variables"]), keys)
+    return [
+        "differs" if split is None or split[index] != result else "errors" if "errors" in result else "ok"
+        for index, result in enumerate(alone)
+    ]
+
+
+def check_token(expires_in, secret, transform):
+    """ check_token
+
+        @param expires_in: seconds until exp of the minted token
+        @param secret    : verifying key
+        @param transform : callable(token) -> token sent to verify_token
+
+        result struct
+        (cognito:username, sub) of the verified claims, or None when rejected
+    """
+    claims = local_server.verify_token(secret, transform(local_server.mint_token(SECRET, USERNAME, expires_in=expires_in)))
+    return (claims["cognito:username"], claims["sub"]) if claims is not None else None
+
+
+def check_test_pass(batch_window):
+    """ check_test_pass
+
+        Every test against a local server on loopback, through the real client
+
+        @param batch_window: GraphQL batch window, seconds (None: no batching)
+
+        result struct
+        errors of Test.execute_test
+    """
+    server = local_server.LocalAppSync().start()
+    try:
+        client = GraphQL(server.url, server.mint_token(USERNAME), batch_window=batch_window)
+        try:
+            return Test(server.identity(USERNAME)["user_id"], client, output=io.StringIO()).execute_test()
+        finally:
+            client.close()
+    finally:
+        server.stop()
+
+
+PART_HEAD = b"Content-Type: application/json; charset=utf-8\r\n\r\n"
+
+LOADS_CASES = [
+    # (name, body, expected)
+    ("one document", b'{"data":{"a":1}}', {"data": {"a": 1}}),
+    ("NDJSON: first line only", b'{"data":{"a":1}}\n{"data":{"a":2}}\n', {"data": {"a": 1}}),
+    ("leading whitespace", b'\r\n  {"data":null}\n{"x":1}', {"data": None}),
+    ("not JSON", b"<html>", ValueError),
+]
+
+STREAMING_CASES = [
+    # (name, parser, body, expected payloads)
+    ("NDJSON lines", streaming.iter_ndjson, b'{"a":1}\n{"b":2}\n', [{"a": 1}, {"b": 2}]),
+    ("NDJSON CRLF, blank lines, no final newline", streaming.iter_ndjson, b'{"a":1}\r\n\r\n  {"b":[1,2]}', [{"a": 1}, {"b": [1, 2]}]),
+    ("NDJSON escaped newline in a string", streaming.iter_ndjson, b'{"a":"x\\ny"}\n', [{"a": "x\ny"}]),
+    ("NDJSON empty body", streaming.iter_ndjson, b"", []),
+    ("NDJSON broken line", streaming.iter_ndjson, b'{"a":1}\n{"b":\n', ValueError),
+    (
+        "multipart parts and closing delimiter",
+        streaming.iter_multipart,
+        b"---\r\n" + PART_HEAD + b'{"data":{"user":{"id":"1"}},"hasNext":true}\r\n'
+        b"---\r\n" + PART_HEAD + b'{"incremental":[{"path":["user"],"data":{"name":"a"}}],"hasNext":false}\r\n-----\r\n',
+        [{"data": {"user": {"id": "1"}}, "hasNext": True}, {"incremental": [{"path": ["user"], "data": {"name": "a"}}], "hasNext": False}],
+    ),
+    (
+        "multipart preamble CRLF, part without headers",
+        streaming.iter_multipart,
+        b"\r\n---\r\n" + PART_HEAD + b'{"data":{"a":1},"hasNext":true}\r\n---\r\n\r\n{"hasNext":false}\r\n-----\r\n',
+        [{"data": {"a": 1}, "hasNext": True}, {"hasNext": False}],
+    ),
+    (
+        "multipart last part without its delimiter",
+        streaming.iter_multipart,
+        b"---\r\n" + PART_HEAD + b'{"data":{"a":1},"hasNext":true}',
+        [{"data": {"a": 1}, "hasNext": True}],
+    ),
+    (
+        "multipart boundary text inside a payload",
+        streaming.iter_multipart,
+        b"---\r\n" + PART_HEAD + b'{"data":{"a":"---"}}\r\n-----\r\n',
+        [{"data": {"a": "---"}}],
+    ),
+]
+
+MERGE_CASES = [
+    # (name, payloads, expected result)
+    ("initial payload only", [{"data": {"a": 1}, "hasNext": False}], {"data": {"a": 1}}),
+    (
+        "@defer fields at a path",
+        [{"data": {"user": {"id": "1"}}}, {"incremental": [{"path": ["user"], "data": {"name": "a"}}]}],
+        {"data": {"user": {"id": "1", "name": "a"}}},
+    ),
+    (
+        "@stream items at a list path",
+        [{"data": {"works": [{"id": "1"}]}}, {"incremental": [{"path": ["works"], "items": [{"id": "2"}, {"id": "3"}]}]}],
+        {"data": {"works": [{"id": "1"}, {"id": "2"}, {"id": "3"}]}},
+    ),
+    (
+        "subsequent payload without incremental (older servers)",
+        [{"data": {"user": {"id": "1"}}}, {"path": ["user"], "data": {"name": "a"}}],
+        {"data": {"user": {"id": "1", "name": "a"}}},
+    ),
+    (
+        "errors of the payloads and of the items",
+        [{"data": {"user": {}}, "errors": [{"message": "a"}]}, {"incremental": [{"path": ["user"], "data": None, "errors": [{"message": "b"}]}]}],
+        {"data": {"user": {}}, "errors": [{"message": "a"}, {"message": "b"}]},
+    ),
+]
+
+WORK = {"title": "t", "tags": ["a"]}
+ITEMS = ["getUser", "works", "items", 0]
+
+SHAPE_CASES = [
+    # (name, spec, path, actual, values, expected diffs)
+    ("static value", {"a": 1, "b": [1, 2]}, (), {"a": 1, "b": [1, 2]}, None, []),
+    (
+        "static differences, nested",
+        {"a": 1, "b": {"c": "x"}}, (), {"a": 2, "b": {"c": "y", "d": None}}, None,
+        [("$.a", "expected 1, got 2"), ("$.b.c", "expected 'x', got 'y'"), ("$.b.d", "unexpected null")],
+    ),
+    ("ANY matches null", {"id": ANY, "title": "t"}, (), {"id": None, "title": "t"}, None, []),
+    ("ANY key still required", {"id": ANY, "title": "t"}, (), {"title": "t"}, None, [("$.id", "missing")]),
+    ("Ref value", {"id": Ref("user_id")}, (), {"id": "u1"}, {"user_id": "u1"}, []),
+    ("Ref difference inside the value", {"work": Ref("work")}, (), {"work": {"title": "t", "tags": ["b"]}}, {"work": WORK},
+     [("$.work.tags[0]", "expected 'a', got 'b'")]),
+    ("Merge dict base, Ref override", Merge({"id": ANY, "title": "x", "tags": []}, {"title": Ref("title")}), (),
+     {"id": "1", "title": "t", "tags": []}, {"title": "t"}, []),
+    (
+        "Merge Ref base: override, missing and unexpected keys",
+        Merge(Ref("work"), {"id": ANY}), (), {"id": "9", "title": "x", "extra": 1}, {"work": WORK},
+        [("$.title", "expected 't', got 'x'"), ("$.tags", "missing"), ("$.extra", "unexpected 1")],
+    ),
+    ("path to a list item", {"title": "t"}, ITEMS, {"getUser": {"works": {"items": [{"title": "u"}]}}}, None,
+     [("$.getUser.works.items[0].title", "expected 't', got 'u'")]),
+    ("path past the end of a list", {"title": "t"}, ITEMS[:3] + [1], {"getUser": {"works": {"items": [{"title": "t"}]}}}, None,
+     [("$.getUser.works.items[1]", "missing (parent is [{'title': 't'}])")]),
+    ("list length", [{"id": ANY}], (), [{"id": 1}, {"id": 2}], None, [("$", "expected 1 items, got 2")]),
+    ("object expected", {"a": ANY}, (), None, None, [("$", "expected an object, got null")]),
+    ("Ref without a value", {"id": Ref("user_id")}, (), {"id": "u1"}, {}, KeyError),
+]
+
+SECRET = b"selftest"
+USERNAME = "selftest"
+USER_ID = str(uuid.uuid5(uuid.NAMESPACE_URL, f"local-appsync:{USERNAME}"))
+
+CREATE_WORK = "mutation createWork($work: CreateWorkInput!) { createWork(work: $work) { id } }"
+GET_USER = "query getUser($id: ID!, $limit: Int) { getUser(id: $id) { id works(limit: $limit) { items { title } } } }"
+LIST_WORKS = "query listWorks($limit: Int) { works: listWorks(limit: $limit) { items { id } exclusiveStartKey } }"
+
+MERGE_OPERATIONS_CASES = [
+    # (name, requests, expected (body, keys))
+    (
+        "aliases and variables prefixed per request",
+        [("query getUser($id: ID!) { getUser(id: $id) { id } }", {"id": "u1"}, "getUser"),
+         ("query listWorks($limit: Int) { w: listWorks(limit: $limit) { items { id } } }", {"limit": 2}, "listWorks")],
+        (
+            {
+                "operationName": "Batch",
+                "query"        : "query Batch($b0_id: ID!, $b1_limit: Int) {\nb0_getUser: getUser(id: $b0_id) { id }\n"
+                                 "b1_w: listWorks(limit: $b1_limit) { items { id } }\n}",
+                "variables"    : {"b0_id": "u1", "b1_limit": 2},
+            },
+            [[("b0_getUser", "getUser")], [("b1_w", "w")]],
+        ),
+    ),
+]
+
+SPLIT_RESULT_CASES = [
+    # (name, merged result, keys, expected responses)
+    (
+        "data and error paths back to the request keys",
+        {"data": {"b0_getUser": {"id": "u1"}, "b1_w": None}, "errors": [{"path": ["b1_w", "items"], "message": "x"}]},
+        [[("b0_getUser", "getUser")], [("b1_w", "w")]],
+        [{"data": {"getUser": {"id": "u1"}}}, {"data": {"w": None}, "errors": [{"path": ["w", "items"], "message": "x"}]}],
+    ),
+    (
+        "error without a path: not attributable",
+        {"data": None, "errors": [{"message": "x"}]},
+        [[("b0_getUser", "getUser")], [("b1_w", "w")]],
+        None,
+    ),
+]
+
+BATCH_CASES = [
+    # (name, requests, expected per request)
+    (
+        "nested argument variables, aliases, repeated operation",
+        [(GET_USER, {"id": USER_ID, "limit": 1}, "getUser"), (LIST_WORKS, {"limit": 1}, "listWorks"), (LIST_WORKS, {"limit": 2}, "listWorks")],
+        ["ok", "ok", "ok"],
+    ),
+    (
+        "field error stays with its request",
+        [(LIST_WORKS, {"limit": 1}, "listWorks"), ("query getUser($id: ID!) { getUser(id: $id, unknown: 1) { id } }", {"id": USER_ID}, "getUser")],
+        ["ok", "errors"],
+    ),
+]
+
+TOKEN_CASES = [
+    # (name, expires_in, verifying secret, transform, expected (username, sub) or None)
+    ("minted token verifies", 60, SECRET, lambda token: token, (USERNAME, USER_ID)),
+    ("Bearer prefix", 60, SECRET, lambda token: "Bearer " + token, (USERNAME, USER_ID)),
+    ("other secret", 60, b"other", lambda token: token, None),
+    ("expired", -1, SECRET, lambda token: token, None),
+    (
+        "claims swapped under the signature",
+        60, SECRET,
+        lambda token: ".".join([token.split(".")[0], local_server.mint_token(SECRET, "other").split(".")[1], token.split(".")[2]]),
+        None,
+    ),
+    ("not a JWT", 60, SECRET, lambda token: "abc", None),
+    ("no token", 60, SECRET, lambda token: None, None),
+]
+
+TEST_PASS_CASES = [
+    # (name, batch_window, expected errors)
+    ("every test", None, []),
+    ("every test, batched queries", 0.002, []),
+]
+
+TABLES = [
+    # (table name, rows, check)
+    ("streaming.loads", LOADS_CASES, streaming.loads),
+    ("streaming.iter_ndjson / iter_multipart", STREAMING_CASES, check_streaming),
+    ("streaming.merge_incremental", MERGE_CASES, check_merge),
+    ("shape.compile_shape / Shape.diff", SHAPE_CASES, check_shape),
+    ("batch.merge_operations", MERGE_OPERATIONS_CASES, batch.merge_operations),
+    ("batch.split_result", SPLIT_RESULT_CASES, batch.split_result),
+    ("batch against local_server.Executor", BATCH_CASES, check_batch),
+    ("local_server.mint_token / verify_token (HS256)", TOKEN_CASES, check_token),
+    ("test pass against local_server.LocalAppSync", TEST_PASS_CASES, check_test_pass),
+]
+
+
+def run_tables(tables=None):
+    """ run_tables
+
+        Run every row of the tables and print one line per row.
+
+        @param tables: [(table name, rows, check)] (default: TABLES)
+
+        result struct
+        ["table name: row name" of the failed rows]
+    """
+    failures = []
+    for table_name, rows, check in tables if tables is not None else TABLES:
+        print(f"{bcolors.OKBLUE}{table_name}{bcolors.ENDC}")
+        for name, *arguments, expected in rows:
+            try:
+                result = check(*arguments)
+            except Exception as e:
+                result = e
+            if isinstance(expected, type) and issubclass(expected, Exception):
+                is_success = isinstance(result, expected)
+            else:
+                is_success = not isinstance(result, Exception) and result == expected
+            if is_success:
+                print(f"    {name} {bcolors.OKGREEN}{bcolors.BOLD}✓{bcolors.ENDC}")
+            else:
+                failures.append(f"{table_name}: {name}")
+                print(f"    {bcolors.FAIL}{bcolors.BOLD}{name} ✗{bcolors.ENDC}")
+                print(f"        expected: {expected!r}")
+                print(f"        got     : {result!r}")
+    return failures
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+"""
+    shape.py
+
+    Expected response shapes, compiled once and matched in a single pass
+    support version: Python 3.6.5
+
+    A shape is plain JSON data, with
+    - ANY               : any value (server generated ids, timestamps)
+    - Ref(name)         : a value known when the response is checked (input values, captured ids)
+    - Merge(base, dict) : `base` with some keys replaced, without building the merged dict
+    Matching never copies the response or the expected values, and returns
+    every difference with its JSON path, e.g. `$.getUser.works.items[0].title`.
+"""
+
+
+class _Any:
+    def __repr__(self):
+        return "ANY"
+
+
+# Matches any value, e.g. server generated ids and timestamps
+ANY = _Any()
+
+
+class Ref:
+    def __init__(self, name):
+        """ __init__
+
+            Value of `name` in the scenario values (or a captured output)
+
+            @param name: value name
+        """
+        self.name = name
+
+    def __repr__(self):
+        return f"Ref({self.name!r})"
+
+
+class Merge:
+    def __init__(self, base, overrides):
+        """ __init__
+
+            Copy of the dict `base` with `overrides` applied
+
+            @param base     : dict, may be a Ref
+            @param overrides: dict, values may be Ref
+        """
+        self.base      = base
+        self.overrides = overrides
+
+
+def compile_shape(spec, path=()):
+    """ compile_shape
+
+        @param spec: expected value, may contain ANY / Ref / Merge
+        @param path: keys from the response data to the value checked by `spec`
+                     (e.g. ["getUser", "works", "items", 0])
+
+        result struct
+        Shape
+    """
+    node = _compile(spec)
+    for key in reversed(list(path)):
+        node = _Path(key, node)
+    return Shape(node)
+
+
+class Shape:
+    def __init__(self, node):
+        self._node = node
+
+    def diff(self, actual, values=None):
+        """ diff
+
+            @param actual: response data
+            @param values: values of the Ref in the shape
+
+            result struct
+            [(path: string, message: string)], empty when the response matches
+        """
+        diffs = []
+        self._node.match(actual, values, None, diffs)
+        return [(format_path(path), message) for path, message in diffs]
+
+    def matches(self, actual, values=None):
+        """ matches
+
+            @param actual: response data
+            @param values: values of the Ref in the shape
+        """
+        return len(self.diff(actual, values)) == 0
+
+
+def format_path(path):
+    """ format_path
+
+        @param path: (parent path, key) chain built while matching
+    """
+    keys = []
+    while path is not None:
+        path, key = path
+        keys.append(key)
+    text = "$"
+    for key in reversed(keys):
+        text += f"[{key}]" if isinstance(key, int) else f".{key}"
+    return text
+
+
+def _compile(spec):
+    if spec is ANY:
+        return _AnyNode()
+    if isinstance(spec, Ref):
+        return _RefNode(spec.name)
+    if isinstance(spec, Merge):
+        if isinstance(spec.base, Ref):
+            base = _RefNode(spec.base.name)
+        else:
+            base = {key: _compile(value) for key, value in spec.base.items()}
+        return _MergeNode(base, {key: _compile(value) for key, value in spec.overrides.items()})
+    if not _is_dynamic(spec):
+        return _Value(spec)
+    if isinstance(spec, dict):
+        return _Dict({key: _compile(value) for key, value in spec.items()})
+    return _List([_compile(value) for value in spec])
+
+
+def _is_dynamic(spec):
+    if spec is ANY or isinstance(spec, (Ref, Merge)):
+        return True
+    if isinstance(spec, dict):
+        return any(_is_dynamic(value) for value in spec.values())
+    if isinstance(spec, list):
+        return any(_is_dynamic(value) for value in spec)
+    return False
+
+
+class _AnyNode:
+    def match(self, actual, values, path, diffs):
+        pass
+
+
+class _Value:
+    def __init__(self, value):
+        self.value = value
+
+    def match(self, actual, values, path, diffs):
+        # Fast path: equal (compared in C), only walk the values to find the differences
+        if self.value != actual:
+            _diff(self.value, actual, path, diffs)
+
+
+class _RefNode:
+    def __init__(self, name):
+        self.name = name
+
+    def match(self, actual, values, path, diffs):
+        expected = values[self.name]
+        if expected != actual:
+            _diff(expected, actual, path, diffs)
+
+    def resolve(self, values):
+        return values[self.name]
+
+
+class _Dict:
+    def __init__(self, fields):
+        self.fields = fields
+
+    def match(self, actual, values, path, diffs):
+        if not isinstance(actual, dict):
+            diffs.append((path, f"expected an object, got {_short(actual)}"))
+            return
+        for key, node in self.fields.items():
+            if key in actual:
+                node.match(actual[key], values, (path, key), diffs)
+            else:
+                diffs.append(((path, key), "missing"))
+        if len(actual) != len(self.fields):
+            for key in actual:
+                if key not in self.fields:
+                    diffs.append(((path, key), f"unexpected {_short(actual[key])}"))
+
+
+class _List:
+    def __init__(self, items):
+        self.items = items
+
+    def match(self, actual, values, path, diffs):
+        if not isinstance(actual, list):
+            diffs.append((path, f"expected an array, got {_short(actual)}"))
+            return
+        if len(actual) != len(self.items):
+            diffs.append((path, f"expected {len(self.items)} items, got {len(actual)}"))
+        for index, (node, item) in enumerate(zip(self.items, actual)):
+            node.match(item, values, (path, index), diffs)
+
+
+class _MergeNode:
+    def __init__(self, base, overrides):
+        """ __init__
+
+            @param base     : _RefNode, or {[key]: node} for a dict written in the shape
+            @param overrides: {[key]: node}
+        """
+        self.base      = base
+        self.overrides = overrides
+
+    def match(self, actual, values, path, diffs):
+        if not isinstance(actual, dict):
+            diffs.append((path, f"expected an object, got {_short(actual)}"))
+            return
+        is_ref = isinstance(self.base, _RefNode)
+        base = self.base.resolve(values) if is_ref else self.base
+
+        for key, node in self.overrides.items():
+            if key in actual:
+                node.match(actual[key], values, (path, key), diffs)
+            else:
+                diffs.append(((path, key), "missing"))
+        for key, expected in base.items():
+            if key in self.overrides:
+                continue
+            if key not in actual:
+                diffs.append(((path, key), "missing"))
+            elif not is_ref:
+                expected.match(actual[key], values, (path, key), diffs)
+            elif expected != actual[key]:
+                _diff(expected, actual[key], (path, key), diffs)
+        for key in actual:
+            if key not in base and key not in self.overrides:
+                diffs.append(((path, key), f"unexpected {_short(actual[key])}"))
+
+
+class _Path:
+    def __init__(self, key, node):
+        self.key  = key
+        self.node = node
+
+    def match(self, actual, values, path, diffs):
+        try:
+            value = actual[self.key]
+        except (KeyError, IndexError, TypeError):
+            diffs.append(((path, self.key), f"missing (parent is {_short(actual)})"))
+            return
+        self.node.match(value, values, (path, self.key), diffs)
+
+
+def _diff(expected, actual, path, diffs):
+    if expected is ANY:
+        return
+    if isinstance(expected, dict):
+        if not isinstance(actual, dict):
+            diffs.append((path, f"expected an object, got {_short(actual)}"))
+            return
+        for key, value in expected.items():
+            if key not in actual:
+                diffs.append(((path, key), "missing"))
+            elif value != actual[key]:
+                _diff(value, actual[key], (path, key), diffs)
+        for key in actual:
+            if key not in expected:
+                diffs.append(((path, key), f"unexpected {_short(actual[key])}"))
+    elif isinstance(expected, list):
+        if not isinstance(actual, list):
+            diffs.append((path, f"expected an array, got {_short(actual)}"))
+            return
+        if len(actual) != len(expected):
+            diffs.append((path, f"expected {len(expected)} items, got {len(actual)}"))
+        for index, (value, item) in enumerate(zip(expected, actual)):
+            if value != item:
+                _diff(value, item, (path, index), diffs)
+    elif expected != actual:
+        diffs.append((path, f"expected {_short(expected)}, got {_short(actual)}"))
+
+
+def _short(value, limit=60):
+    text = "null" if value is None else repr(value)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
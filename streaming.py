@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""
+    streaming.py
+
+    Incremental GraphQL response parsing (NDJSON, multipart/mixed incremental delivery)
+    support version: Python 3.6.5
+"""
+
+import json
+
+CHUNK_SIZE = 65536
+
+
+def loads(body):
+    """ loads
+
+        First JSON document of a response body, parsed from the bytes directly.
+        Anything after the first document (e.g. NDJSON) is ignored.
+
+        @param body: response body bytes
+    """
+    try:
+        return json.loads(body)
+    except ValueError:
+        text = body.decode("utf-8").lstrip()
+        return json.JSONDecoder().raw_decode(text)[0]
+
+
+def iter_ndjson(response, chunk_size=CHUNK_SIZE):
+    """ iter_ndjson
+
+        Yield each line of a newline-delimited JSON body as soon as it is complete.
+
+        @param response  : file-like response (http.client.HTTPResponse)
+        @param chunk_size: max bytes per read
+    """
+    buffer = bytearray()
+    for chunk in _chunks(response, chunk_size):
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            if end > start:
+                line = bytes(buffer[start:end]).strip()
+                if line:
+                    yield json.loads(line)
+            start = end + 1
+        del buffer[:start]
+    tail = bytes(buffer).strip()
+    if tail:
+        yield json.loads(tail)
+
+
+def iter_multipart(response, boundary="-", chunk_size=CHUNK_SIZE):
+    """ iter_multipart
+
+        Yield the JSON payload of each part of a multipart/mixed body
+        (GraphQL incremental delivery, `@defer` / `@stream`) as soon as the part is complete.
+
+        @param response  : file-like response (http.client.HTTPResponse)
+        @param boundary  : multipart boundary
+        @param chunk_size: max bytes per read
+    """
+    delimiter = b"\r\n--" + boundary.encode("latin-1")
+    # A delimiter at the very start of the body has no leading CRLF
+    buffer = bytearray(b"\r\n")
+    delivered = False
+    for chunk in _chunks(response, chunk_size):
+        buffer += chunk
+        while True:
+            first = buffer.find(delimiter)
+            if first < 0:
+                break
+            second = buffer.find(delimiter, first + len(delimiter))
+            if second < 0:
+                # Servers may send the next delimiter only with the next part:
+                # deliver a part as soon as its JSON is complete
+                if not delivered and bytes(buffer[-16:]).rstrip().endswith(b"}"):
+                    try:
+                        payload = _part_payload(bytes(buffer[first + len(delimiter):]))
+                    except ValueError:
+                        payload = None
+                    if payload is not None:
+                        delivered = True
+                        yield payload
+                break
+            part = bytes(buffer[first + len(delimiter):second])
+            del buffer[:second]
+            if delivered:
+                delivered = False
+                continue
+            payload = _part_payload(part)
+            if payload is not None:
+                yield payload
+
+
+def merge_incremental(result, payload):
+    """ merge_incremental
+
+        Apply one incremental payload to the result built so far.
+
+        @param result : merged response body (updated in place)
+        @param payload: initial or subsequent payload
+    """
+    if "errors" in payload:
+        result.setdefault("errors", []).extend(payload["errors"])
+
+    items = payload.get("incremental")
+    if items is None and "path" in payload:
+        items = [payload]
+    if items is None:
+        if "data" in payload:
+            result["data"] = payload["data"]
+        return result
+
+    for item in items:
+        node = result.setdefault("data", {})
+        for key in item.get("path", []):
+            node = node[key]
+        if "items" in item:
+            node.extend(item["items"])
+        elif item.get("data") is not None:
+            node.update(item["data"])
+        if "errors" in item:
+            result.setdefault("errors", []).extend(item["errors"])
+    return result
+
+
+def _chunks(response, chunk_size):
+    read = getattr(response, "read1", response.read)
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _part_payload(part):
+    if part.startswith(b"--"):
+        return None
+    head, separator, body = part.lstrip(b"\r\n").partition(b"\r\n\r\n")
+    if separator == b"":
+        body = head
+    body = body.strip()
+    return json.loads(body) if body else None
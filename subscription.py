@@ -0,0 +1,575 @@
+# -*- coding: utf-8 -*-
+
+"""
+    subscription.py
+
+    AppSync real-time subscriptions (WebSocket, graphql-ws) and their delivery latency
+    support version: Python 3.6.5
+
+    A Connection is one real-time WebSocket, acknowledged (connection_init /
+    connection_ack) when created. Connections are read by one SubscriptionHub
+    thread (selectors), not a thread each, so thousands of subscribers fit in
+    one process. run_subscriptions opens many subscribers, sends mutations and
+    measures the time from each mutation being sent to its event arriving on
+    every subscriber, the connection setup rate and the memory per connection.
+"""
+
+import base64
+import json
+import selectors
+import socket
+import ssl
+import threading
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+import websocket
+from bcolors import bcolors
+from metrics import Histogram
+from scenarios import CREATE_USER, CREATE_WORK, DELETE_USER, IMAGE_URL, ON_UPDATE_USER, ON_UPDATE_WORK, UPDATE_USER, UPDATE_WORK
+
+PROTOCOL = "graphql-ws"
+
+# Allocations of the local stand-in, when it runs in this process, are not the client's
+SERVER_FILES = ["*local_server.py", "*socketserver.py", "*http/server.py"]
+
+RECEIVE_SIZE = 65536
+
+
+def authorization(url, jwt):
+    """ authorization
+
+        AppSync real-time authorization of a Cognito user pool token
+
+        @param url: GraphQL Endpoint URL
+        @param jwt: jwt token
+    """
+    return {"host": urlsplit(url).netloc, "Authorization": jwt}
+
+
+def realtime_url(url, jwt):
+    """ realtime_url
+
+        Real-time endpoint of a GraphQL endpoint, with the connection authorization.
+        xxx.appsync-api.<region>.amazonaws.com/graphql -> xxx.appsync-realtime-api.<region>.amazonaws.com/graphql,
+        other hosts (custom domains, local_server): <path>/realtime
+
+        @param url: GraphQL Endpoint URL
+        @param jwt: jwt token
+    """
+    parts = urlsplit(url)
+    scheme = "wss" if parts.scheme == "https" else "ws"
+    if ".appsync-api." in parts.netloc:
+        base = f"{scheme}://{parts.netloc.replace('.appsync-api.', '.appsync-realtime-api.')}{parts.path}"
+    else:
+        base = f"{scheme}://{parts.netloc}{parts.path.rstrip('/')}/realtime"
+    header = base64.b64encode(json.dumps(authorization(url, jwt)).encode("utf-8")).decode("ascii")
+    return f"{base}?{urlencode({'header': header, 'payload': 'e30='})}"
+
+
+class Subscription:
+    def __init__(self, connection, id, listener=None):
+        """ __init__
+
+            @param connection: Connection
+            @param id        : subscription id
+            @param listener  : called with (subscription, data message payload, receive time (time.perf_counter))
+        """
+        self.connection   = connection
+        self.id           = id
+        self.listener     = listener
+        self.events       = 0
+        self.errors       = []
+        self.acknowledged = threading.Event()
+
+    def receive(self, message, received_at):
+        """ receive
+
+            @param message    : graphql-ws message of this subscription
+            @param received_at: receive time (time.perf_counter)
+        """
+        kind = message.get("type")
+        if kind == "start_ack":
+            self.acknowledged.set()
+        elif kind == "data":
+            self.events += 1
+            if self.listener is not None:
+                self.listener(self, message.get("payload") or {}, received_at)
+        elif kind == "error":
+            self.errors.append(message.get("payload"))
+            self.acknowledged.set()
+        elif kind == "complete":
+            self.connection.subscriptions.pop(self.id, None)
+
+
+class Connection:
+    def __init__(self, url, jwt, timeout=10.0):
+        """ __init__
+
+            Open and initialize a real-time connection (blocking).
+
+            @param url    : GraphQL Endpoint URL
+            @param jwt    : jwt token
+            @param timeout: seconds to connect and to get connection_ack
+        """
+        self.url                = url
+        self.jwt                = jwt
+        self.subscriptions      = {}
+        self.keepalives         = 0
+        self.closed             = False
+        self.connection_timeout = None
+        self._reader            = websocket.FrameReader()
+        self._send_lock         = threading.Lock()
+
+        start = time.perf_counter()
+        self.sock, received, self.timings = websocket.connect(realtime_url(url, jwt), PROTOCOL, timeout)
+        try:
+            initialized = time.perf_counter()
+            self.send({"type": "connection_init"})
+            self._wait_ack(received, initialized + timeout)
+        except BaseException:
+            self.sock.close()
+            raise
+        self.timings["ack"] = time.perf_counter() - initialized
+        self.timings["total"] = time.perf_counter() - start
+
+    def _wait_ack(self, received, deadline):
+        while True:
+            for message in self.receive(received, time.perf_counter()):
+                if message.get("type") == "connection_ack":
+                    self.connection_timeout = (message.get("payload") or {}).get("connectionTimeoutMs", 300000) / 1000
+                    return
+                if message.get("type") == "connection_error":
+                    raise ConnectionError(f"connection_error: {json.dumps(message.get('payload'))}")
+            if self.closed:
+                raise ConnectionError("connection closed before connection_ack")
+            if time.perf_counter() > deadline:
+                raise socket.timeout("no connection_ack")
+            received = self.sock.recv(RECEIVE_SIZE)
+            if not received:
+                raise ConnectionError("connection closed before connection_ack")
+
+    def receive(self, data, received_at):
+        """ receive
+
+            Answer pings and hand the messages of a subscription to it.
+
+            @param data       : received bytes
+            @param received_at: receive time (time.perf_counter)
+
+            result struct
+            [graphql-ws connection message (connection_ack, connection_error, ka)]
+        """
+        messages = []
+        for opcode, payload in self._reader.feed(data):
+            if opcode == websocket.OP_PING:
+                self._send_frame(websocket.encode_frame(websocket.OP_PONG, payload))
+            elif opcode == websocket.OP_CLOSE:
+                self.closed = True
+            elif opcode == websocket.OP_TEXT:
+                message = json.loads(payload.decode("utf-8"))
+                subscription = self.subscriptions.get(message.get("id"))
+                if subscription is not None:
+                    subscription.receive(message, received_at)
+                    continue
+                if message.get("type") == "ka":
+                    self.keepalives += 1
+                messages.append(message)
+        return messages
+
+    def subscribe(self, query, variables=None, listener=None):
+        """ subscribe
+
+            Send a start message. Subscription.acknowledged is set on start_ack (or error).
+
+            @param query    : GraphQL subscription document
+            @param variables: GraphQL request variables
+            @param listener : called with (subscription, data message payload, receive time)
+        """
+        subscription = Subscription(self, str(uuid.uuid4()), listener)
+        self.subscriptions[subscription.id] = subscription
+        self.send({
+            "id"     : subscription.id,
+            "type"   : "start",
+            "payload": {
+                "data"      : json.dumps({"query": query, "variables": variables if variables is not None else {}}),
+                "extensions": {"authorization": authorization(self.url, self.jwt)},
+            },
+        })
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """ unsubscribe
+
+            @param subscription: Subscription of this connection
+        """
+        self.send({"id": subscription.id, "type": "stop"})
+
+    def send(self, message):
+        """ send
+
+            @param message: graphql-ws message
+        """
+        self._send_frame(websocket.encode_frame(websocket.OP_TEXT, json.dumps(message).encode("utf-8")))
+
+    def close(self):
+        """ close
+
+            Close frame, then the socket
+        """
+        if not self.closed:
+            self.closed = True
+            try:
+                self._send_frame(websocket.close_frame())
+            except OSError:
+                pass
+        self.sock.close()
+
+    def _send_frame(self, frame):
+        with self._send_lock:
+            self.sock.sendall(frame)
+
+
+class SubscriptionHub:
+    def __init__(self):
+        """ __init__
+
+            Reads every connection from one thread
+        """
+        self.connections = []
+        self._selector   = selectors.DefaultSelector()
+        self._lock       = threading.Lock()
+        self._thread     = None
+        self._running    = False
+
+    def open(self, url, jwt, count, concurrency=16, timeout=10.0):
+        """ open
+
+            Open `count` connections, `concurrency` handshakes at a time, and read them.
+
+            @param url        : GraphQL Endpoint URL
+            @param jwt        : jwt token
+            @param count      : connections to open
+            @param concurrency: handshakes in flight
+            @param timeout    : seconds to connect and to get connection_ack
+
+            result struct
+            {
+                "opened"  : [Connection],
+                "failures": [Exception],
+                "elapsed" : number (seconds)
+            }
+        """
+        def open_connection(_):
+            try:
+                return Connection(url, jwt, timeout)
+            except (OSError, ValueError) as e:
+                return e
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, count))) as executor:
+            results = list(executor.map(open_connection, range(count)))
+        elapsed = time.perf_counter() - start
+
+        opened = [result for result in results if isinstance(result, Connection)]
+        for connection in opened:
+            self.add(connection)
+        return {
+            "opened"  : opened,
+            "failures": [result for result in results if not isinstance(result, Connection)],
+            "elapsed" : elapsed,
+        }
+
+    def add(self, connection):
+        """ add
+
+            @param connection: Connection to read
+        """
+        with self._lock:
+            self.connections.append(connection)
+            self._selector.register(connection.sock, selectors.EVENT_READ, connection)
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def remove(self, connection):
+        """ remove
+
+            Stop reading a connection and close it
+
+            @param connection: Connection
+        """
+        with self._lock:
+            if connection in self.connections:
+                self.connections.remove(connection)
+                self._selector.unregister(connection.sock)
+        connection.close()
+
+    def close(self):
+        """ close
+
+            Close every connection and stop the reader
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        for connection in list(self.connections):
+            self.remove(connection)
+        self._selector.close()
+
+    def _run(self):
+        while self._running:
+            for key, _ in self._selector.select(timeout=0.2):
+                connection = key.data
+                try:
+                    data = connection.sock.recv(RECEIVE_SIZE)
+                    # Decrypted TLS data does not wake the selector again
+                    while isinstance(connection.sock, ssl.SSLSocket) and connection.sock.pending() > 0:
+                        data += connection.sock.recv(connection.sock.pending())
+                except (socket.timeout, ssl.SSLWantReadError):
+                    continue
+                except OSError:
+                    data = b""
+                if data:
+                    connection.receive(data, time.perf_counter())
+                if not data or connection.closed:
+                    self.remove(connection)
+
+
+class DeliveryProbe:
+    def __init__(self, field, key):
+        """ __init__
+
+            Listener of the subscriptions of one event: matches each event to
+            the mutation that sent it by a marker value, and times the delivery.
+
+            @param field: subscription field (e.g. `onUpdateWork`)
+            @param key  : field of the event carrying the marker (e.g. `title`)
+        """
+        self.field      = field
+        self.key        = key
+        self.latency    = Histogram()
+        self.spread     = Histogram()
+        self.response   = Histogram()
+        self.delivered  = 0
+        self.missed     = 0
+        self.unexpected = 0
+        self._pending   = {}
+        self._condition = threading.Condition()
+
+    def __call__(self, subscription, payload, received_at):
+        value = ((payload.get("data") or {}).get(self.field) or {}).get(self.key)
+        with self._condition:
+            received = self._pending.get(value)
+            if received is None:
+                # Not sent by this probe, or after its timeout
+                self.unexpected += 1
+                return
+            received.append(received_at)
+            self._condition.notify_all()
+
+    def measure(self, marker, subscribers, send, timeout):
+        """ measure
+
+            Send one mutation and wait for its event on every subscriber.
+
+            @param marker     : value of `key` in the event, unique per mutation
+            @param subscribers: subscriptions expected to receive the event
+            @param send       : sends the mutation carrying the marker
+            @param timeout    : seconds to wait for the events
+        """
+        received = []
+        with self._condition:
+            self._pending[marker] = received
+        sent_at = time.perf_counter()
+        send()
+        self.response.record(time.perf_counter() - sent_at)
+
+        deadline = sent_at + timeout
+        with self._condition:
+            while len(received) < subscribers and time.perf_counter() < deadline:
+                self._condition.wait(deadline - time.perf_counter())
+            del self._pending[marker]
+        for received_at in received:
+            self.latency.record(received_at - sent_at)
+        if len(received) != 0:
+            self.spread.record(max(received) - min(received))
+        self.delivered += len(received)
+        self.missed += max(0, subscribers - len(received))
+
+
+def measure_memory(url, jwt, count, subscribe, timeout=10.0):
+    """ measure_memory
+
+        Python memory allocated per open, subscribed connection (tracemalloc),
+        without the allocations of a local_server running in this process.
+
+        @param url      : GraphQL Endpoint URL
+        @param jwt      : jwt token
+        @param count    : connections of the sample
+        @param subscribe: called with each connection, returns its subscriptions
+        @param timeout  : seconds to connect and to get the acknowledgements
+
+        result struct
+        bytes per connection
+    """
+    hub = SubscriptionHub()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(25)
+    try:
+        before = tracemalloc.take_snapshot()
+        opened = hub.open(url, jwt, count, timeout=timeout)["opened"]
+        for connection in opened:
+            for subscription in subscribe(connection):
+                subscription.acknowledged.wait(timeout)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+        hub.close()
+
+    filters = [tracemalloc.Filter(False, pattern, all_frames=True) for pattern in SERVER_FILES]
+    filters.append(tracemalloc.Filter(False, tracemalloc.__file__))
+    growth = sum(stat.size_diff for stat in after.filter_traces(filters).compare_to(before.filter_traces(filters), "filename"))
+    return growth / max(1, len(opened))
+
+
+def run_subscriptions(client, user_id, subscribers, events, concurrency=16, timeout=10.0, memory_sample=50):
+    """ run_subscriptions
+
+        1. Reset and create the user of the client's identity, and one work
+        2. Memory per connection, over `memory_sample` subscribed connections (closed again)
+        3. Open `subscribers` connections, each subscribed to onUpdateUser and onUpdateWork of the user
+        4. `events` updateUser then `events` updateWork mutations, one at a time,
+           each one timed from being sent to its event arriving on every subscriber
+        5. Close the connections and delete the user
+
+        @param client       : GraphQL client signed in as the user
+        @param user_id      : Portal user id
+        @param subscribers  : connections to open
+        @param events       : mutations per event
+        @param concurrency  : handshakes in flight
+        @param timeout      : seconds to wait for a connection or an event
+        @param memory_sample: connections of the memory measurement (0: skip it)
+
+        result struct
+        {
+            "subscribers": number (connections open),
+            "failures"   : [Exception] (connections and subscriptions that failed),
+            "setup"      : Histogram (connection setup, seconds),
+            "setup_rate" : number (connections per second),
+            "memory"     : number (bytes per connection) or None,
+            "probes"     : [DeliveryProbe],
+            "errors"     : [GraphQL errors of the mutations]
+        }
+    """
+    url = client.url
+    errors = []
+
+    def request(query, variables):
+        result = client.graphql_request(query, variables)
+        if "errors" in result["body"]:
+            errors.append(result["body"]["errors"])
+        return result["body"].get("data") or {}
+
+    user_input = {
+        "displayName": f"AppSync-test subscription user {str(datetime.now())}",
+        "email"      : "AppSync-test@sample.xyz",
+        "career"     : "AppSync-test subscription",
+        "avatarUri"  : IMAGE_URL,
+        "message"    : "",
+    }
+    work_input = {
+        "userId"     : user_id,
+        "title"      : "AppSync-test subscription work",
+        "description": "AppSync-test subscription work",
+        "tags"       : ["AppSync-test"],
+        "imageUrl"   : IMAGE_URL,
+    }
+    request(DELETE_USER % "id", {"id": user_id})
+    request(CREATE_USER % "id", {"user": user_input})
+    work = request(CREATE_WORK, {"work": work_input}).get("createWork") or {}
+
+    probes = [DeliveryProbe("onUpdateUser", "displayName"), DeliveryProbe("onUpdateWork", "title")]
+
+    def subscribe(connection):
+        return [
+            connection.subscribe(ON_UPDATE_USER, {"id": user_id}, probes[0]),
+            connection.subscribe(ON_UPDATE_WORK, {"userId": user_id}, probes[1]),
+        ]
+
+    memory = measure_memory(url, client.jwt_token, memory_sample, subscribe, timeout) if memory_sample > 0 else None
+
+    hub = SubscriptionHub()
+    try:
+        opened = hub.open(url, client.jwt_token, subscribers, concurrency, timeout)
+        failures = list(opened["failures"])
+        setup = Histogram()
+        for connection in opened["opened"]:
+            setup.record(connection.timings["total"])
+        subscriptions = [subscription for connection in opened["opened"] for subscription in subscribe(connection)]
+        for subscription in subscriptions:
+            subscription.acknowledged.wait(timeout)
+            failures += [Exception(error) for error in subscription.errors]
+        active = len(opened["opened"])
+
+        for index in range(events):
+            marker = f"AppSync-test subscription user {index + 1} {uuid.uuid4()}"
+            user = dict(user_input, id=user_id, displayName=marker)
+            probes[0].measure(marker, active, lambda: request(UPDATE_USER, {"user": user}), timeout)
+        for index in range(events):
+            marker = f"AppSync-test subscription work {index + 1} {uuid.uuid4()}"
+            work_update = dict(work_input, id=work.get("id"), title=marker)
+            probes[1].measure(marker, active, lambda: request(UPDATE_WORK, {"work": work_update}), timeout)
+    finally:
+        hub.close()
+        request(DELETE_USER % "id", {"id": user_id})
+
+    return {
+        "subscribers": active,
+        "failures"   : failures,
+        "setup"      : setup,
+        "setup_rate" : active / max(opened["elapsed"], 1e-9),
+        "memory"     : memory,
+        "probes"     : probes,
+        "errors"     : errors,
+    }
+
+
+def print_report(summary):
+    """ print_report
+
+        @param summary: result of run_subscriptions
+    """
+    print(f"""
+╔═╗┬ ┬┌┐ ┌─┐┌─┐┬─┐┬┌─┐┌┬┐┬┌─┐┌┐┌┌─┐
+╚═╗│ │├┴┐└─┐│  ├┬┘│├─┘ │ ││ ││││└─┐
+╚═╝└─┘└─┘└─┘└─┘┴└─┴┴   ┴ ┴└─┘┘└┘└─┘
+> Subscribers         : {bcolors.OKGREEN}{summary["subscribers"]}{bcolors.ENDC} ({len(summary["failures"])} failed)
+> Connection setup    : {bcolors.OKGREEN}{summary["setup_rate"]:.1f}/s{bcolors.ENDC}""" + (
+        f", p50 {summary['setup'].percentile(50) * 1000:.1f} ms, p99 {summary['setup'].percentile(99) * 1000:.1f} ms"
+        if summary["setup"].count != 0 else ""
+    ))
+    if summary["memory"] is not None:
+        print(f"> Memory / connection : {bcolors.OKGREEN}{summary['memory'] / 1024:.1f} KiB{bcolors.ENDC} (tracemalloc, client side)")
+    print()
+    print(f"{'event':<16}{'phase':<10}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'missed':>8}")
+    for probe in summary["probes"]:
+        for phase, histogram in (("response", probe.response), ("delivery", probe.latency), ("spread", probe.spread)):
+            if histogram.count == 0:
+                continue
+            color = bcolors.OKGREEN if phase == "delivery" else bcolors.INFO
+            missed = f"{probe.missed:>8}" if phase == "delivery" else ""
+            print(
+                f"{probe.field if phase == 'response' else '':<16}{color}{phase:<10}{bcolors.ENDC}{histogram.count:>8}"
+                f"{histogram.percentile(50) * 1000:>10.1f}{histogram.percentile(90) * 1000:>10.1f}"
+                f"{histogram.percentile(99) * 1000:>10.1f}{histogram.max / 1000:>10.1f}"
+                f"{bcolors.FAIL if probe.missed != 0 else ''}{missed}{bcolors.ENDC}"
+            )
+    print(f"{bcolors.INFO}delivery: mutation sent -> event received, per subscriber; spread: first -> last subscriber{bcolors.ENDC}")
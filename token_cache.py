@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+    token_cache.py
+
+    On-disk Cognito token cache with proactive refresh
+    support version: Python 3.6.5
+"""
+
+import json
+import os
+import threading
+import time
+from os.path import dirname, expanduser, join
+
+import cognito
+
+DEFAULT_CACHE_PATH = join(expanduser("~"), ".cache", "appsync-test", "tokens.json")
+
+# Shared by every TokenCache so concurrent sign-ins do not lose each other's entries
+_cache_lock = threading.Lock()
+
+
+class TokenCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        """ __init__
+
+            JSON file readable by the owner only (0600, directory 0700),
+            keyed by user pool client id and username.
+
+            @param path: cache file
+        """
+        self.path = path
+
+    def get(self, client_id, username):
+        """ get
+
+            @param client_id: aws cognito client_id
+            @param username : aws cognito username
+
+            result struct
+            AuthenticationResult of initiate_auth or None
+        """
+        with _cache_lock:
+            return self._read().get(f"{client_id}:{username}")
+
+    def put(self, client_id, username, authentication_result):
+        """ put
+
+            @param client_id            : aws cognito client_id
+            @param username             : aws cognito username
+            @param authentication_result: AuthenticationResult of initiate_auth
+        """
+        with _cache_lock:
+            entries = self._read()
+            entries[f"{client_id}:{username}"] = {
+                key: authentication_result[key]
+                for key in ["IdToken", "AccessToken", "RefreshToken", "ExpiresIn", "TokenType"]
+                if key in authentication_result
+            }
+            os.makedirs(dirname(self.path), mode=0o700, exist_ok=True)
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(temporary, self.path)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+class CognitoSession:
+    def __init__(self, username, password, region_name, client_id, cache=None, refresh_margin=300):
+        """ __init__
+
+            Cognito sign-in that reuses cached tokens until `refresh_margin`
+            seconds before their `exp`, then refreshes with the refresh token.
+
+            @param username      : aws cognito username
+            @param password      : aws cognito password, or a callable returning it (asked only when needed)
+            @param region_name   : aws cognito region_name
+            @param client_id     : aws cognito client_id
+            @param cache         : TokenCache (default: DEFAULT_CACHE_PATH)
+            @param refresh_margin: seconds before exp to refresh
+        """
+        self.username       = username
+        self.password       = password
+        self.region_name    = region_name
+        self.client_id      = client_id
+        self.cache          = cache if cache is not None else TokenCache()
+        self.refresh_margin = refresh_margin
+        self.auth_result    = None
+        self.from_cache     = False
+        self._listeners     = []
+        self._stop          = threading.Event()
+        self._thread        = None
+
+    def auth(self):
+        """ auth
+
+            Same result as cognito.cognito_auth: initiate_auth result, or Exception.
+            Cached tokens are used without calling Cognito.
+        """
+        cached = self.cache.get(self.client_id, self.username)
+        if cached is not None and not self._expiring(cached):
+            self.auth_result = cached
+            self.from_cache = True
+            return {"AuthenticationResult": cached}
+
+        if cached is not None and "RefreshToken" in cached:
+            result = self._refresh(cached["RefreshToken"])
+            if not isinstance(result, Exception):
+                return result
+
+        password = self.password() if callable(self.password) else self.password
+        result = cognito.cognito_auth(self.username, password, self.region_name, self.client_id)
+        if not isinstance(result, Exception):
+            self._store(result["AuthenticationResult"])
+        return result
+
+    @property
+    def id_token(self):
+        """ id_token
+
+            Current IdToken
+        """
+        return self.auth_result["IdToken"]
+
+    def start_refresh(self, listener):
+        """ start_refresh
+
+            Refresh in a background thread shortly before exp.
+
+            @param listener: called with the new IdToken after every refresh
+        """
+        self._listeners.append(listener)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """ stop
+
+            Stop the background refresh
+        """
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            delay = self._expires_at(self.auth_result) - self.refresh_margin - time.time()
+            if self._stop.wait(max(0, delay)):
+                return
+            result = self._refresh(self.auth_result["RefreshToken"])
+            if isinstance(result, Exception):
+                # Retry soon; the current token is still valid for refresh_margin
+                self._stop.wait(min(30, self.refresh_margin / 4))
+
+    def _refresh(self, refresh_token):
+        result = cognito.cognito_refresh(refresh_token, self.region_name, self.client_id)
+        if isinstance(result, Exception):
+            return result
+        authentication_result = dict(result["AuthenticationResult"])
+        authentication_result.setdefault("RefreshToken", refresh_token)
+        self._store(authentication_result)
+        for listener in self._listeners:
+            listener(authentication_result["IdToken"])
+        return {"AuthenticationResult": authentication_result}
+
+    def _store(self, authentication_result):
+        self.auth_result = authentication_result
+        self.from_cache = False
+        self.cache.put(self.client_id, self.username, authentication_result)
+
+    def _expiring(self, authentication_result):
+        return self._expires_at(authentication_result) - self.refresh_margin <= time.time()
+
+    @staticmethod
+    def _expires_at(authentication_result):
+        return cognito.formatAuth({"AuthenticationResult": authentication_result})["payload"]["exp"]
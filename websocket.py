@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+    websocket.py
+
+    Minimal WebSocket (RFC 6455): frames and the opening handshake
+    support version: Python 3.6.5
+
+    Enough for the AppSync real-time protocol (text messages, ping / pong, close),
+    on the client side (subscription.py) and the server side (local_server.py).
+"""
+
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import time
+from urllib.parse import urlsplit
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT         = 0x1
+OP_BINARY       = 0x2
+OP_CLOSE        = 0x8
+OP_PING         = 0x9
+OP_PONG         = 0xA
+
+
+class HandshakeError(ConnectionError):
+    pass
+
+
+def accept_key(key):
+    """ accept_key
+
+        Sec-WebSocket-Accept of a Sec-WebSocket-Key
+
+        @param key: Sec-WebSocket-Key header
+    """
+    return base64.b64encode(hashlib.sha1((key + GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def encode_frame(opcode, payload, mask=True):
+    """ encode_frame
+
+        One final frame. Client frames must be masked, server frames must not.
+
+        @param opcode : OP_*
+        @param payload: bytes
+        @param mask   : mask the payload (client to server)
+    """
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        head = struct.pack("!BB", 0x80 | opcode, mask_bit | length)
+    elif length < 65536:
+        head = struct.pack("!BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, mask_bit | 127, length)
+    if not mask:
+        return head + payload
+    key = os.urandom(4)
+    return head + key + _mask(payload, key)
+
+
+def close_frame(code=1000, reason="", mask=True):
+    """ close_frame
+
+        @param code  : close status code
+        @param reason: close reason
+        @param mask  : mask the payload (client to server)
+    """
+    return encode_frame(OP_CLOSE, struct.pack("!H", code) + reason.encode("utf-8"), mask)
+
+
+def _mask(payload, key):
+    # XOR with the repeated key as one big integer instead of a loop per byte
+    if len(payload) == 0:
+        return b""
+    repeated = (key * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+
+class FrameReader:
+    def __init__(self):
+        """ __init__
+
+            Incremental frame parser: feed the received bytes, get the complete messages.
+            Fragmented messages are joined.
+        """
+        self._buffer    = bytearray()
+        self._fragments = []
+        self._opcode    = None
+
+    def feed(self, data):
+        """ feed
+
+            @param data: received bytes
+
+            result struct
+            [(opcode, payload: bytes)]
+        """
+        self._buffer += data
+        messages = []
+        while len(self._buffer) >= 2:
+            first, second = self._buffer[0], self._buffer[1]
+            length = second & 0x7F
+            offset = 2
+            if length == 126:
+                if len(self._buffer) < 4:
+                    break
+                length = struct.unpack_from("!H", self._buffer, 2)[0]
+                offset = 4
+            elif length == 127:
+                if len(self._buffer) < 10:
+                    break
+                length = struct.unpack_from("!Q", self._buffer, 2)[0]
+                offset = 10
+            key = None
+            if second & 0x80:
+                key = bytes(self._buffer[offset:offset + 4])
+                offset += 4
+            if len(self._buffer) < offset + length:
+                break
+            payload = bytes(self._buffer[offset:offset + length])
+            del self._buffer[:offset + length]
+            if key is not None:
+                payload = _mask(payload, key)
+
+            opcode = first & 0x0F
+            final = first & 0x80
+            if opcode == OP_CONTINUATION:
+                self._fragments.append(payload)
+                if final:
+                    messages.append((self._opcode, b"".join(self._fragments)))
+                    self._fragments = []
+            elif opcode in (OP_TEXT, OP_BINARY) and not final:
+                self._opcode = opcode
+                self._fragments = [payload]
+            else:
+                messages.append((opcode, payload))
+        return messages
+
+
+def connect(url, protocol=None, timeout=10.0):
+    """ connect
+
+        Open a ws:// or wss:// connection (blocking, with `timeout`)
+
+        @param url     : WebSocket URL
+        @param protocol: Sec-WebSocket-Protocol to ask for
+        @param timeout : socket timeout (seconds)
+
+        result struct
+        (
+            socket,
+            bytes received after the handshake (first frames),
+            {"connect": seconds, "tls": seconds, "upgrade": seconds}
+        )
+    """
+    parts = urlsplit(url)
+    secure = parts.scheme == "wss"
+    port = parts.port if parts.port is not None else (443 if secure else 80)
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    start = time.perf_counter()
+    sock = socket.create_connection((parts.hostname, port), timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    connected = time.perf_counter()
+    try:
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        secured = time.perf_counter()
+
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        request_lines = [
+            f"GET {path} HTTP/1.1",
+            f"Host: {parts.netloc}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+        ]
+        if protocol is not None:
+            request_lines.append(f"Sec-WebSocket-Protocol: {protocol}")
+        request = "\r\n".join(request_lines) + "\r\n\r\n"
+        sock.sendall(request.encode("latin-1"))
+        response = b""
+        while b"\r\n\r\n" not in response:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise HandshakeError(f"{url}: connection closed during the handshake")
+            response += chunk
+        head, _, rest = response.partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        headers = {name.strip().lower(): value.strip() for name, _, value in (line.partition(":") for line in lines[1:])}
+        if lines[0].split(" ")[1:2] != ["101"]:
+            raise HandshakeError(f"{url}: {lines[0]}")
+        if headers.get("sec-websocket-accept") != accept_key(key):
+            raise HandshakeError(f"{url}: invalid Sec-WebSocket-Accept")
+    except BaseException:
+        sock.close()
+        raise
+    upgraded = time.perf_counter()
+    return sock, rest, {"connect": connected - start, "tls": secured - connected, "upgrade": upgraded - secured}